@@ -1,17 +1,38 @@
+import copy
 import json
 import random
 import uuid
 from typing import Optional, Union, List
 
+from pymongo import UpdateOne
+
 from api.material_base import MaterialType, Material
 from api.materials import Air
 from utils import pathfinder
 from utils.db_config import db
+from utils.incremental_pathfinder import IncrementalPathfinder
+from utils.render_cache import render_cache
 
 MIX_X = 0
 MIN_Y = 0
 MAX_X = 30
 MAX_Y = 30
+GRID_SIZE = MAX_X + 1
+
+# Material codes stored in the house grid. The code is the index in this list,
+# which keeps AIR (the first member) at 0 so an empty bytearray is an empty house.
+MATERIAL_CODES: List[MaterialType] = list(MaterialType)
+MATERIAL_CODE_LOOKUP: dict = {material_type: code for code, material_type in enumerate(MATERIAL_CODES)}
+# bytes.translate table marking the codes a player can't walk through (everything but air and the vault)
+SOLID_TABLE: bytes = bytes(
+    0 if code >= len(MATERIAL_CODES) or MATERIAL_CODES[code] in [MaterialType.AIR, MaterialType.VAULT] else 1
+    for code in range(256)
+)
+# bytes.translate table from material code to the character used by compressed renders
+COMPRESSED_TABLE: bytes = bytes(
+    ord("v") if code == MATERIAL_CODE_LOOKUP[MaterialType.VAULT] else ord("0") if code == 0 else ord("1")
+    for code in range(256)
+)
 
 
 class VaultContents:
@@ -86,17 +107,65 @@ class House:
         self.metadata: dict = {}
         self.abandoned: bool = False
         self.abandoned_by: Optional[str] = None
+        self.version: int = 0  # Bumped on every save, guards saves and keys cached renders
 
         self.vault_contents: Optional[VaultContents] = VaultContents()
 
-        # List of materials which constructs the api
+        # Persisted state of the incremental pathfinder, see utils/incremental_pathfinder.py
+        self.path_state: Optional[dict] = None
+        self._pathfinder: Optional[IncrementalPathfinder] = None
+
+        # What mongo holds for this house, so save only writes what changed since
+        self._persisted: bool = False
+        self._stored_version: Optional[int] = None  # None for houses saved before versioning
+        self._stored_grid: bytes = bytes(GRID_SIZE * GRID_SIZE)
+        self._stored_fields: dict = {}
+        self._stored_path_state: Optional[dict] = None
+        self._dirty_cells: set = set()
+
+        # Dense grid of material codes which constructs the house, indexed by y * GRID_SIZE + x
         # 0,0 -> 30,30: Inclusive of 0 and 30: default AIR
-        self.construction: list = [
-            {
-                "material_type": MaterialType.VAULT,
-                "location": [30, 15]
-            }
-        ]
+        self._grid: bytearray = bytearray(GRID_SIZE * GRID_SIZE)
+        self._vault_location: Optional[List[int]] = None
+        self._set_cell(MaterialType.VAULT, 30, 15)
+
+    @property
+    def construction(self) -> List[dict]:
+        """Sparse list of non-air materials, the shape the house is stored as in mongo."""
+        items: List[dict] = []
+        for index, code in enumerate(self._grid):
+            if code:
+                items.append({
+                    "material_type": MATERIAL_CODES[code],
+                    "location": [index % GRID_SIZE, index // GRID_SIZE]
+                })
+        return items
+
+    @construction.setter
+    def construction(self, items: List[dict]):
+        self._clear_grid()
+        for item in items:
+            x, y = item["location"]
+            if not House.in_grid(x, y) or self._grid[y * GRID_SIZE + x]:
+                continue  # First entry for a location wins, same as the old list scan
+            material_type: Optional[MaterialType] = MaterialType.from_string(item["material_type"])
+            if material_type:
+                self._set_cell(material_type, x, y)
+
+    def get_compressed_construction(self) -> str:
+        """Whole house as compressed render characters, x outer and y inner like the 8x8 window."""
+        rows: str = self._grid.translate(COMPRESSED_TABLE).decode("ascii")
+        tiles: List[str] = [rows[x::GRID_SIZE] for x in range(GRID_SIZE)]
+        tiles[0] = tiles[0][:15] + "d" + tiles[0][16:]  # Door
+        return "".join(tiles)
+
+    def get_compressed_tile(self, x: int, y: int) -> str:
+        """Compressed render character for a single location, outside the house is wall."""
+        if x == 0 and y == 15:
+            return "d"
+        if not House.in_grid(x, y):
+            return "1"
+        return chr(COMPRESSED_TABLE[self._grid[y * GRID_SIZE + x]])
 
     def get_construction_as_dict(self) -> List[dict]:
         items: List[dict] = []
@@ -107,6 +176,63 @@ class House:
             })
         return items
 
+    @staticmethod
+    def in_grid(x: int, y: int) -> bool:
+        return 0 <= x < GRID_SIZE and 0 <= y < GRID_SIZE
+
+    def _get_cell(self, x: int, y: int) -> MaterialType:
+        return MATERIAL_CODES[self._grid[y * GRID_SIZE + x]]
+
+    def _clear_grid(self):
+        """Empty the house, every cell is dirty so save compares all of them with mongo."""
+        self._grid = bytearray(GRID_SIZE * GRID_SIZE)
+        self._dirty_cells = set(range(GRID_SIZE * GRID_SIZE))
+        self._vault_location = None
+        self._pathfinder = None
+
+    def _set_cell(self, material_type: MaterialType, x: int, y: int):
+        index: int = y * GRID_SIZE + x
+        if self._grid[index] == MATERIAL_CODE_LOOKUP[MaterialType.VAULT]:
+            self._vault_location = None
+        self._grid[index] = MATERIAL_CODE_LOOKUP[material_type]
+        self._dirty_cells.add(index)
+        if material_type == MaterialType.VAULT:
+            self._vault_location = [x, y]
+        if self._pathfinder:
+            self._pathfinder.cell_changed(x, y)
+            if material_type == MaterialType.VAULT:
+                self._pathfinder.move_goal(x, y)
+
+    def get_vault_location(self) -> Optional[List[int]]:
+        return self._vault_location
+
+    def _get_pathfinder(self) -> IncrementalPathfinder:
+        if not self._pathfinder:
+            self._pathfinder = IncrementalPathfinder(
+                self._grid, SOLID_TABLE, self._vault_location, state=self.path_state
+            )
+        return self._pathfinder
+
+    def get_maze_solution(self, backend: str = pathfinder.BACKEND_INCREMENTAL) -> Optional[List[List[int]]]:
+        """Door to vault solution, by default updated incrementally from the previous edit."""
+        if not self._vault_location:
+            return None
+        if backend != pathfinder.BACKEND_INCREMENTAL:
+            return pathfinder.get_maze_solution(self.construction, backend=backend)
+        return self._get_pathfinder().get_solution()
+
+    def is_vault_reachable(self, backend: str = pathfinder.BACKEND_INCREMENTAL) -> bool:
+        """Door to vault reachability, for when the path itself isn't needed."""
+        if not self._vault_location:
+            return False
+        if backend == pathfinder.BACKEND_BITSET:
+            x, y = self._vault_location
+            row_masks: List[int] = pathfinder.row_masks_from_bytes(self._grid.translate(SOLID_TABLE))
+            return pathfinder.is_reachable((15, 0), (y, x), row_masks)
+        if backend == pathfinder.BACKEND_INCREMENTAL:
+            return self._get_pathfinder().is_reachable()
+        return self.get_maze_solution(backend=backend) is not None
+
     @staticmethod
     def in_bounds(x: int, y: int):
         in_square: bool = not (x < MIX_X or x > MAX_X or y < MIN_Y or y > MAX_Y)
@@ -128,72 +254,160 @@ class House:
         material: Optional[Material] = self.get_material_from(x, y)
         if not material or material.material_type != MaterialType.AIR:
             return False
-        construction_list: List[dict] = []
-        for item in self.construction:
-            if item["material_type"] != MaterialType.VAULT:
-                construction_list.append(item)
-        construction_list.append({
-            "material_type": MaterialType.VAULT,
-            "location": [x, y]
-        })
-        solution = pathfinder.get_maze_solution(construction_list)
+        previous_location: Optional[List[int]] = self._vault_location
+        if previous_location:
+            self._set_cell(MaterialType.AIR, *previous_location)
+        self._set_cell(MaterialType.VAULT, x, y)
+        solution = self.get_maze_solution()
         if not solution:
+            self._set_cell(MaterialType.AIR, x, y)
+            if previous_location:
+                self._set_cell(MaterialType.VAULT, *previous_location)
             return False
-        self.construction = construction_list
         return True
 
     def new(self):
         self.house_id = str(uuid.uuid4())
-        self.construction: list = [
-            {
-                "material_type": MaterialType.VAULT,
-                "location": [random.randint(25, 30), random.randint(10, 20)]
-            }
-        ]
+        self._clear_grid()
+        self.path_state = None
+        self._set_cell(MaterialType.VAULT, random.randint(25, 30), random.randint(10, 20))
         for x in range(2, 7):
-            self.construction.append(
-                {
-                    "material_type": MaterialType.WOOD_WALL,
-                    "location": [x, 14]
-                }
-            )
-            self.construction.append(
-                {
-                    "material_type": MaterialType.WOOD_WALL,
-                    "location": [x, 16]
-                }
-            )
+            self._set_cell(MaterialType.WOOD_WALL, x, 14)
+            self._set_cell(MaterialType.WOOD_WALL, x, 16)
         self.vault_contents = VaultContents()
         return self
 
     def save(self):
-        existing_house = db["houses"].find_one({"_id": self.house_id})
-        if not existing_house:
-            db["houses"].insert_one(self.as_dict())
+        """
+        Write what changed since the house was loaded or last saved in one update.
+
+        The update only applies if the stored version is still the one this house was
+        loaded at, otherwise None is returned and nothing is written. The house should
+        then be reloaded and the change retried or reported.
+        """
+        if not self._persisted:
+            self.version += 1
+            item: dict = self.as_dict()
+            db["houses"].insert_one(item)
+            self._stored_path_state = item.get("path_state")
+            self._mark_stored(self.version)
             return self
-        db["houses"].find_one_and_replace({"_id": self.house_id}, self.as_dict())
+        updates: List[dict] = self._build_update()
+        if not updates:
+            return self  # Nothing changed
+        updates[-1]["$inc"] = {"version": 1}
+        query: dict = {"_id": self.house_id, "version": self._stored_version}
+        if len(updates) == 1:
+            saved: bool = db["houses"].update_one(query, updates[0]).matched_count == 1
+        else:
+            # Ordered, so the push only applies after the pull, and the version is
+            # only bumped by the last one
+            result = db["houses"].bulk_write([UpdateOne(query, update) for update in updates])
+            saved = result.matched_count == len(updates)
+        if not saved:
+            return None  # Someone else saved this house since it was loaded
+        self.version = (self._stored_version or 0) + 1
+        render_cache.invalidate(self.house_id)
+        if "path_state" in updates[-1].get("$set", {}):
+            self._stored_path_state = updates[-1]["$set"]["path_state"]
+        self._mark_stored(self.version)
         return self
 
-    def get_material_from(self, x: int, y: int) -> Optional[Material]:
+    def _tracked_fields(self) -> dict:
+        fields: dict = {
+            k: v for k, v in self.__dict__.items()
+            if not k.startswith("_") and k not in ["version", "path_state", "vault_contents"]
+        }
+        fields["vault_contents"] = self.vault_contents.as_dict()
+        return fields
+
+    def _mark_stored(self, version: Optional[int]):
+        self._persisted = True
+        self._stored_version = version
+        self._stored_grid = bytes(self._grid)
+        self._stored_fields = copy.deepcopy(self._tracked_fields())
+        self._dirty_cells = set()
+
+    def _build_update(self) -> List[dict]:
+        """
+        Mongo updates for the changes since _mark_stored, to apply in order, empty if
+        there are none. Mongo can't pull from and push to the same array in one update,
+        so when cells were both removed and placed the push takes a second one.
+        """
+        fields: dict = self._tracked_fields()
+        changes: dict = {}
+        for key, value in fields.items():
+            if key != "vault_contents" and (key not in self._stored_fields or self._stored_fields[key] != value):
+                changes[key] = value
+
+        vault: dict = fields["vault_contents"]
+        stored_vault: dict = self._stored_fields.get("vault_contents", {})
+        if vault["dollars"] != stored_vault.get("dollars"):
+            changes["vault_contents.dollars"] = vault["dollars"]
+        for name, count in vault["materials"].items():
+            if count != stored_vault.get("materials", {}).get(name):
+                changes[f"vault_contents.materials.{name}"] = count
+
+        pulled: List[dict] = []
+        pushed: List[dict] = []
+        for index in sorted(self._dirty_cells):
+            code: int = self._grid[index]
+            if code == self._stored_grid[index]:
+                continue
+            location: List[int] = [index % GRID_SIZE, index // GRID_SIZE]
+            if self._stored_grid[index]:
+                pulled.append({"material_type": MATERIAL_CODES[self._stored_grid[index]].value, "location": location})
+            if code:
+                pushed.append({"material_type": MATERIAL_CODES[code].value, "location": location})
+
+        if not changes and not pulled and not pushed:
+            return []
+        updates: List[dict] = []
+        if pulled:
+            # The stored entries exactly as this class writes them, which unlike
+            # $pull with $in on the locations mongomock matches too
+            updates.append({"$pullAll": {"construction": pulled}})
+        update: dict = {}
+        if pushed:
+            update["$push"] = {"construction": {"$each": pushed}}
+        if self._pathfinder and self._pathfinder.worth_saving(self._stored_path_state):
+            changes["path_state"] = self._pathfinder.as_dict()
+        if changes:
+            update["$set"] = changes
+        if update and pulled and not pushed:
+            updates[0].update(update)
+        elif update:
+            updates.append(update)
+        return updates
+
+    def get_material_type(self, x: int, y: int) -> Optional[MaterialType]:
+        """Constant time lookup of the material at a location, None if out of bounds."""
         if not House.in_bounds(x, y):
             return None
-        for item in self.construction:
-            location = item["location"]
-            if x == location[0] and y == location[1]:
-                return Material().from_json(item)
-        return Air()  # Default material in a api
+        return MATERIAL_CODES[self._grid[y * GRID_SIZE + x]]
+
+    def get_material_from(self, x: int, y: int) -> Optional[Material]:
+        material_type: Optional[MaterialType] = self.get_material_type(x, y)
+        if not material_type:
+            return None
+        if material_type == MaterialType.AIR:
+            return Air()  # Default material in a api
+        return Material().from_json({
+            "material_type": material_type,
+            "location": [x, y]
+        })
 
     def remove_item(self, x: int, y: int):
-        new_construction: List[dict] = []
-        removed: Optional[dict] = None
-        for item in self.construction:
-            location = item["location"]
-            if x == location[0] and y == location[1]:
-                removed = item
-                continue
-            new_construction.append(item)
-        self.construction = new_construction
-        return removed
+        if not House.in_grid(x, y):
+            return None
+        material_type: MaterialType = self._get_cell(x, y)
+        if material_type == MaterialType.AIR:
+            return None
+        self._set_cell(MaterialType.AIR, x, y)
+        return {
+            "material_type": material_type,
+            "location": [x, y]
+        }
 
     def set_item(self, material_type: Union[MaterialType, str], x: int, y: int):
         current_item: Material = self.get_material_from(x, y)
@@ -205,22 +419,17 @@ class House:
             return False, None
         removed: Optional[dict] = self.remove_item(x, y)
         if material_type != MaterialType.AIR:
-            self.construction.append({
-                "material_type": material_type,
-                "location": [x, y]
-            })
+            self._set_cell(material_type, x, y)
         return True, removed
 
     def as_dict(self) -> dict:
         """Conversion to dict for friendliness with mongo."""
-        values: dict = self.__dict__
+        values: dict = {k: v for k, v in self.__dict__.items() if not k.startswith("_")}
         values["_id"] = self.house_id
-        c2: list = []
-        for item in self.construction:
-            item["material_type"] = item["material_type"].value
-            c2.append(item)
-        values["construction"] = c2
+        values["construction"] = self.get_construction_as_dict()
         values["vault_contents"] = self.vault_contents.as_dict()
+        if self._pathfinder:
+            values["path_state"] = self._pathfinder.as_dict()
         return values
 
     def load(self):
@@ -235,16 +444,13 @@ class House:
         """Conversion from json for friendliness with mongo."""
         if isinstance(item, str):
             item: dict = json.loads(item)
-        c2 = []
-        for n in item["construction"]:
-            n["material_type"] = MaterialType.from_string(n["material_type"])
-            c2.append(n)
         for k, v in item.items():
+            if k in ["_id", "construction", "vault_contents"]:
+                continue
             setattr(self, k, v)
-        self.construction = c2
+        self.construction = item["construction"]
         vault_contents_dict = item.get("vault_contents", {})
         self.vault_contents = VaultContents().load(vault_contents_dict)
+        self._stored_path_state = item.get("path_state")
+        self._mark_stored(item.get("version"))
         return self
-
-
-
@@ -3,15 +3,19 @@ import json
 import logging
 import sys
 from logging import handlers
-from typing import Optional, List, Union
+from typing import Optional, List, Tuple, Union
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 from api.house_base import House
-from api.material_base import Material
+from api.material_base import Material, MaterialType
 from api.materials import Air
-from utils import metrics
+from utils import game_queries, identity_map, metrics, packed_render, timestamps
 from utils.configuration import get_config_value, get_log_location
 from utils.db_config import db
-from utils.enums import LoggerName
+from utils.enums import HouseEntry, LoggerName, RenderView
+from utils.render_cache import RenderCache, render_cache
 
 MAX_BYTES = get_config_value(
     "logs.rotation.max_bytes", {"value": (10 * (1000 * 1000))}
@@ -31,8 +35,33 @@ if log_location:
     logger.addHandler(handler)
 
 
+SAVE_ATTEMPTS = 3  # Versioned house saves retried by a robbery before giving up
+
+# Lengths of the render JSON without its variable parts, so view selection can
+# compare sizes without serializing either render.
+COMPRESSED_RENDER_OVERHEAD: int = len(json.dumps({"construction": ""}))
+EXPLICIT_RENDER_OVERHEAD: int = len(json.dumps({"construction": []}))
+EXPLICIT_ENTRY_OVERHEAD: int = len(json.dumps({
+    "material_type": "",
+    "local_location": [0, 0],
+    "absolute_location": [0, 0],
+    "passable": False
+})) - len("0000") - len("false")
+
+
+def explicit_entry_size(name: str, local_x: int, local_y: int, x: int, y: int, passable: bool) -> int:
+    """Length of one json.dumps'd explicit render entry, material names are plain ASCII."""
+    return (
+        EXPLICIT_ENTRY_OVERHEAD + len(name) +
+        len(str(local_x)) + len(str(local_y)) + len(str(x)) + len(str(y)) +
+        (4 if passable else 5)
+    )
+
 
 class HouseAccess:
+    # Set by startup.schema_check once the unique access indexes enter_house relies on
+    # are verified. Until then entering checks for the player and an occupant first.
+    unique_access_indexes: bool = False
 
     def __init__(self, player_id: str, house_id: str):
         self.player_id = player_id  # Player inside of house (Not house's owner)
@@ -40,71 +69,78 @@ class HouseAccess:
         self.house: Optional[House] = None
         self.player_location: Optional[List[int]] = None
 
-    def load(self):
-        self.house: House = House(house_id=self.house_id).load()
-        db_access = db["access"].find_one({
-            "player_id": self.player_id
-        })
-        if db_access:
-            self.player_location = db_access["player_location"]
+    def load(self, refresh: bool = False, locate: bool = True):
+        """
+        Load through the request's identity map, refresh drops unsaved edits to the house.
+        Entering a house doesn't need to know where the player is, so it passes locate=False.
+        """
+        self.house: House = identity_map.get_house(self.house_id, refresh=refresh)
+        if locate:
+            db_access = identity_map.get_access(self.player_id)
+            if db_access:
+                self.player_location = db_access["player_location"]
         return self if self.house else None
 
     def get_players_house_id(self):
-        item = db["players"].find_one({"player_id": self.player_id}, ["house_id"])
-        if not item:
+        player = identity_map.get_player(self.player_id)
+        if not player:
             return None
-        return item.get("house_id")
+        return player.house_id
 
     def player_owns_house(self):
         house_id_compare = self.get_players_house_id()
         return house_id_compare and house_id_compare == self.house_id
 
-    def is_in_house(self):
-        db_access = db["access"].find_one({
-            "player_id": self.player_id
-        })
+    def is_in_house(self, refresh: bool = False):
+        db_access = identity_map.get_access(self.player_id, refresh=refresh)
         return True if db_access else False
 
-    def can_enter_house(self):
-        db_access = db["access"].find_one({
-            "house_id": self.house_id
-        })
-        if not db_access:
-            return True
-        visit_too_long = HouseAccess.visit_too_long(db_access)
-        if visit_too_long:
-            HouseAccess.evict(db_access["player_id"])
-            return True
-        return False
-
-    def render_surroundings(self, player_location: Optional[List[int]] = None, compressed_view: bool = False) -> dict:
+    def render_surroundings(
+            self, player_location: Optional[List[int]] = None, view: RenderView = RenderView.EXPLICIT
+    ) -> dict:
         absolute_player_location: Optional[List[int]] = player_location or self.player_location
         if not absolute_player_location:
             return {}
+
+        wood_walls: int = self.house.vault_contents.materials.get("Wooden_Wall", 0)
+        resources = {
+            "wood_walls": wood_walls
+        }
+
+        if view == RenderView.DELTA:
+            view = RenderView.COMPRESSED  # Full windows for delta clients are resyncs
+        cache_key = RenderCache.make_key(
+            self.house_id, self.house.version, absolute_player_location, view.value
+        )
+        render: Optional[dict] = render_cache.get(cache_key)
+        if render is None:
+            render = self._render(absolute_player_location, view=view)
+            render_cache.put(cache_key, render)
+        return {**render, **resources}
+
+    def _render(self, absolute_player_location: List[int], view: RenderView = RenderView.EXPLICIT) -> dict:
         player_local_location: List[int] = [3, 3]
 
         remote_x = absolute_player_location[0] - player_local_location[0]
         remote_y = absolute_player_location[1] - player_local_location[1]
 
-        compressed_render = self.get_compressed_render(remote_x, remote_y, player_local_location)
-        explicit_render = self.get_explicit_render(remote_x, remote_y, player_local_location)
-
-        wood_walls: int = self.house.vault_contents.materials.get("Wooden_Wall", 0)
+        if view == RenderView.EXPLICIT:
+            return self.get_explicit_render(remote_x, remote_y, player_local_location)
 
-        c_size = len(json.dumps(compressed_render))
-        e_size = len(json.dumps(explicit_render))
-        resources = {
-            "wood_walls": wood_walls
-        }
-        if compressed_view:
-            if c_size > e_size:
-                logger.info(
-                    f"Explicit render is smaller than the compressed! "
-                    f"Returning this instead. {c_size} > {e_size}"
-                )
-                return {**explicit_render, **resources}
-            return {**compressed_render, **resources}
-        return {**explicit_render, **resources}
+        tiles, e_size = self._walk_compressed(
+            remote_x, remote_y, player_local_location, measure_explicit=view == RenderView.COMPRESSED
+        )
+        if view == RenderView.PACKED:
+            return {"construction": packed_render.encode_tiles(tiles)}
+
+        c_size = COMPRESSED_RENDER_OVERHEAD + len(tiles)
+        if c_size > e_size:
+            logger.info(
+                f"Explicit render is smaller than the compressed! "
+                f"Returning this instead. {c_size} > {e_size}"
+            )
+            return self.get_explicit_render(remote_x, remote_y, player_local_location)
+        return {"construction": tiles}
 
     def get_explicit_render(self, remote_x, remote_y, player_local_location):
         local_x: int = 0
@@ -121,8 +157,8 @@ class HouseAccess:
                     })
                     local_y += 1
                     continue
-                material: Optional[Material] = self.house.get_material_from(x, y)
-                if not material:
+                material_type: Optional[MaterialType] = self.house.get_material_type(x, y)
+                if not material_type:
                     # Out of Bounds
                     construction.append({
                         "material_type": "House_Wall",
@@ -132,12 +168,12 @@ class HouseAccess:
                     })
                     local_y += 1
                     continue
-                passable = material.material_type.value == "Air"  # TODO figure out passable
+                passable = material_type == MaterialType.AIR  # TODO figure out passable
                 if not passable and x == 0 and y == 15:  # Door
                     passable = True
-                if material.material_type.value != "Air":
+                if material_type != MaterialType.AIR:
                     construction.append({
-                        "material_type": material.material_type.value.replace(" ", "_"),
+                        "material_type": material_type.value.replace(" ", "_"),
                         "local_location": [local_x, local_y],
                         "absolute_location": [x, y],
                         "passable": passable
@@ -147,99 +183,141 @@ class HouseAccess:
         return {"construction": construction}
 
     def get_compressed_render(self, remote_x, remote_y, player_local_location):
-        # TODO: Make even smaller w/ bytes
+        return {"construction": self._walk_compressed(remote_x, remote_y, player_local_location)[0]}
+
+    def _walk_compressed(self, remote_x, remote_y, player_local_location, measure_explicit=False):
+        """
+        Compressed tiles of the window, and when asked the exact length json.dumps
+        would give the explicit render of the same window, in a single walk.
+        """
         construction: List[str] = []
+        explicit_sizes: List[int] = []
         local_x: int = 0
         for x in range(remote_x, remote_x + 8):
             local_y: int = 0
             for y in range(remote_y, remote_y + 8):
                 if local_x == player_local_location[0] and local_y == player_local_location[1]:
                     construction.append("p")
+                    if measure_explicit:
+                        explicit_sizes.append(explicit_entry_size("player", local_x, local_y, x, y, False))
                     local_y += 1
                     continue
-                material: Optional[Material] = self.house.get_material_from(x, y)
-                if not material:
-                    # Out of Bounds
-                    value = "1"
-                    if x == 0 and y == 15:
-                        value = "d"
-                    construction.append(value)
-                    local_y += 1
-                    continue
-                if material.material_type.value != "Air":
-                    if material.material_type.value == "Vault":
-                        construction.append("v")
-                    else:
-                        value = "1"
-                        if x == 0 and y == 15:
-                            value = "d"
-                        construction.append(value)
-                else:
-                    value = "0"
-                    if x == 0 and y == 15:
-                        value = "d"
-                    construction.append(value)
+                tile: str = self.house.get_compressed_tile(x, y)
+                construction.append(tile)
+                if measure_explicit and tile != "0":
+                    material_type: Optional[MaterialType] = self.house.get_material_type(x, y)
+                    name: str = material_type.value.replace(" ", "_") if material_type else "House_Wall"
+                    explicit_sizes.append(explicit_entry_size(name, local_x, local_y, x, y, False))
                 local_y += 1
             local_x += 1
-        return {"construction": "".join(construction)}
+        explicit_size: int = EXPLICIT_RENDER_OVERHEAD + sum(explicit_sizes)
+        if explicit_sizes:
+            explicit_size += len(", ") * (len(explicit_sizes) - 1)
+        return "".join(construction), explicit_size
+
+    def get_delta_render(self, previous_location: List[int]) -> dict:
+        """
+        Tiles revealed by a one cell move instead of the whole 8x8 window.
+
+        The edge is the new far column (y ascending) or row (x ascending) in the
+        direction of the move, vacated is the tile the player stepped off of.
+        """
+        x, y = self.player_location
+        if x != previous_location[0]:
+            edge_x: int = x + 4 if x > previous_location[0] else x - 3
+            edge = [self.house.get_compressed_tile(edge_x, edge_y) for edge_y in range(y - 3, y + 5)]
+        else:
+            edge_y: int = y + 4 if y > previous_location[1] else y - 3
+            edge = [self.house.get_compressed_tile(edge_x, edge_y) for edge_x in range(x - 3, x + 5)]
+        return {
+            "delta": {
+                "edge": "".join(edge),
+                "vacated": self.house.get_compressed_tile(previous_location[0], previous_location[1])
+            }
+        }
 
-    def move(self, direction, compressed_view=False):
+    def resync(self, view=RenderView.DELTA) -> Optional[dict]:
+        """Full window for a badge that missed a render, restarting its delta chain."""
+        db_access = db["access"].find_one_and_update(
+            {"player_id": self.player_id, "house_id": self.house_id},
+            {"$set": {"render_version": self.house.version}, "$inc": {"render_seq": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+        identity_map.set_access(self.player_id, db_access)
+        if not db_access:
+            return None
+        self.player_location = db_access["player_location"]
+        item = self.render_surroundings(view=view)
+        item["house_id"] = self.house_id
+        item["player_location"] = self.player_location
+        item["seq"] = db_access["render_seq"]
+        return item
+
+    def move(self, direction, view=RenderView.EXPLICIT):
         direction = direction.lower()
         if direction not in ["left", "right", "up", "down"]:
             return None
         if direction == "left":
-            return self.move_left(compressed_view=compressed_view)
+            return self.move_left(view=view)
         if direction == "right":
-            return self.move_right(compressed_view=compressed_view)
+            return self.move_right(view=view)
         if direction == "up":
-            return self.move_up(compressed_view=compressed_view)
-        return self.move_down(compressed_view=compressed_view)  # Should always be down because of string whitelist.
+            return self.move_up(view=view)
+        return self.move_down(view=view)  # Should always be down because of string whitelist.
 
-    def move_up(self, compressed_view=False):
+    def move_up(self, view=RenderView.EXPLICIT):
         return self._teleport_to(
             self.player_location[0], self.player_location[1] + 1,
-            compressed_view=compressed_view
+            view=view
         )
 
-    def move_down(self, compressed_view=False):
+    def move_down(self, view=RenderView.EXPLICIT):
         return self._teleport_to(
             self.player_location[0], self.player_location[1] - 1,
-            compressed_view=compressed_view
+            view=view
         )
 
-    def move_left(self, compressed_view=False):
+    def move_left(self, view=RenderView.EXPLICIT):
         return self._teleport_to(
             self.player_location[0] - 1, self.player_location[1],
-            compressed_view=compressed_view
+            view=view
         )
 
-    def move_right(self, compressed_view=False):
+    def move_right(self, view=RenderView.EXPLICIT):
         return self._teleport_to(
             self.player_location[0] + 1, self.player_location[1],
-            compressed_view=compressed_view
+            view=view
         )
 
     def rob_vault(self):
         if self.player_owns_house():
             return  # Can't rob your own house!
         logger.info(f"{self.player_id} is robbing vault of {self.house_id}")
-        house: House = House(self.house_id).load()
         robbers_house_id = self.get_players_house_id()
         if not robbers_house_id:
             return
-        robbers_house: House = House(house_id=robbers_house_id).load()
-        dollars: int = house.vault_contents.dollars
-
-        robbers_house.vault_contents.increase_dollars(dollars)
-        house.vault_contents.dollars = 0
-
-        house.save()
-        robbers_house.save()
+        # Saves are versioned, so a vault emptied while the owner was editing is
+        # reloaded and emptied again rather than overwriting either change.
+        for attempt in range(SAVE_ATTEMPTS):
+            house: House = identity_map.get_house(self.house_id, refresh=attempt > 0)
+            dollars: int = house.vault_contents.dollars
+            house.vault_contents.dollars = 0
+            if house.save():
+                break
+        else:
+            return None
+        for attempt in range(SAVE_ATTEMPTS):
+            robbers_house: House = identity_map.get_house(robbers_house_id, refresh=attempt > 0)
+            robbers_house.vault_contents.increase_dollars(dollars)
+            if robbers_house.save():
+                break
+        else:
+            logger.error(f"{self.player_id} robbed {dollars} from {self.house_id} but their house couldn't be saved")
         metrics.metric_tracker.increment_robbery_attempt(True)
 
         return {"success": True, "robbed": True, "contents": {"dollars": dollars}}
 
-    def _teleport_to(self, x: int, y: int, compressed_view=False):
+    def _teleport_to(self, x: int, y: int, view=RenderView.EXPLICIT):
         if not self.is_in_house():
             return None
         material: Optional[Material] = self.house.get_material_from(x, y)
@@ -255,36 +333,96 @@ class HouseAccess:
             return None  # material.passable is bugged, figure out why?
         logger.info(f"{self.player_id} is moving to {x},{y} in house {self.house_id}")
         self.player_location = [x, y]
-        db["access"].update_one(
+        # Every move is a render, so the sequence and the house version it was
+        # rendered from are kept for delta clients whatever view this one asked for.
+        db_access = db["access"].find_one_and_update(
             {"player_id": self.player_id},
             {
                 "$set": {
-                    "latest_activity": datetime.datetime.now().isoformat(),
-                    "player_location": self.player_location
-                }
+                    "latest_activity": timestamps.now(),
+                    "player_location": self.player_location,
+                    "render_version": self.house.version
+                },
+                "$inc": {"render_seq": 1}
             }
         )
-        item = self.render_surroundings(compressed_view=compressed_view)
+        identity_map.forget_access(self.player_id)
+        if not db_access:
+            return None
+        if view == RenderView.DELTA and db_access.get("render_version") == self.house.version:
+            item = self.get_delta_render(db_access["player_location"])
+            item["wood_walls"] = self.house.vault_contents.materials.get("Wooden_Wall", 0)
+        else:
+            item = self.render_surroundings(view=view)
         item["house_id"] = self.house_id
         item["player_location"] = self.player_location
+        if view == RenderView.DELTA:
+            item["seq"] = db_access.get("render_seq", 0) + 1
         return item
 
-    def enter_house(self, compressed_view=False):
-        if self.is_in_house():
-            return None  # Already in house
+    def enter_house(self, view=RenderView.EXPLICIT) -> Tuple[HouseEntry, Optional[dict]]:
+        """
+        Enter with a single write: take over the house's visit if it has expired,
+        otherwise insert one. The unique access.player_id and access.house_id indexes
+        reject it if the player is already in a house or someone is in this one, so two
+        players can't both get in. Returns the render when entered.
+        """
+        if not HouseAccess.unique_access_indexes:
+            entry: Optional[HouseEntry] = self._check_entry()
+            if entry:
+                return entry, None
         location = [0, 15]
-        db["access"].insert_one({
+        now = timestamps.now()
+        db_access: dict = {
             "player_id": self.player_id,
             "house_id": self.house_id,
-            "access_time": datetime.datetime.now().isoformat(),
-            "latest_activity": datetime.datetime.now().isoformat(),
-            "player_location": location
-        })
+            "access_time": now,
+            "latest_activity": now,
+            "player_location": location,
+            "render_seq": 0,
+            "render_version": self.house.version
+        }
+        evicted: Optional[dict] = None
+        cutoffs = HouseAccess.eviction_cutoffs()
+        try:
+            if cutoffs:
+                # Not the player's own visit, entering again is ALREADY_INSIDE whether or not it expired
+                evicted = db["access"].find_one_and_replace({
+                    "house_id": self.house_id,
+                    "player_id": {"$ne": self.player_id},
+                    "$or": HouseAccess.expired_filter(*cutoffs)
+                }, db_access, upsert=True)
+            else:
+                db["access"].insert_one(db_access)
+        except DuplicateKeyError:
+            # Either index can be the one reported when both are in the way, so the
+            # player's own visit is read back rather than trusting the error
+            if self.is_in_house(refresh=True):
+                return HouseEntry.ALREADY_INSIDE, None
+            return HouseEntry.OCCUPIED, None
+        if evicted:
+            db["players"].update_one({"_id": evicted["player_id"]}, {"$set": {"evicted": True}})
+            identity_map.forget_player(evicted["player_id"])
+            identity_map.set_access(evicted["player_id"], None)
+        identity_map.set_access(self.player_id, db_access)
         self.player_location = location
-        item = self.render_surroundings(compressed_view=compressed_view)
+        item = self.render_surroundings(view=view)
         item["house_id"] = self.house_id
         item["player_location"] = location
-        return item
+        if view == RenderView.DELTA:
+            item["seq"] = 0
+        return HouseEntry.ENTERED, item
+
+    def _check_entry(self) -> Optional[HouseEntry]:
+        """The checks the unique access indexes make, for a database that doesn't have them yet."""
+        if self.is_in_house(refresh=True):
+            return HouseEntry.ALREADY_INSIDE
+        occupant: Optional[dict] = db["access"].find_one(
+            {"house_id": self.house_id}, ["latest_activity", "access_time"]
+        )
+        if occupant and not HouseAccess.visit_too_long(occupant):
+            return HouseEntry.OCCUPIED
+        return None
 
     def leave_house(self):
         if not self.is_in_house():
@@ -292,52 +430,53 @@ class HouseAccess:
         db["access"].delete_one({
             "player_id": self.player_id
         })
+        identity_map.set_access(self.player_id, None)
+
+    @staticmethod
+    def eviction_cutoffs(house_owner=False) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+        return game_queries.eviction_cutoffs(house_owner=house_owner)
 
     @staticmethod
     def visit_too_long(access, house_owner=False):
         if not access:
             return False
-
-        disable_activity_timeout: bool = get_config_value(
-            "evictions.disable_timeout", default_value={"value": False}
-        ).get("value")
-        if disable_activity_timeout:
+        cutoffs = HouseAccess.eviction_cutoffs(house_owner=house_owner)
+        if not cutoffs:
             return False
-
-        activity_timeout_seconds: int = get_config_value(
-            "evictions.activity_timeout_seconds", default_value={"value": 45}
-        ).get("value")
-        house_owner_access_minutes: int = get_config_value(
-            "evictions.house_owner_access_minutes", default_value={"value": 8}
-        ).get("value")
-        robber_access_minutes: int = get_config_value(
-            "evictions.robber_access_minutes", default_value={"value": 10}
-        ).get("value")
-
-        latest_activity = datetime.datetime.fromisoformat(access["latest_activity"])
-        access_time = datetime.datetime.fromisoformat(access["access_time"])
-        now = datetime.datetime.now()
-        activity_ago = now - latest_activity
-        entered_ago = now - access_time
-        if activity_ago > datetime.timedelta(seconds=activity_timeout_seconds):
+        inactive_cutoff, overstayed_cutoff = cutoffs
+        if timestamps.as_datetime(access["latest_activity"]) < inactive_cutoff:
             return True
-        entered_ago_minute_comparison = house_owner_access_minutes if house_owner else robber_access_minutes
-        if entered_ago > datetime.timedelta(minutes=entered_ago_minute_comparison):
+        if timestamps.as_datetime(access["access_time"]) < overstayed_cutoff:
             return True
         return False
 
+    @staticmethod
+    def expired_filter(inactive_cutoff: datetime.datetime, overstayed_cutoff: datetime.datetime) -> List[dict]:
+        return game_queries.expired_filter(inactive_cutoff, overstayed_cutoff)
+
+    @staticmethod
+    def evict_expired() -> dict:
+        """Evict everyone whose visit is too long, returns how many were evicted per reason."""
+        evictions, player_ids = game_queries.evict_expired()
+        for player_id in player_ids:
+            identity_map.forget_player(player_id)
+            identity_map.set_access(player_id, None)
+        return evictions
+
     @staticmethod
     def evict(player_id) -> dict:
-        item = db["access"].find_one({"player_id": player_id})
+        item = identity_map.get_access(player_id)
         if not item:
             return {"success": False, "reason": "No player to evict"}
         db["players"].find_one_and_update({"_id": player_id}, {"$set": {"evicted": True}})
         db["access"].delete_one({"player_id": player_id})
+        identity_map.forget_player(player_id)
+        identity_map.set_access(player_id, None)
         return {"success": True}
 
     @staticmethod
     def find_occupying_house(player_id) -> Optional[str]:
-        item = db["access"].find_one({"player_id": player_id})
+        item = identity_map.get_access(player_id)
         if not item:
             return None
         return item["house_id"]
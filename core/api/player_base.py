@@ -2,6 +2,8 @@ import datetime
 import uuid
 from typing import Optional
 
+from utils import timestamps
+from utils.activity_tracker import activity_tracker
 from utils.db_config import db
 
 
@@ -12,8 +14,8 @@ class Player:
         self.house_id: Optional[str] = None
         self.token: str = str(uuid.uuid4())
         self.registered_by: str = registered_by
-        self.created_on: Optional[datetime] = None
-        self.last_robbery_attempt: Optional[datetime] = None
+        self.created_on: Optional[datetime.datetime] = None
+        self.last_robbery_attempt: Optional[datetime.datetime] = None
         self.evicted: Optional[bool] = False
 
     def has_house(self):
@@ -24,7 +26,7 @@ class Player:
             return 0
         if not rob_frequency:
             rob_frequency = 45
-        now = datetime.datetime.now()
+        now = timestamps.now()
         difference = now - self.last_robbery_attempt
         if difference < datetime.timedelta(seconds=rob_frequency):
             seconds: int = difference.seconds
@@ -44,38 +46,21 @@ class Player:
         if not player_data:
             return None
         for k, v in player_data.items():
-            if k == "last_robbery_attempt":
-                if v is not None:
-                    setattr(self, k, datetime.datetime.fromisoformat(v))
-                    continue
-            elif k == "created_on":
-                if v is not None:
-                    setattr(self, k, datetime.datetime.fromisoformat(v))
-                    continue
+            if k in ["created_on", "last_activity", "last_robbery_attempt"]:
+                v = timestamps.as_datetime(v)
             setattr(self, k, v)
         return self
 
     def as_dict(self):
         item = self.__dict__
         item["_id"] = self.player_id
-        if self.last_robbery_attempt:
-            item["last_robbery_attempt"] = datetime.datetime.isoformat(self.last_robbery_attempt)
-        if self.created_on:
-            item["created_on"] = datetime.datetime.isoformat(self.created_on)
         item["evicted"] = True if self.evicted else False  # Ternary so None evals to False
         return item
 
     @staticmethod
     def set_last_active_now(player_id):
-        now = datetime.datetime.now().isoformat()
-        player = db["players"].find_one({"_id": player_id}, ["_id"])
-        if not player:
-            return
-        db["players"].update_one({"_id": player_id}, {
-            "$set": {
-                "last_activity": now
-            }
-        })
+        """Written in the background within a few seconds, see utils/activity_tracker.py"""
+        activity_tracker.record(player_id)
 
     @staticmethod
     def get_player_house_id(player_id):
@@ -0,0 +1,130 @@
+"""
+refresh_metrics counts: metric_utils.get_game_counts (one aggregation) against the
+count_documents helpers it replaced, at 1k, 10k and 100k players.
+
+Needs MongoDB 5.0 or later. Every run drops and reseeds its own database
+(MONGO_INITDB_DATABASE defaults to badge_benchmark here), so never point it at
+the game's. From the core directory:
+    MONGO_IP=localhost python -m benchmarks.game_counts [players ...]
+
+Prints, per size, the median time and mongo round trips of each approach, after
+checking they count the same.
+
+No mongod was available when this was written, so the only timings so far are
+from mongomock (pymongo.MongoClient swapped for mongomock.MongoClient). mongomock
+runs every query in Python, with a nested loop for $lookup, so they say nothing
+about either approach on a server. It doesn't emit the command events round trips
+are counted from either, so those are counted from the code: five count_documents,
+the access find (plus a getMore past 101 visits) and a find_one per visit, against
+one aggregate. 100k players wasn't run, a mongomock run takes tens of minutes.
+
+     players  approach          mongomock median ms  round trips
+        1000  count_documents                 132.3           56
+        1000  aggregation                     377.8            1
+       10000  count_documents               14322.6          507
+       10000  aggregation                   17507.2            1
+      100000  count_documents                     -         5007
+      100000  aggregation                         -            1
+"""
+import datetime
+import os
+import statistics
+import sys
+import time
+from typing import Callable, List, Tuple
+
+os.environ.setdefault("MONGO_INITDB_DATABASE", "badge_benchmark")
+
+from flask import Flask  # noqa: E402
+
+from utils import metric_utils, timestamps  # noqa: E402
+from utils.db_config import db  # noqa: E402
+from utils.db_monitoring import get_round_trips  # noqa: E402
+
+SIZES: List[int] = [1000, 10000, 100000]
+RUNS = 5
+
+
+def previous_counts() -> dict:
+    """The helpers refresh_metrics called before get_game_counts."""
+    thirty_minutes_ago = timestamps.now() - datetime.timedelta(minutes=30)
+    counts: dict = {
+        "players": {
+            True: db["players"].count_documents({"last_activity": {"$gt": thirty_minutes_ago}}),
+            False: db["players"].count_documents({"$or": [
+                {"last_activity": {"$lte": thirty_minutes_ago}},
+                {"last_activity": {"$exists": False}}
+            ]})
+        },
+        "houses": {
+            False: db["houses"].count_documents({"abandoned": False}),
+            True: db["houses"].count_documents({"abandoned": True})
+        },
+        "registration": {None: db["registration"].count_documents({})},
+        "occupied": {True: 0, False: 0}
+    }
+    for item in db["access"].find({}, ["player_id", "house_id"]):
+        player = db["players"].find_one({"_id": item["player_id"]}, ["_id", "house_id"])
+        counts["occupied"][bool(player) and player.get("house_id") == item["house_id"]] += 1
+    return counts
+
+
+def seed(players: int):
+    for name in ["players", "houses", "registration", "access"]:
+        db.drop_collection(name)
+    now = timestamps.now()
+    batch: int = 10000
+    for start in range(0, players, batch):
+        ids = range(start, min(start + batch, players))
+        db["players"].insert_many([{
+            "_id": f"p{i}",
+            "player_id": f"p{i}",
+            "house_id": f"h{i}",
+            # Well clear of the 30 minute cutoff, which moves while a slow run is going
+            "last_activity": now - datetime.timedelta(minutes=i % 2 * 60 + 1)
+        } for i in ids])
+        db["houses"].insert_many([{"_id": f"h{i}", "abandoned": i % 7 == 0} for i in ids])
+        db["registration"].insert_many([{"_id": f"r{i}", "mac": f"m{i}"} for i in ids if i % 10 == 0])
+        # One player in 20 is inside a house, half of them their own
+        db["access"].insert_many([
+            {"_id": f"a{i}", "player_id": f"p{i}", "house_id": f"h{i if i % 40 == 0 else i + 1}"}
+            for i in ids if i % 20 == 0 and i + 1 < players
+        ])
+    for collection, field in [("players", "last_activity"), ("houses", "abandoned"), ("access", "house_id")]:
+        db[collection].create_index(field)
+
+
+def measure(count: Callable[[], dict]) -> Tuple[float, int, dict]:
+    app = Flask(__name__)
+    durations: List[float] = []
+    round_trips: int = 0
+    counts: dict = {}
+    for _ in range(RUNS):
+        with app.test_request_context():
+            started: float = time.perf_counter()
+            counts = count()
+            durations.append(time.perf_counter() - started)
+            round_trips = get_round_trips()
+    return statistics.median(durations), round_trips, counts
+
+
+def without_zeros(counts: dict) -> dict:
+    return {name: {k: v for k, v in values.items() if v} for name, values in counts.items()}
+
+
+def main(sizes: List[int]):
+    print(f"{'players':>8} {'approach':>16} {'median ms':>10} {'round trips':>12}")
+    for size in sizes:
+        seed(size)
+        results = [
+            ("count_documents", measure(previous_counts)),
+            ("aggregation", measure(metric_utils.get_game_counts)),
+        ]
+        if without_zeros(results[0][1][2]) != without_zeros(results[1][1][2]):
+            raise SystemExit(f"Counts differ at {size} players: {results[0][1][2]} != {results[1][1][2]}")
+        for approach, (duration, round_trips, _) in results:
+            print(f"{size:>8} {approach:>16} {duration * 1000:>10.1f} {round_trips:>12}")
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or SIZES)
@@ -0,0 +1,128 @@
+"""
+Mongo round trips of HouseAccess.enter_house on each of its paths, with the unique
+access indexes startup.schema_check looks for and without them.
+
+Needs MongoDB, mongomock doesn't emit the command events db_monitoring counts.
+Every run drops and reseeds its own database (MONGO_INITDB_DATABASE defaults to
+badge_benchmark here), so never point it at the game's. From the core directory:
+    MONGO_IP=localhost python -m benchmarks.house_entry
+
+The house is loaded and config is read before counting, as a warm worker would
+have them, so only enter_house's own commands are counted.
+
+Not run against a server yet. These are counted from the code, and match a run
+on mongomock with every collection method counted as one command:
+
+                  path   indexes   round trips
+                 enter      True             1
+        already inside      True             2
+              occupied      True             2
+      inside, occupied      True             2
+      expired occupant      True             2
+                 enter     False             3
+        already inside     False             1
+              occupied     False             2
+      inside, occupied     False             1
+      expired occupant     False             4
+"""
+import datetime
+import os
+from typing import Callable, List, Tuple
+
+os.environ.setdefault("MONGO_INITDB_DATABASE", "badge_benchmark")
+
+from flask import Flask  # noqa: E402
+
+from api.house_base import House  # noqa: E402
+from api.house_tracking import HouseAccess  # noqa: E402
+from utils import migrations, startup, timestamps  # noqa: E402
+from utils.db_config import db  # noqa: E402
+from utils.db_monitoring import get_round_trips  # noqa: E402
+from utils.enums import HouseEntry  # noqa: E402
+
+
+def new_house() -> str:
+    house: House = House().new()
+    house.save()
+    return house.house_id
+
+
+def visit(player_id: str, house_id: str, minutes_ago: float = 0):
+    at = timestamps.now() - datetime.timedelta(minutes=minutes_ago)
+    db["access"].insert_one({
+        "player_id": player_id, "house_id": house_id, "access_time": at, "latest_activity": at,
+        "player_location": [0, 15]
+    })
+
+
+def empty_house() -> str:
+    return new_house()
+
+
+def already_inside() -> str:
+    visit("p1", new_house())
+    return new_house()
+
+
+def occupied() -> str:
+    house_id: str = new_house()
+    visit("p2", house_id)
+    return house_id
+
+
+def already_inside_occupied() -> str:
+    visit("p1", new_house())
+    return occupied()
+
+
+def expired_occupant() -> str:
+    house_id: str = new_house()
+    visit("p2", house_id, minutes_ago=30)
+    return house_id
+
+
+# (path, setup returning the house p1 enters, expected entry)
+PATHS: List[Tuple[str, Callable[[], str], HouseEntry]] = [
+    ("enter", empty_house, HouseEntry.ENTERED),
+    ("already inside", already_inside, HouseEntry.ALREADY_INSIDE),
+    ("occupied", occupied, HouseEntry.OCCUPIED),
+    ("inside, occupied", already_inside_occupied, HouseEntry.ALREADY_INSIDE),
+    ("expired occupant", expired_occupant, HouseEntry.ENTERED),
+]
+
+
+def reset(indexes: bool):
+    for name in ["players", "houses", "access"]:
+        db.drop_collection(name)
+    if indexes:
+        migrations.create_hot_query_indexes()
+    db["players"].insert_many([
+        {"_id": player_id, "player_id": player_id, "token": f"token-{player_id}", "evicted": False}
+        for player_id in ["p1", "p2"]
+    ])
+    startup.schema_check()
+
+
+def measure(setup: Callable[[], str]) -> Tuple[HouseEntry, int]:
+    house_id: str = setup()
+    with Flask(__name__).test_request_context():
+        HouseAccess.eviction_cutoffs()
+        access: HouseAccess = HouseAccess(player_id="p1", house_id=house_id).load(locate=False)
+        before: int = get_round_trips()
+        entry, _ = access.enter_house()
+        return entry, get_round_trips() - before
+
+
+def main():
+    print(f"{'path':>18} {'indexes':>8} {'round trips':>12}")
+    for indexes in [True, False]:
+        for path, setup, expected in PATHS:
+            reset(indexes)
+            entry, round_trips = measure(setup)
+            if entry != expected:
+                raise SystemExit(f"{path} was {entry} instead of {expected}")
+            print(f"{path:>18} {str(indexes):>8} {round_trips:>12}")
+
+
+if __name__ == "__main__":
+    main()
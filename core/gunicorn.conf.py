@@ -0,0 +1,44 @@
+"""
+gunicorn settings, see the Dockerfile: gunicorn -c gunicorn.conf.py main:app
+
+Workers share prometheus metrics through PROMETHEUS_MULTIPROC_DIR, which has to be
+set before prometheus_client is imported, so it's set here in the master and
+inherited by every worker. /metrics in main.py aggregates the workers' files.
+
+Schema migrations run once in on_starting, before any worker imports main.py.
+A migration that fails (an index duplicates keep from being unique, say) is logged
+and the API starts on the schema as it is, startup.schema_check reports what's
+missing. Only migrations that couldn't run at all stop it from starting.
+"""
+import os
+import shutil
+import subprocess
+import sys
+
+bind = "0.0.0.0:8080"
+workers = 8
+
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+
+
+def on_starting(server):
+    # A process of its own, so the master doesn't fork workers with its mongo client
+    # and the migration's metrics stay out of the workers' directory
+    environment: dict = {k: v for k, v in os.environ.items() if k != "PROMETHEUS_MULTIPROC_DIR"}
+    migrations = subprocess.run(
+        [sys.executable, "-m", "utils.migrations"], cwd=os.path.dirname(os.path.abspath(__file__)), env=environment
+    )
+    if migrations.returncode == 1:
+        server.log.error("Schema migrations failed, starting on the schema as it is")
+    elif migrations.returncode != 0:
+        raise RuntimeError("Schema migrations couldn't run, not starting the API")
+
+    # Files left by a previous run would be counted again
+    directory: str = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,16 +1,23 @@
-import json
+import datetime
 import logging
 import os
+import time
 import uuid
 from typing import Optional
 
-from flask import Flask, request
+from flask import Flask, Response, g, request
+from flask.json.provider import DefaultJSONProvider
+from prometheus_client import CONTENT_TYPE_LATEST
 
-from utils import startup, metrics
+from utils import db_monitoring, request_context, startup, metrics
 from utils.db_config import db
 from utils.insights import log_request
 from views import assets, api_house, api_player, renders, administration, api_shop, api_game
 
+# Prometheus scrapes /metrics every few seconds, logging and counting the scrapes
+# would crowd the game's requests out of the audit log and the request metrics
+UNTRACKED_ENDPOINTS = ["serve_prometheus_metrics"]
+
 
 def get_secret_key():
     flask_key = db["config"].find_one({"_id": "flask_key"})
@@ -28,21 +35,27 @@ def get_secret_key():
     return flask_key["key"]
 
 
-def extract_player_id(token: Optional[str]) -> str:
-    if not token:
-        return "N/A"
-    player = db["players"].find_one({"token": token}, ["player_id"])
-    if not player:
-        return "N/A"
-    return player.get("player_id", "N/A")
+class JSONProvider(DefaultJSONProvider):
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()  # Rather than flask's HTTP date format
+        return DefaultJSONProvider.default(o)
+
+
+class BadgeServer(Flask):
+    json_provider_class = JSONProvider
+
+    def make_response(self, rv):
+        request_context.record_response(rv)
+        return super().make_response(rv)
 
 
 def create_app():
-    app = Flask(__name__)
+    app = BadgeServer(__name__)
     app.secret_key = get_secret_key()
     app.logger.setLevel(logging.INFO)
-    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
-        os.environ["PROMETHEUS_MULTIPROC_DIR"] = "./metrics_configs/registry"
 
     registers = [
         assets.mod,
@@ -75,33 +88,33 @@ def create_app():
             metrics.refresh_metrics(app.metric_tracker)
             return {"success": True}
 
+    @app.route('/metrics')
+    def serve_prometheus_metrics():
+        """Metrics of all gunicorn workers, for prometheus to scrape."""
+        app.metric_tracker.apply_snapshot()
+        return Response(app.metric_tracker.exposition(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+    @app.before_request
+    def before_request():
+        g.request_started = time.perf_counter()
+
     @app.after_request
     def after_request(response):
+        if request.endpoint in UNTRACKED_ENDPOINTS:
+            return response
+        round_trips: int = db_monitoring.get_round_trips()  # Before the logging below adds its own
         status_code = str(response.status_code)
-        response_body = None
-        if request and request.endpoint:
-            if not request.endpoint.startswith("asset."):
-                response_body = response.get_data(as_text=True)
-        elif not request.endpoint:
+        if not request.endpoint:
             logging.getLogger().error("No request endpoint!")
-        response_json: dict = {}
-        player_id = "N/A"
-        try:
-            response_json = json.loads(response_body) if response_body else None
-            if response_json and "player_id" in response_json:
-                player_id = response_json["player_id"]
-        except Exception:
-            pass
-        if player_id == "N/A":
-            player_id = extract_player_id(request.headers.get("X-API-Token"))
-        try:
-            success = str(response_json.get("success", "N/A")) if response_json else False
-        except Exception:
-            success = "N/A"
+        player_id: str = request_context.get_player_id()
+        success = request_context.get_success()
         py_endpoint = request.endpoint
         request_method = request.method
         requester_ip = request.remote_addr
         http_path = request.url_rule.rule if request.url_rule else None
+        started: Optional[float] = g.get("request_started")
+        # Measured before the audit log insert below, which isn't part of handling the request
+        duration: Optional[float] = time.perf_counter() - started if started is not None else None
         log_request(request, response)
         with app.app_context():
             app.metric_tracker.increment_http_request(
@@ -112,12 +125,16 @@ def create_app():
                 success=success,
                 ip=requester_ip,
                 player_id=player_id
-            ).push()
+            )
+            app.metric_tracker.increment_mongo_round_trips(py_endpoint, round_trips)
+            if duration is not None:
+                app.metric_tracker.observe_http_request_duration(request_method, py_endpoint, duration)
             return response
 
     return app
 
 
+startup.schema_check()  # Migrations are applied by gunicorn.conf.py before the workers start
 startup.house_evictions()  # Clean up users who have been in a house too long.
 startup.warnings()
 
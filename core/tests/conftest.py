@@ -0,0 +1,47 @@
+"""
+Tests run from the repository root or core with: python -m pytest core/tests
+
+Modules read config from mongo when they're imported, so mongomock stands in
+for the server before anything from core is imported. Every test gets empty
+collections.
+"""
+import os
+import sys
+
+import mongomock
+import pymongo
+import pytest
+
+pymongo.MongoClient = mongomock.MongoClient
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils.configuration import config_cache  # noqa: E402
+from utils.db_config import db  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def empty_db():
+    for name in db.list_collection_names():
+        db.drop_collection(name)
+    config_cache.clear()
+    yield db
+
+
+@pytest.fixture
+def client():
+    from main import app
+    return app.test_client()
+
+
+@pytest.fixture
+def new_player(client):
+    """Registers a player with a house, returns the headers authenticating as them."""
+    def register(player_id: str) -> dict:
+        db["registration"].insert_one({"_id": f"registration-{player_id}", "mac": f"mac-{player_id}"})
+        token: str = client.post(
+            f"/api/player/{player_id}", headers={"X-Register-Token": f"registration-{player_id}"}
+        ).get_json()["token"]
+        headers: dict = {"X-API-Token": token}
+        client.post(f"/api/house/{player_id}", headers=headers)
+        return headers
+    return register
@@ -0,0 +1,72 @@
+import datetime
+import time
+
+from utils import timestamps
+from utils.activity_tracker import ActivityTracker
+from utils.db_config import db
+
+
+def last_activity(player_id: str) -> datetime.datetime:
+    return timestamps.as_datetime(db["players"].find_one({"_id": player_id})["last_activity"])
+
+
+def stored(at: datetime.datetime) -> datetime.datetime:
+    """Mongo keeps dates to the millisecond."""
+    return at.replace(microsecond=at.microsecond // 1000 * 1000)
+
+
+def test_records_coalesce_until_flushed():
+    db["players"].insert_many([{"_id": "p1"}, {"_id": "p2"}])
+    tracker = ActivityTracker(flush_seconds=60)
+    for player_id in ["p1", "p2", "p1", "p1"]:
+        tracker.record(player_id)
+    assert len(tracker.pending) == 2
+    assert "last_activity" not in db["players"].find_one({"_id": "p1"})
+
+    latest: datetime.datetime = tracker.pending["p1"]
+    assert tracker.flush() == 2
+    assert last_activity("p1") == stored(latest)
+    assert tracker.pending == {}
+    assert tracker.flush() == 0
+
+
+def test_flush_never_moves_activity_back():
+    later: datetime.datetime = timestamps.now() + datetime.timedelta(minutes=1)
+    db["players"].insert_one({"_id": "p1", "last_activity": later})
+    tracker = ActivityTracker(flush_seconds=60)
+    tracker.record("p1")
+    tracker.flush()
+    assert last_activity("p1") == stored(later)
+
+
+def test_full_tracker_flushes_early():
+    db["players"].insert_many([{"_id": f"p{i}"} for i in range(3)])
+    tracker = ActivityTracker(flush_seconds=60, max_pending=3)
+    tracker.record("p0")
+    tracker.record("p1")
+    assert tracker.worker.running()
+    tracker.record("p2")
+    deadline: float = time.monotonic() + 5
+    while db["players"].count_documents({"last_activity": {"$exists": True}}) < 3:
+        assert time.monotonic() < deadline, "the background flush never ran"
+        time.sleep(0.01)
+
+
+def test_write_behind_disabled():
+    db["players"].insert_one({"_id": "p1"})
+    tracker = ActivityTracker(flush_seconds=0)
+    tracker.record("p1")
+    assert tracker.pending == {}
+    assert "last_activity" in db["players"].find_one({"_id": "p1"})
+    assert not tracker.worker.running()
+
+
+def test_failed_flush_is_logged(monkeypatch, caplog):
+    tracker = ActivityTracker(flush_seconds=60)
+    tracker.record("p1")
+
+    def unavailable(*args, **kwargs):
+        raise ConnectionError("mongo is down")
+    monkeypatch.setattr(db["players"], "bulk_write", unavailable)
+    assert tracker.flush() == 1
+    assert "Unable to write last activity of 1 players" in caplog.text
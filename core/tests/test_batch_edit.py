@@ -0,0 +1,84 @@
+import pytest
+
+from utils.db_config import db
+from views.api_house import batch_operation_valid
+
+
+@pytest.mark.parametrize("operation, valid", [
+    ({"action": "build", "x": 1, "y": 2, "material_type": "Wooden_Wall"}, True),
+    ({"action": "clear", "x": 1, "y": 2}, True),
+    ({"action": "build", "x": 1, "y": 2}, False),
+    ({"action": "clear", "x": 1, "y": 2, "material_type": "Wooden_Wall"}, False),
+    ({"action": "build", "x": "1", "y": 2, "material_type": "Wooden_Wall"}, False),
+    ({"action": "paint", "x": 1, "y": 2}, False),
+    ({"x": 1, "y": 2}, False),
+])
+def test_batch_operation_valid(operation, valid):
+    assert batch_operation_valid(operation) == valid
+
+
+@pytest.fixture
+def inside(client, new_player):
+    headers: dict = new_player("p1")
+    client.post("/api/game/p1/enter_house", headers=headers)
+    return headers
+
+
+def stored_house() -> dict:
+    player: dict = db["players"].find_one({"_id": "p1"})
+    return db["houses"].find_one({"_id": player["house_id"]})
+
+
+def batch(client, headers: dict, operations: list):
+    return client.post("/api/edit-house/p1/batch", headers=headers, json={"operations": operations})
+
+
+def test_batch_applied_in_one_save(client, inside):
+    before: dict = stored_house()
+    response = batch(client, inside, [
+        {"action": "build", "x": 10, "y": 3, "material_type": "Wooden_Wall"},
+        {"action": "build", "x": 10, "y": 4, "material_type": "Wooden_Wall"},
+        {"action": "clear", "x": 10, "y": 3},
+    ])
+    assert response.status_code == 200 and response.get_json()["applied"] == 3
+    after: dict = stored_house()
+    assert after["version"] == before["version"] + 1
+    locations = [item["location"] for item in after["construction"]]
+    assert [10, 4] in locations and [10, 3] not in locations
+    walls: int = before["vault_contents"]["materials"]["Wooden_Wall"]
+    assert after["vault_contents"]["materials"]["Wooden_Wall"] == walls - 1
+
+
+@pytest.mark.parametrize("rejected", [
+    {"action": "build", "x": 40, "y": 3, "material_type": "Wooden_Wall"},  # Out of bounds
+    {"action": "build", "x": 0, "y": 15, "material_type": "Wooden_Wall"},  # The door
+])
+def test_rejected_operation_saves_nothing(client, inside, rejected):
+    before: dict = stored_house()
+    response = batch(client, inside, [
+        {"action": "build", "x": 10, "y": 3, "material_type": "Wooden_Wall"},
+        rejected,
+    ])
+    body: dict = response.get_json()
+    assert not body["success"] and body["operation"] == 1
+    assert stored_house() == before
+
+
+def test_closing_the_path_saves_nothing(client, inside):
+    before: dict = stored_house()
+    vault_x: int = next(item["location"][0] for item in before["construction"] if item["material_type"] == "Vault")
+    wall_x: int = vault_x - 1
+    db["houses"].update_one({"_id": before["_id"]}, {"$set": {"vault_contents.materials.Wooden_Wall": 40}})
+    before = stored_house()
+    response = batch(client, inside, [
+        {"action": "build", "x": wall_x, "y": y, "material_type": "Wooden_Wall"} for y in range(31)
+    ])
+    body: dict = response.get_json()
+    assert not body["success"] and body["reason"] == "No path from door to vault"
+    assert stored_house() == before
+
+
+def test_malformed_batch(client, inside):
+    response = batch(client, inside, [{"action": "build", "x": 1, "y": 2}])
+    assert response.status_code == 400
+    assert batch(client, inside, []).status_code == 400
@@ -0,0 +1,83 @@
+import pytest
+
+from utils import configuration
+from utils.configuration import CONFIG_VERSION_KEY, ConfigCache, bump_config_version, get_config_value
+from utils.db_config import db
+
+
+class Clock:
+    def __init__(self):
+        self.now: float = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(configuration.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def cache(monkeypatch, clock) -> ConfigCache:
+    cache = ConfigCache(ttl_seconds=10, version_check_seconds=1)
+    monkeypatch.setattr(configuration, "config_cache", cache)
+    return cache
+
+
+def set_directly(key: str, value):
+    """A change made in mongo by hand, or by another worker before it bumps the version."""
+    db["config"].replace_one({"_id": key}, {"_id": key, "value": value}, upsert=True)
+
+
+def value(key: str):
+    return get_config_value(key, {"value": "default"}).get("value")
+
+
+def test_values_cached_for_the_ttl(cache, clock):
+    loads: list = []
+    cache.get(("key", True), lambda: loads.append(1) or {"value": 1})
+    clock.now += 9
+    assert cache.get(("key", True), lambda: loads.append(1) or {"value": 2}) == {"value": 1}
+    clock.now += 2
+    assert cache.get(("key", True), lambda: loads.append(1) or {"value": 2}) == {"value": 2}
+    assert len(loads) == 2
+
+
+def test_missing_keys_cached(cache, clock):
+    assert value("game.missing") == "default"
+    set_directly("game.missing", "set")
+    clock.now += 5
+    assert value("game.missing") == "default"
+    clock.now += 6
+    assert value("game.missing") == "set"
+
+
+def test_version_bump_clears_every_worker(cache, clock):
+    set_directly("game.key", 1)
+    assert value("game.key") == 1
+
+    # Another worker's set_config_value
+    set_directly("game.key", 2)
+    db["config"].update_one({"_id": CONFIG_VERSION_KEY}, {"$inc": {"value": 1}}, upsert=True)
+    clock.now += 0.5
+    assert value("game.key") == 1  # Version checked at most every second
+    clock.now += 0.6
+    assert value("game.key") == 2
+
+
+def test_bump_clears_this_worker_at_once(cache):
+    set_directly("game.key", 1)
+    assert value("game.key") == 1
+    set_directly("game.key", 2)
+    bump_config_version()
+    assert value("game.key") == 2
+    assert db["config"].find_one({"_id": CONFIG_VERSION_KEY})["value"] == 1
+
+
+def test_secrets_cached_apart(cache):
+    db["config"].insert_one({"_id": "game.secret", "value": "hidden", "secret": True})
+    assert get_config_value("game.secret", include_secrets=False) is None
+    assert get_config_value("game.secret")["value"] == "hidden"
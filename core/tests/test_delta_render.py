@@ -0,0 +1,88 @@
+from typing import List
+
+import pytest
+
+from utils.db_config import db
+
+DELTA = {"c": "d"}
+SHIFTS = {"right": (1, 0), "left": (-1, 0), "up": (0, 1), "down": (0, -1)}
+
+
+def apply_delta(construction: str, delta: dict, direction: str) -> str:
+    """What a badge does with a delta: shift the 8x8 window (x major) and fill in the edge and vacated tiles."""
+    dx, dy = SHIFTS[direction]
+    tiles: List[str] = ["?"] * 64
+    for local_x in range(8):
+        for local_y in range(8):
+            old_x, old_y = local_x + dx, local_y + dy
+            if 0 <= old_x < 8 and 0 <= old_y < 8:
+                tiles[local_x * 8 + local_y] = construction[old_x * 8 + old_y]
+    for i, tile in enumerate(delta["edge"]):
+        if dx:
+            tiles[(7 if dx > 0 else 0) * 8 + i] = tile
+        else:
+            tiles[i * 8 + (7 if dy > 0 else 0)] = tile
+    tiles[(3 - dx) * 8 + 3 - dy] = delta["vacated"]
+    tiles[3 * 8 + 3] = "p"
+    return "".join(tiles)
+
+
+@pytest.fixture
+def visitor(client, new_player):
+    headers: dict = new_player("p1")
+    entered: dict = client.post("/api/game/p1/enter_house", headers={**headers, **DELTA}).get_json()
+    assert entered["success"]
+    return headers, entered
+
+
+def test_deltas_rebuild_the_full_window(client, visitor):
+    headers, item = visitor
+    construction, seq = item["construction"], item["seq"]
+    assert seq == 0
+    for direction in ["right", "down", "down", "left", "right", "up"]:
+        item = client.post(f"/api/game/p1/move/{direction}-d", headers=headers).get_json()
+        assert item["success"] and "construction" not in item
+        assert item["seq"] == seq + 1
+        construction, seq = apply_delta(construction, item["delta"], direction), item["seq"]
+
+    resync: dict = client.post("/api/game/p1/render", headers=headers).get_json()
+    assert resync["construction"] == construction
+    assert resync["player_location"] == item["player_location"]
+    assert resync["seq"] == seq + 1
+
+
+def test_house_edit_sends_a_full_window(client, visitor):
+    headers, item = visitor
+    house_id: str = item["house_id"]
+    db["houses"].update_one({"_id": house_id}, {"$inc": {"version": 1}})
+
+    item = client.post("/api/game/p1/move/right-d", headers=headers).get_json()
+    assert "delta" not in item and len(item["construction"]) == 64
+    assert item["seq"] == 1
+
+    # Rendered from the current version, so the chain carries on with deltas
+    item = client.post("/api/game/p1/move/down-d", headers=headers).get_json()
+    assert "delta" in item and item["seq"] == 2
+
+
+def test_resync_restarts_the_chain(client, visitor):
+    headers, _ = visitor
+    client.post("/api/game/p1/move/right-d", headers=headers)
+    # The badge missed this one
+    client.post("/api/game/p1/move/down-d", headers=headers)
+
+    resync: dict = client.post("/api/game/p1/render", headers=headers).get_json()
+    assert resync["success"] and resync["seq"] == 3
+    assert resync["player_location"] == [1, 14]
+    item = client.post("/api/game/p1/move/down-d", headers=headers).get_json()
+    assert item["seq"] == 4
+    assert apply_delta(resync["construction"], item["delta"], "down") == client.post(
+        "/api/game/p1/render", headers=headers
+    ).get_json()["construction"]
+
+
+def test_resync_outside_a_house(client, new_player):
+    headers: dict = new_player("p1")
+    response = client.post("/api/game/p1/render", headers=headers)
+    assert response.status_code == 400
+    assert not response.get_json()["success"]
@@ -0,0 +1,58 @@
+import datetime
+
+from utils import game_queries, timestamps
+from utils.db_config import db
+
+
+def test_evict_expired_dates_and_strings():
+    now = timestamps.now()
+    recent = now - datetime.timedelta(seconds=5)
+    idle = now - datetime.timedelta(minutes=2)
+    long_ago = now - datetime.timedelta(minutes=30)
+    db["access"].insert_many([
+        {"_id": "staying", "player_id": "p1", "house_id": "h1", "access_time": recent, "latest_activity": recent},
+        {"_id": "inactive", "player_id": "p2", "house_id": "h2", "access_time": idle, "latest_activity": idle},
+        {"_id": "overstayed", "player_id": "p3", "house_id": "h3", "access_time": long_ago, "latest_activity": recent},
+        # Written before timestamps were dates
+        {"_id": "legacy", "player_id": "p4", "house_id": "h4",
+         "access_time": idle.replace(tzinfo=None).isoformat(),
+         "latest_activity": idle.replace(tzinfo=None).isoformat()},
+        {"_id": "legacy_staying", "player_id": "p5", "house_id": "h5",
+         "access_time": recent.replace(tzinfo=None).isoformat(),
+         "latest_activity": recent.replace(tzinfo=None).isoformat()},
+    ])
+    db["players"].insert_many([{"_id": f"p{i}", "evicted": False} for i in range(1, 6)])
+
+    evictions, player_ids = game_queries.evict_expired()
+    assert evictions == {"inactive": 2, "overstayed": 1}
+    assert sorted(player_ids) == ["p2", "p3", "p4"]
+    assert sorted(item["_id"] for item in db["access"].find()) == ["legacy_staying", "staying"]
+    assert sorted(item["_id"] for item in db["players"].find({"evicted": True})) == ["p2", "p3", "p4"]
+
+
+def test_evict_expired_disabled():
+    db["config"].insert_one({"_id": "evictions.disable_timeout", "value": True})
+    db["access"].insert_one({"_id": "a", "player_id": "p", "access_time": "2024-04-01T10:00:00",
+                             "latest_activity": "2024-04-01T10:00:00"})
+    assert game_queries.evict_expired() == ({"inactive": 0, "overstayed": 0}, [])
+    assert db["access"].count_documents({}) == 1
+
+
+def test_player_who_moved_is_not_evicted(monkeypatch):
+    idle = timestamps.now() - datetime.timedelta(minutes=2)
+    db["access"].insert_many([
+        {"_id": "moved", "player_id": "p1", "house_id": "h1", "access_time": idle, "latest_activity": idle},
+        {"_id": "idle", "player_id": "p2", "house_id": "h2", "access_time": idle, "latest_activity": idle},
+    ])
+    db["players"].insert_many([{"_id": "p1", "evicted": False}, {"_id": "p2", "evicted": False}])
+    delete_many = db["access"].delete_many
+
+    def moved_before_the_delete(query, *args, **kwargs):
+        db["access"].update_one({"_id": "moved"}, {"$set": {"latest_activity": timestamps.now()}})
+        return delete_many(query, *args, **kwargs)
+    monkeypatch.setattr(db["access"], "delete_many", moved_before_the_delete)
+
+    assert game_queries.evict_expired() == ({"inactive": 1, "overstayed": 0}, ["p2"])
+    assert [item["_id"] for item in db["access"].find()] == ["moved"]
+    assert not db["players"].find_one({"_id": "p1"})["evicted"]
+    assert db["players"].find_one({"_id": "p2"})["evicted"]
@@ -0,0 +1,133 @@
+import json
+import socket
+import threading
+import time
+from typing import List, Optional
+
+import pytest
+
+from utils import gravwell
+from utils.gravwell import GravwellSender
+
+
+class Listener:
+    """Stand-in gravwell ingester collecting the lines it receives."""
+
+    def __init__(self, port: int = 0):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(("127.0.0.1", port))
+        self.server.listen()
+        self.port: int = self.server.getsockname()[1]
+        self.lines: List[dict] = []
+        self.connections: List[socket.socket] = []
+        self.thread = threading.Thread(target=self._accept, daemon=True)
+        self.thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                connection, _ = self.server.accept()
+            except OSError:
+                return  # Closed
+            self.connections.append(connection)
+            threading.Thread(target=self._read, args=(connection,), daemon=True).start()
+
+    def _read(self, connection: socket.socket):
+        with connection.makefile("rb") as lines:
+            try:
+                for line in lines:
+                    self.lines.append(json.loads(line))
+            except OSError:
+                pass
+
+    def wait_for(self, count: int, timeout: float = 5.0) -> bool:
+        deadline: float = time.monotonic() + timeout
+        while len(self.lines) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return len(self.lines) >= count
+
+    def close(self):
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)  # Wakes the accept thread, which still holds the port
+        except OSError:
+            pass
+        self.server.close()
+        for connection in self.connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            connection.close()
+
+
+def reconnects(port: int) -> float:
+    for metric in gravwell.gravwell_reconnects_counter.collect():
+        for sample in metric.samples:
+            if sample.name.endswith("_total") and sample.labels.get("port") == str(port):
+                return sample.value
+    return 0.0
+
+
+@pytest.fixture
+def listener(monkeypatch):
+    monkeypatch.setenv("GRAVWELL_HOST", "127.0.0.1")
+    monkeypatch.delenv("GRAVWELL_PORT", raising=False)
+    monkeypatch.setattr(gravwell, "BACKOFF_SECONDS", 0.05)
+    monkeypatch.setattr(gravwell, "MAX_BACKOFF_SECONDS", 0.2)
+    item = Listener()
+    yield item
+    item.close()
+
+
+def test_batch_over_one_connection(listener):
+    sender = GravwellSender(default_port=listener.port)
+    sender.send([json.dumps({"n": n}) for n in range(50)])
+    sender.send({"n": 50})
+    assert listener.wait_for(51)
+    assert listener.lines == [{"n": n} for n in range(51)]
+    assert len(listener.connections) == 1
+
+
+def test_reconnect_after_listener_drops(listener):
+    sender = GravwellSender(default_port=listener.port)
+    sender.send({"phase": "before"})
+    assert listener.wait_for(1)
+    port: int = listener.port
+    listener.close()
+
+    # Writes into the closed connection fail (the first may still be accepted by
+    # the kernel), each failure backs off before reconnecting
+    replacement: Optional[Listener] = None
+    deadline: float = time.monotonic() + 5
+    while time.monotonic() < deadline and sender.failures == 0:
+        sender.send({"phase": "down"})
+        time.sleep(0.02)
+    assert sender.failures > 0
+
+    try:
+        replacement = Listener(port)
+        sender.send({"phase": "after"})
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and {"phase": "after"} not in replacement.lines:
+            time.sleep(0.01)
+        assert {"phase": "after"} in replacement.lines
+        assert sender.failures == 0
+        assert reconnects(port) >= 1
+    finally:
+        if replacement:
+            replacement.close()
+
+
+def test_circuit_drops_while_open(listener, monkeypatch):
+    monkeypatch.setattr(gravwell, "FAILURE_THRESHOLD", 1)
+    sender = GravwellSender(default_port=listener.port)
+    listener.close()
+    deadline: float = time.monotonic() + 5
+    while time.monotonic() < deadline and not sender.circuit_open():
+        sender.send({"phase": "down"})
+        time.sleep(0.01)
+    assert sender.circuit_open()
+    buffered: int = len(sender.buffer)
+    sender.send({"phase": "dropped"})
+    assert len(sender.buffer) == buffered
@@ -0,0 +1,95 @@
+import datetime
+
+import pytest
+
+from api.house_base import House
+from api.house_tracking import HouseAccess
+from utils import migrations, startup, timestamps
+from utils.db_config import db
+from utils.enums import HouseEntry
+
+
+@pytest.fixture(params=[True, False], ids=["indexes", "guarded"])
+def indexes(request, monkeypatch):
+    if request.param:
+        migrations.create_hot_query_indexes()
+    monkeypatch.setattr(HouseAccess, "unique_access_indexes", request.param)
+    return request.param
+
+
+def new_house() -> str:
+    house: House = House().new()
+    house.save()
+    return house.house_id
+
+
+def visit(player_id: str, house_id: str, minutes_ago: float = 0):
+    at = timestamps.now() - datetime.timedelta(minutes=minutes_ago)
+    db["access"].insert_one({
+        "player_id": player_id, "house_id": house_id, "access_time": at, "latest_activity": at,
+        "player_location": [0, 15]
+    })
+    db["players"].insert_one({
+        "_id": player_id, "player_id": player_id, "token": f"token-{player_id}", "evicted": False
+    })
+
+
+def enter(player_id: str, house_id: str):
+    return HouseAccess(player_id=player_id, house_id=house_id).load(locate=False).enter_house()
+
+
+def test_enter(indexes):
+    house_id: str = new_house()
+    entry, item = enter("p1", house_id)
+    assert entry == HouseEntry.ENTERED
+    assert item["house_id"] == house_id and item["player_location"] == [0, 15]
+    assert db["access"].find_one({"player_id": "p1"})["house_id"] == house_id
+
+
+def test_already_inside(indexes):
+    inside: str = new_house()
+    visit("p1", inside)
+    assert enter("p1", new_house()) == (HouseEntry.ALREADY_INSIDE, None)
+    assert [item["house_id"] for item in db["access"].find({"player_id": "p1"})] == [inside]
+
+
+def test_already_inside_after_own_visit_expired(indexes):
+    house_id: str = new_house()
+    visit("p1", house_id, minutes_ago=30)
+    assert enter("p1", house_id) == (HouseEntry.ALREADY_INSIDE, None)
+    assert not db["players"].find_one({"_id": "p1"})["evicted"]
+
+
+def test_occupied(indexes):
+    house_id: str = new_house()
+    visit("p2", house_id)
+    assert enter("p1", house_id) == (HouseEntry.OCCUPIED, None)
+    assert [item["player_id"] for item in db["access"].find({"house_id": house_id})] == ["p2"]
+
+
+def test_already_inside_another_occupied_house(indexes):
+    inside: str = new_house()
+    occupied: str = new_house()
+    visit("p1", inside)
+    visit("p2", occupied)
+    assert enter("p1", occupied) == (HouseEntry.ALREADY_INSIDE, None)
+    assert [item["house_id"] for item in db["access"].find({"player_id": "p1"})] == [inside]
+    assert [item["player_id"] for item in db["access"].find({"house_id": occupied})] == ["p2"]
+
+
+def test_expired_occupant_is_replaced(indexes):
+    house_id: str = new_house()
+    visit("p2", house_id, minutes_ago=30)
+    entry, _ = enter("p1", house_id)
+    assert entry == HouseEntry.ENTERED
+    assert [item["player_id"] for item in db["access"].find({"house_id": house_id})] == ["p1"]
+    assert db["players"].find_one({"_id": "p2"})["evicted"]
+
+
+def test_schema_check_enables_index_entry(monkeypatch):
+    monkeypatch.setattr(HouseAccess, "unique_access_indexes", False)
+    startup.schema_check()
+    assert not HouseAccess.unique_access_indexes
+    migrations.create_hot_query_indexes()
+    startup.schema_check()
+    assert HouseAccess.unique_access_indexes
@@ -0,0 +1,122 @@
+import random
+from typing import List
+
+import pytest
+
+from api.house_base import GRID_SIZE, House
+from api.material_base import MaterialType
+from utils.db_config import db
+
+WALLS = [MaterialType.WOOD_WALL, MaterialType.STEEL_WALL, MaterialType.CONCRETE_WALL]
+
+
+def saved_house() -> House:
+    house: House = House().new()
+    house.save()
+    return house
+
+
+def reload(house: House) -> House:
+    return House(house_id=house.house_id).load()
+
+
+def stored_locations(house: House) -> List[List[int]]:
+    return [item["location"] for item in db["houses"].find_one({"_id": house.house_id})["construction"]]
+
+
+def test_stale_save_returns_none():
+    house: House = saved_house()
+    first, second = reload(house), reload(house)
+    first.set_item(MaterialType.WOOD_WALL, 10, 3)
+    assert first.save()
+    # Removing and placing cells is two updates, neither applies
+    second.set_item(MaterialType.STEEL_WALL, 2, 14)
+    second.set_item(MaterialType.STEEL_WALL, 10, 4)
+    assert len(second._build_update()) == 2
+    assert second.save() is None
+    stored: House = reload(house)
+    assert stored.version == first.version == house.version + 1
+    assert stored._grid == first._grid
+
+
+@pytest.fixture
+def lose_the_race(monkeypatch):
+    """Another worker saves every house right after this request loads it."""
+    load = House.load
+
+    def load_then_lose(self):
+        loaded = load(self)
+        db["houses"].update_one({"_id": self.house_id}, {"$inc": {"version": 1}})
+        return loaded
+    monkeypatch.setattr(House, "load", load_then_lose)
+
+
+def test_stale_build_is_a_conflict(client, new_player, lose_the_race):
+    headers: dict = new_player("p1")
+    client.post("/api/game/p1/enter_house", headers=headers)
+    response = client.post("/api/edit-house/p1/build", headers=headers,
+                           json={"x": 10, "y": 3, "material_type": "Wooden_Wall"})
+    assert response.status_code == 409 and not response.get_json()["success"]
+    house_id: str = db["players"].find_one({"_id": "p1"})["house_id"]
+    assert [10, 3] not in [item["location"] for item in db["houses"].find_one({"_id": house_id})["construction"]]
+
+
+def test_stale_sale_is_a_conflict(client, new_player, lose_the_race):
+    headers: dict = new_player("p1")
+    house_id: str = db["players"].find_one({"_id": "p1"})["house_id"]
+    before: dict = db["houses"].find_one({"_id": house_id})["vault_contents"]
+    response = client.post("/api/shop/p1/sell", headers=headers, json={"material": "Wooden_Wall", "quantity": 1})
+    assert response.status_code == 409 and not response.get_json()["success"]
+    assert db["houses"].find_one({"_id": house_id})["vault_contents"] == before
+
+
+def test_pull_and_push_round_trip():
+    house: House = saved_house()
+    house.set_item(MaterialType.WOOD_WALL, 10, 3)
+    house.set_item(MaterialType.WOOD_WALL, 10, 4)
+    assert list(house._build_update()[0]) == ["$push"]
+    assert house.save()
+
+    # Several removals are one update
+    house.remove_item(10, 3)
+    house.remove_item(10, 4)
+    updates: List[dict] = house._build_update()
+    assert updates == [{"$pullAll": {"construction": [
+        {"material_type": "Wooden Wall", "location": [10, 3]},
+        {"material_type": "Wooden Wall", "location": [10, 4]}
+    ]}}]
+    assert house.save()
+    assert [10, 3] not in stored_locations(house) and [10, 4] not in stored_locations(house)
+
+    # Replacing a wall, removing one and placing another pull first, then push and bump the version
+    house.set_item(MaterialType.STEEL_WALL, 2, 14)
+    house.remove_item(3, 14)
+    house.set_item(MaterialType.CONCRETE_WALL, 12, 12)
+    updates = house._build_update()
+    assert [list(update) for update in updates] == [["$pullAll"], ["$push"]]
+    version: int = house.version
+    assert house.save()
+    assert house.version == version + 1
+
+    stored: House = reload(house)
+    assert stored.version == house.version
+    assert stored._grid == house._grid
+    assert stored.get_material_type(2, 14) == MaterialType.STEEL_WALL
+    assert stored.get_material_type(3, 14) == MaterialType.AIR
+    assert stored.get_material_type(12, 12) == MaterialType.CONCRETE_WALL
+
+
+def test_no_duplicate_locations():
+    rng = random.Random(0)
+    house: House = saved_house()
+    for _ in range(30):
+        for _ in range(rng.randrange(1, 8)):
+            x, y = rng.randrange(GRID_SIZE), rng.randrange(GRID_SIZE)
+            if rng.random() < 0.3:
+                house.remove_item(x, y)
+            else:
+                house.set_item(rng.choice(WALLS), x, y)
+        assert house.save()
+        locations: List[List[int]] = stored_locations(house)
+        assert len(locations) == len(set(map(tuple, locations)))
+    assert reload(house)._grid == house._grid
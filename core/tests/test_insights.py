@@ -0,0 +1,72 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from utils import insights
+from utils.configuration import set_config_value
+from utils.db_config import db
+
+
+def request(endpoint: str = "api_house.get_house", blueprint: str = "api_house") -> SimpleNamespace:
+    return SimpleNamespace(endpoint=endpoint, blueprint=blueprint)
+
+
+def response(status_code: int = 200) -> SimpleNamespace:
+    return SimpleNamespace(status_code=status_code)
+
+
+def sample_rates(default: float, per_endpoint: dict = None):
+    set_config_value({"value": default}, "logs.requests.sample_rate")
+    set_config_value({"value": per_endpoint or {}}, "logs.requests.sample_rates")
+
+
+@pytest.mark.parametrize("request_, response_, success", [
+    (request(), response(404), "True"),
+    (request(), response(500), "True"),
+    (request(), response(), "False"),
+    (request("api_fun_tools.get_config", "api_fun_tools"), response(), "True"),
+])
+def test_always_logged(request_, response_, success):
+    sample_rates(0)
+    assert insights.should_log(request_, response_, success)
+
+
+def test_sampled(monkeypatch):
+    sample_rates(0.25)
+    monkeypatch.setattr(insights.random, "random", lambda: 0.2)
+    assert insights.should_log(request(), response(), "True")
+    monkeypatch.setattr(insights.random, "random", lambda: 0.3)
+    assert not insights.should_log(request(), response(), "True")
+
+
+def test_sample_rate_per_endpoint(monkeypatch):
+    sample_rates(1.0, {"api_game.move": 0})
+    monkeypatch.setattr(insights.random, "random", lambda: 0.0)
+    assert not insights.should_log(request("api_game.move", "api_game"), response(), "True")
+    assert insights.should_log(request(), response(), "True")
+
+
+def test_logged_without_config():
+    assert insights.should_log(request(), response(), "True")
+
+
+def test_truncate():
+    body: dict = {"construction": "0" * 100}
+    assert insights.truncate(body, 2048) is body
+    assert insights.truncate(None, 10) is None
+    assert insights.truncate(body, -1) is body
+
+    truncated: dict = insights.truncate(body, 20)
+    serialized: str = json.dumps(body)
+    assert truncated == {"truncated": True, "size": len(serialized), "preview": serialized[:20]}
+
+
+def test_sampled_out_requests_not_stored(client, new_player):
+    headers: dict = new_player("p1")
+    db["requests"].drop()
+    sample_rates(0)
+    client.get("/api/house/p1", headers=headers)
+    assert db["requests"].count_documents({}) == 0
+    client.get("/api/house/p2", headers=headers)  # Not theirs, fails
+    assert db["requests"].count_documents({}) == 1
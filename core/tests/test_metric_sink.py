@@ -0,0 +1,55 @@
+import threading
+from typing import List
+
+from prometheus_client import CollectorRegistry, Counter
+
+from utils.metric_sink import MetricSink
+
+
+def new_sink(write_batch, **kwargs) -> MetricSink:
+    registry = CollectorRegistry()
+    sink = MetricSink(write_batch, Counter("test_dropped", "Dropped", registry=registry), **kwargs)
+    sink.registry = registry
+    return sink
+
+
+def dropped(sink: MetricSink) -> float:
+    return sink.registry.get_sample_value("test_dropped_total")
+
+
+def test_full_queue_drops_and_counts():
+    batches: List[List[dict]] = []
+    sink = new_sink(batches.append, queue_size=3, batch_size=2)
+    sink.worker.ensure_started = lambda: None  # The writer has fallen behind
+    for i in range(5):
+        sink.submit({"n": i})
+    assert dropped(sink) == 2
+
+    sink.flush()
+    assert batches == [[{"n": 0}, {"n": 1}], [{"n": 2}]]
+    sink.submit({"n": 5})
+    assert dropped(sink) == 2
+
+
+def test_failed_batch_logged(caplog):
+    batches: List[List[dict]] = []
+
+    def write_batch(batch: List[dict]):
+        batches.append(batch)
+        if len(batches) == 1:
+            raise ConnectionError("mongo is down")
+    sink = new_sink(write_batch, batch_size=1)
+    sink.worker.ensure_started = lambda: None
+    sink.submit({"n": 0})
+    sink.submit({"n": 1})
+    sink.flush()
+    assert batches == [[{"n": 0}], [{"n": 1}]]
+    assert "Unable to write 1 metric entries" in caplog.text
+
+
+def test_written_in_the_background():
+    written = threading.Event()
+    sink = new_sink(lambda batch: written.set(), flush_seconds=0.05)
+    sink.submit({"n": 0})
+    assert written.wait(5)
+    assert sink.worker.running()
@@ -0,0 +1,76 @@
+import importlib.util
+import os
+import subprocess
+from unittest import mock
+
+import pytest
+
+from utils import migrations
+from utils.db_config import db
+
+
+def test_indexes_built_and_verified():
+    assert migrations.create_hot_query_indexes()
+    assert migrations.create_eviction_indexes()
+    assert migrations.verify_indexes() == []
+
+
+def test_duplicates_fail_loudly():
+    db["access"].insert_many([
+        {"_id": "a", "player_id": "p1", "house_id": "h1"},
+        {"_id": "b", "player_id": "p2", "house_id": "h1"},
+    ])
+    with pytest.raises(migrations.MigrationError, match="access.house_id"):
+        migrations.create_hot_query_indexes()
+    assert "access.house_id is missing" in migrations.verify_indexes()
+
+
+def test_migrate_stops_at_failure(monkeypatch):
+    def failing() -> bool:
+        return False
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", [
+        (1, "Indexes for hot queries", migrations.create_hot_query_indexes),
+        (2, "Fails", failing),
+        (3, "Indexes for eviction sweeps", migrations.create_eviction_indexes),
+    ])
+    assert migrations.migrate() == 1
+    assert db["config"].find_one({"_id": migrations.SCHEMA_VERSION_KEY})["value"] == 1
+    assert migrations.verify_indexes(migrations.INDEXES_V3)
+
+
+def test_schema_version_never_moves_back():
+    migrations._record_schema_version(3)
+    migrations._record_schema_version(1)
+    migrations._record_schema_version(2)
+    assert db["config"].find_one({"_id": migrations.SCHEMA_VERSION_KEY})["value"] == 3
+
+
+def test_migrate_logs_failed_indexes(caplog):
+    db["registration"].insert_many([{"_id": "r1", "mac": "m"}, {"_id": "r2", "mac": "m"}])
+    assert migrations.migrate() == 0
+    assert "registration.mac" in caplog.text
+    assert db["config"].find_one({"_id": migrations.SCHEMA_VERSION_KEY}) is None
+
+
+@pytest.fixture
+def gunicorn_conf(monkeypatch, tmp_path):
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path / "prometheus"))
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "gunicorn.conf.py")
+    spec = importlib.util.spec_from_file_location("gunicorn_conf", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.parametrize("returncode, starts", [(0, True), (1, True), (2, False)])
+def test_api_starts_unless_migrations_could_not_run(gunicorn_conf, monkeypatch, returncode, starts):
+    monkeypatch.setattr(subprocess, "run", lambda *args, **kwargs: subprocess.CompletedProcess(args, returncode))
+    server = mock.Mock()
+    if starts:
+        gunicorn_conf.on_starting(server)
+        assert os.path.isdir(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+        assert server.log.error.called == (returncode == 1)
+    else:
+        with pytest.raises(RuntimeError):
+            gunicorn_conf.on_starting(server)
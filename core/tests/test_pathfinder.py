@@ -0,0 +1,89 @@
+import random
+from typing import List, Optional
+
+import pytest
+
+from api.house_base import House
+from api.material_base import MaterialType
+from utils import pathfinder
+
+
+def random_house(rng: random.Random, walls: int) -> House:
+    house: House = House("pathfinder-test").new()
+    for _ in range(walls):
+        house.set_item(MaterialType.WOOD_WALL, rng.randint(1, 30), rng.randint(0, 30))
+    return house
+
+
+def a_star_solution(construction: List[dict]) -> Optional[List[List[int]]]:
+    solution = pathfinder.get_a_star_maze_solution(construction)
+    return [[c, r] for r, c in solution] if solution else None
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_backends_match_a_star(seed):
+    rng = random.Random(seed)
+    for walls in [0, 150, 350, 550, 750]:
+        house: House = random_house(rng, walls)
+        construction: List[dict] = house.construction
+        expected = a_star_solution(construction)
+        assert pathfinder.get_maze_solution(construction, pathfinder.BACKEND_BITSET) == expected
+        assert house.get_maze_solution() == expected
+        assert pathfinder.is_vault_reachable(construction) == (expected is not None)
+        assert house.is_vault_reachable(pathfinder.BACKEND_BITSET) == (expected is not None)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_incremental_matches_a_star_between_edits(seed):
+    """The LPA* state carried from one edit to the next, and through a save and reload."""
+    rng = random.Random(seed)
+    house: House = random_house(rng, 300)
+    house.get_maze_solution()
+    for edit in range(200):
+        material: MaterialType = MaterialType.WOOD_WALL if rng.random() < 0.6 else MaterialType.AIR
+        house.set_item(material, rng.randint(1, 30), rng.randint(0, 30))
+        if edit % 25 == 0:
+            house.save()
+            house = House(house.house_id).load()
+        assert house.get_maze_solution() == a_star_solution(house.construction)
+
+
+def test_unreachable_vault():
+    house: House = House("pathfinder-test").new()
+    for y in range(31):
+        house.set_item(MaterialType.WOOD_WALL, 10, y)
+    assert pathfinder.get_maze_solution(house.construction, pathfinder.BACKEND_BITSET) is None
+    assert house.get_maze_solution() is None
+    assert a_star_solution(house.construction) is None
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_saved_state_replays_later_edits(seed):
+    """Saves that leave path_state behind, loaded with the edits since replayed."""
+    rng = random.Random(seed)
+    house: House = random_house(rng, 200)
+    house.save()
+    for edit in range(150):
+        material: MaterialType = MaterialType.WOOD_WALL if rng.random() < 0.5 else MaterialType.AIR
+        house.set_item(material, rng.randint(1, 30), rng.randint(0, 30))
+        house.get_maze_solution()
+        assert house.save()
+        if edit % 5 == 0:
+            house = House(house.house_id).load()
+            assert house.get_maze_solution() == a_star_solution(house.construction)
+
+
+def test_path_state_only_saved_when_the_path_changes():
+    house: House = House("pathfinder-test").new()
+    house.get_maze_solution()
+    house.save()
+    path: List[List[int]] = house.get_maze_solution()
+    x, y = next([x, y] for x in range(1, 31) for y in range(31) if [x, y] not in path and y not in (14, 15, 16))
+    house.set_item(MaterialType.WOOD_WALL, x, y)
+    assert house.get_maze_solution() == path
+    assert "path_state" not in house._build_update()[-1].get("$set", {})
+
+    x, y = path[len(path) // 2]
+    house.set_item(MaterialType.WOOD_WALL, x, y)
+    assert house.get_maze_solution() != path
+    assert "path_state" in house._build_update()[-1]["$set"]
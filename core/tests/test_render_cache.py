@@ -0,0 +1,70 @@
+import pytest
+
+from api.house_base import House
+from api.house_tracking import HouseAccess
+from api.material_base import MaterialType
+from utils.db_config import db
+from utils.enums import RenderView
+from utils.render_cache import RenderCache, render_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    render_cache.entries.clear()
+    render_cache.keys_by_house.clear()
+    yield
+
+
+def test_least_recently_used_dropped():
+    cache = RenderCache(max_entries=2)
+    a, b, c = [RenderCache.make_key(house_id, 1, [3, 3], "explicit") for house_id in "abc"]
+    cache.put(a, {"n": "a"})
+    cache.put(b, {"n": "b"})
+    assert cache.get(a) == {"n": "a"}
+    cache.put(c, {"n": "c"})
+    assert cache.get(b) is None
+    assert cache.get(a) == {"n": "a"} and cache.get(c) == {"n": "c"}
+    assert set(cache.keys_by_house) == {"a", "c"}
+
+
+def test_invalidate_drops_every_entry_of_a_house():
+    cache = RenderCache()
+    kept = RenderCache.make_key("other", 1, [3, 3], "explicit")
+    cache.put(kept, {})
+    for x in range(3):
+        cache.put(RenderCache.make_key("house", 1, [x, 3], "explicit"), {})
+    cache.invalidate("house")
+    assert list(cache.entries) == [kept]
+    assert list(cache.keys_by_house) == ["other"]
+
+
+def render(house_id: str) -> dict:
+    access: HouseAccess = HouseAccess(player_id="p1", house_id=house_id).load(locate=False)
+    return access.render_surroundings(player_location=[3, 15], view=RenderView.COMPRESSED)
+
+
+def test_save_invalidates():
+    house: House = House().new()
+    house.save()
+    before: dict = render(house.house_id)
+    assert render(house.house_id) == before
+    assert render_cache.keys_by_house[house.house_id]
+
+    house.set_item(MaterialType.WOOD_WALL, 4, 15)
+    assert house.save()
+    assert house.house_id not in render_cache.keys_by_house
+    assert render(house.house_id) != before
+
+
+def test_saved_by_another_worker():
+    house: House = House().new()
+    house.save()
+    before: dict = render(house.house_id)
+    # A save in another process bumps the version without touching this worker's cache
+    other: House = House(house.house_id).load()
+    other.set_item(MaterialType.WOOD_WALL, 4, 15)
+    db["houses"].update_one({"_id": house.house_id}, {
+        "$set": {"construction": other.get_construction_as_dict()}, "$inc": {"version": 1}
+    })
+    assert render_cache.keys_by_house[house.house_id]
+    assert render(house.house_id) != before
@@ -0,0 +1,35 @@
+import json
+import random
+
+import pytest
+
+from api.house_base import GRID_SIZE, House
+from api.house_tracking import HouseAccess
+from api.material_base import MaterialType
+
+WALLS = [MaterialType.WOOD_WALL, MaterialType.STEEL_WALL, MaterialType.CONCRETE_WALL]
+
+
+def random_access(rng: random.Random) -> HouseAccess:
+    house: House = House().new()
+    for _ in range(rng.randrange(0, 120)):
+        house.set_item(rng.choice(WALLS), rng.randrange(GRID_SIZE), rng.randrange(GRID_SIZE))
+    access: HouseAccess = HouseAccess(player_id="p1", house_id=house.house_id)
+    access.house = house
+    return access
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_explicit_size_matches_json(seed):
+    rng = random.Random(seed)
+    access: HouseAccess = random_access(rng)
+    # Windows hanging off every side of the house, with negative and two digit coordinates
+    far: int = GRID_SIZE - 4
+    for remote_x, remote_y in [(-3, 12), (-3, -3), (far, far), (far, -3)] + [
+        (rng.randrange(-3, far + 1), rng.randrange(-3, far + 1)) for _ in range(40)
+    ]:
+        tiles, explicit_size = access._walk_compressed(remote_x, remote_y, [3, 3], measure_explicit=True)
+        explicit: dict = access.get_explicit_render(remote_x, remote_y, [3, 3])
+        assert explicit_size == len(json.dumps(explicit)), (remote_x, remote_y)
+        assert len(tiles) == 64 and tiles[3 * 8 + 3] == "p"
+
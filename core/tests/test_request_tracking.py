@@ -0,0 +1,26 @@
+from unittest import mock
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def tracked(monkeypatch) -> mock.Mock:
+    tracked = mock.Mock()
+    monkeypatch.setattr(main, "log_request", tracked.log_request)
+    for name in ["increment_http_request", "increment_mongo_round_trips", "observe_http_request_duration"]:
+        monkeypatch.setattr(main.app.metric_tracker, name, getattr(tracked, name))
+    return tracked
+
+
+def test_requests_logged_and_counted(client, tracked):
+    client.get("/api/house/p1")
+    assert tracked.log_request.called
+    assert tracked.increment_http_request.called
+    assert tracked.observe_http_request_duration.called
+
+
+def test_scrapes_not_logged_or_counted(client, tracked):
+    assert client.get("/metrics").status_code == 200
+    assert tracked.mock_calls == []
@@ -0,0 +1,65 @@
+import copy
+from typing import List
+
+import pytest
+
+from utils import robbery
+from utils.configuration import set_config_value
+from utils.db_config import db
+
+
+def houses(count: int):
+    db["houses"].insert_many([{"_id": f"h{i}", "abandoned": i % 5 == 0} for i in range(count)])
+
+
+def occupy(house_ids):
+    db["access"].insert_many([
+        {"_id": house_id, "house_id": house_id, "player_id": f"p-{house_id}"} for house_id in house_ids
+    ])
+
+
+def test_only_open_houses_are_picked():
+    houses(100)
+    occupy([f"h{i}" for i in range(1, 50)])
+    picked = {robbery.find_unoccupied_house(exclusions=["h51"]) for _ in range(500)}
+    expected = {f"h{i}" for i in range(50, 100) if i % 5 and i != 51}
+    assert picked == expected
+
+
+def test_fallback_when_the_sample_is_occupied():
+    houses(200)
+    occupy([f"h{i}" for i in range(200) if i not in (7, 13)])
+    picked = {robbery.find_unoccupied_house() for _ in range(30)}
+    assert picked == {"h7", "h13"}
+
+
+def test_no_open_house():
+    houses(10)
+    occupy([f"h{i}" for i in range(10) if i != 3])
+    assert robbery.find_unoccupied_house(exclusions=["h3"]) is None
+
+
+@pytest.fixture
+def pipelines(monkeypatch) -> List[list]:
+    pipelines: List[list] = []
+    aggregate = db["houses"].aggregate
+
+    def recorded(pipeline, *args, **kwargs):
+        pipelines.append(copy.deepcopy(pipeline))  # mongomock consumes the stages
+        return aggregate(pipeline, *args, **kwargs)
+    monkeypatch.setattr(db["houses"], "aggregate", recorded)
+    return pipelines
+
+
+def test_sampled_before_anything_is_read(pipelines):
+    houses(100)
+    assert robbery.find_unoccupied_house()
+    assert len(pipelines) == 1
+    assert pipelines[0][0] == {"$sample": {"size": 50}}
+
+
+def test_sample_size_follows_the_config(pipelines):
+    houses(10)
+    set_config_value({"value": 5}, "robbery.sample_size")
+    robbery.find_unoccupied_house()
+    assert pipelines[0][0] == {"$sample": {"size": 5}}
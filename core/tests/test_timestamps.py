@@ -0,0 +1,28 @@
+import datetime
+
+from utils import migrations
+from utils.db_config import db
+
+
+def test_convert_timestamps_resumes(monkeypatch):
+    monkeypatch.setattr(migrations, "TIMESTAMP_BATCH_SIZE", 3)
+    db["access"].insert_many([
+        {"_id": f"a{i}", "access_time": f"2024-04-0{i}T10:00:00", "latest_activity": f"2024-04-0{i}T10:30:00"}
+        for i in range(1, 8)
+    ])
+    db["access"].insert_one({"_id": "a8", "access_time": "not a date", "latest_activity": "2024-04-08T10:30:00"})
+    # Stopped after the first batch
+    migrations._save_timestamp_progress("access", {"value": "a3"})
+
+    assert migrations.convert_timestamps()
+    access: dict = {item["_id"]: item for item in db["access"].find()}
+    assert access["a1"]["access_time"] == "2024-04-01T10:00:00"  # Before the recorded progress
+    assert access["a4"]["access_time"] == datetime.datetime(2024, 4, 4, 10, tzinfo=datetime.timezone.utc)
+    assert access["a8"]["access_time"] == "not a date"
+    assert access["a8"]["latest_activity"] == datetime.datetime(2024, 4, 8, 10, 30, tzinfo=datetime.timezone.utc)
+    assert migrations._timestamp_progress("access")["done"]
+
+    # Done collections are skipped
+    db["access"].insert_one({"_id": "a9", "access_time": "2024-04-09T10:00:00"})
+    assert migrations.convert_timestamps()
+    assert db["access"].find_one({"_id": "a9"})["access_time"] == "2024-04-09T10:00:00"
@@ -0,0 +1,79 @@
+import atexit
+import datetime
+import logging
+import threading
+
+from pymongo import UpdateOne
+
+from utils import timestamps
+from utils.background import BackgroundWorker
+from utils.configuration import get_config_value
+from utils.db_config import db
+from utils.enums import LoggerName
+
+FLUSH_SECONDS = get_config_value(
+    "players.activity_flush_seconds", {"value": 5}
+).get("value")
+MAX_PENDING = get_config_value(
+    "players.activity_max_pending", {"value": 1000}
+).get("value")
+logger = logging.getLogger(LoggerName.SYSTEM.value)
+
+
+class ActivityTracker:
+    """
+    Write-behind store of when players were last seen.
+
+    Every authenticated request used to write players.last_activity straight away.
+    Timestamps are now kept in memory per worker and written every FLUSH_SECONDS
+    (sooner if MAX_PENDING players are waiting) as one unordered bulk_write, so
+    last_activity is never more than FLUSH_SECONDS behind. That is well inside
+    the 30 minute window metric_utils.get_game_counts counts active players by.
+    """
+
+    def __init__(self, flush_seconds: float = FLUSH_SECONDS, max_pending: int = MAX_PENDING):
+        self.flush_seconds: float = flush_seconds
+        self.max_pending: int = max_pending
+        self.pending: dict = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        # One per gunicorn worker, each flushes the players it saw
+        self.worker = BackgroundWorker("activity-tracker", self._run)
+
+    def record(self, player_id: str):
+        now: datetime.datetime = timestamps.now()
+        with self.lock:
+            self.pending[player_id] = now
+            full: bool = len(self.pending) >= self.max_pending
+        if self.flush_seconds <= 0:
+            self.flush()  # Write-behind disabled
+            return
+        self.worker.ensure_started()
+        if full:
+            self.wake.set()
+
+    def flush(self) -> int:
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return 0
+        # $max so a flush from a worker that saw the player earlier can't move it back
+        operations = [
+            UpdateOne({"_id": player_id}, {"$max": {"last_activity": last_activity}})
+            for player_id, last_activity in pending.items()
+        ]
+        try:
+            db["players"].bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.error(f"Unable to write last activity of {len(operations)} players: {e}")
+        return len(operations)
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.flush_seconds)
+            self.wake.clear()
+            self.flush()
+
+
+activity_tracker = ActivityTracker()
+atexit.register(activity_tracker.flush)
@@ -1,4 +1,3 @@
-import datetime
 import inspect
 import os
 
@@ -6,6 +5,7 @@ from flask import request
 
 from api.house_base import House
 from api.player_base import Player
+from utils import identity_map, request_context, timestamps
 from utils.configuration import get_config_value
 from utils.db_config import db
 
@@ -60,12 +60,13 @@ def has_house(func):
 
     def validate_incoming_data(player_id):
         api_token: str = request.headers.get("X-API-Token")
-        player: Player = Player(player_id).load()
+        player: Player = identity_map.get_player(player_id)
         if not player:
             return {"success": False, "reason": "Player doesn't exist"}, 404
         if player.token != api_token:
             return {"success": False, "reason": "Unauthorized"}, 401
-        house: House = House(house_id=player.house_id).load()
+        request_context.set_player_id(player_id)
+        house: House = identity_map.get_house(player.house_id)
         if not house:
             return {"success": False, "reason": "House not found."}, 404
         Player.set_last_active_now(player_id)
@@ -106,11 +107,12 @@ def player_valid(func):
         """
     def validate_incoming_data(player_id):
         api_token: str = request.headers.get("X-API-Token")
-        player: Player = Player(player_id).load()
+        player: Player = identity_map.get_player(player_id)
         if not player:
             return {"success": False, "reason": "Player doesn't exist"}, 404
         if player.token != api_token:
             return {"success": False, "reason": "Unauthorized"}, 401
+        request_context.set_player_id(player_id)
         Player.set_last_active_now(player_id)
         return {"success": True, "player": player}, 200
 
@@ -170,7 +172,8 @@ def registration(func):
         if limits_exceeded(registration_token):
             return {"success": False, "reason": "You have registered too many players!"}, 400
         player = Player(player_id=player_id, registered_by=registration_token)
-        player.created_on = datetime.datetime.now()
+        request_context.set_player_id(player_id)
+        player.created_on = timestamps.now()
         return {"success": True, "player": player}, 200
 
     def decorator(*args, **kwargs):
@@ -0,0 +1,52 @@
+import os
+import threading
+import weakref
+from typing import Callable, Optional
+
+_workers: weakref.WeakSet = weakref.WeakSet()
+
+
+class BackgroundWorker:
+    """
+    Daemon thread running target, started by the first ensure_started call.
+
+    gunicorn forks its workers from the master after the app modules are imported,
+    and a forked child only keeps the thread that forked it. The worker forgets its
+    thread in the child (and calls after_fork), so the next ensure_started in each
+    gunicorn worker starts a thread of its own.
+    """
+
+    def __init__(self, name: str, target: Callable[[], None], after_fork: Optional[Callable[[], None]] = None):
+        self.name: str = name
+        self.target: Callable[[], None] = target
+        self.after_fork: Optional[Callable[[], None]] = after_fork
+        self.lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+        _workers.add(self)
+
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def ensure_started(self):
+        if self.running():
+            return
+        with self.lock:
+            if self.running():
+                return
+            self.thread = threading.Thread(target=self.target, name=self.name, daemon=True)
+            self.thread.start()
+
+    def _forked(self):
+        self.lock = threading.Lock()
+        self.thread = None
+        if self.after_fork:
+            self.after_fork()
+
+
+def _after_fork_in_child():
+    for worker in list(_workers):
+        worker._forked()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
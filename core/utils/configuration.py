@@ -1,14 +1,81 @@
 import os
-from typing import Union
+import threading
+import time
+from typing import Optional, Union
+
+from prometheus_client import Counter
 
 from utils.db_config import db
 from utils.enums import LoggerName
 
+CONFIG_VERSION_KEY = "config.version"  # Bumped by every set_config_value
+CACHE_TTL_SECONDS = 10  # Longest a worker serves a value changed directly in mongo
+VERSION_CHECK_SECONDS = 1  # Longest a worker serves a value changed with set_config_value
+
+# Registered with the MetricTracker registry in utils/metrics.py, which imports this module
+config_cache_counter = Counter(
+    "apiserver_config_cache_total",
+    "Config lookups served from the in-process cache or from mongo",
+    labelnames=[
+        "result"
+    ],
+    registry=None
+)
+
 
 def _is_docker() -> bool:
     return os.environ.get("IS_DOCKER", "false").lower() == "true"
 
 
+class ConfigCache:
+    """
+    Config documents (and missing keys) cached per worker for CACHE_TTL_SECONDS.
+
+    The whole cache is dropped as soon as a worker notices config.version has
+    changed, which it checks at most every VERSION_CHECK_SECONDS.
+    """
+
+    def __init__(self, ttl_seconds: float = CACHE_TTL_SECONDS, version_check_seconds: float = VERSION_CHECK_SECONDS):
+        self.ttl_seconds: float = ttl_seconds
+        self.version_check_seconds: float = version_check_seconds
+        self.items: dict = {}
+        self.lock = threading.Lock()
+        self.version: Optional[int] = None
+        self.version_checked_at: float = 0.0
+
+    def get(self, cache_key: tuple, loader) -> Optional[dict]:
+        self._check_version()
+        now: float = time.monotonic()
+        with self.lock:
+            entry: Optional[tuple] = self.items.get(cache_key)
+        if entry and now - entry[1] < self.ttl_seconds:
+            config_cache_counter.labels(result="hit").inc()
+            return entry[0]
+        config_cache_counter.labels(result="miss").inc()
+        item: Optional[dict] = loader()
+        with self.lock:
+            self.items[cache_key] = (item, now)
+        return item
+
+    def clear(self):
+        with self.lock:
+            self.items = {}
+
+    def _check_version(self):
+        now: float = time.monotonic()
+        if now - self.version_checked_at < self.version_check_seconds:
+            return
+        self.version_checked_at = now
+        item = db["config"].find_one({"_id": CONFIG_VERSION_KEY}, ["value"])
+        version: int = item.get("value", 0) if item else 0
+        if version != self.version:
+            self.version = version
+            self.clear()
+
+
+config_cache = ConfigCache()
+
+
 def get_config_value(key: str, default_value=None, include_secrets=True):
     search = {
         "$and": [
@@ -21,24 +88,36 @@ def get_config_value(key: str, default_value=None, include_secrets=True):
             {"_id": key}
         ]
     } if not include_secrets else {"_id": key}
-    item = db["config"].find_one(search)
+    item = config_cache.get((key, include_secrets), lambda: db["config"].find_one(search))
     if not item:
         return default_value
     return item
 
 
+def bump_config_version():
+    """Tell every worker to drop its cached config."""
+    db["config"].update_one(
+        {"_id": CONFIG_VERSION_KEY},
+        {"$inc": {"value": 1}, "$setOnInsert": {"secret": False}},
+        upsert=True
+    )
+    config_cache.clear()
+
+
 def set_config_value(item: dict, key: str = None, is_secret=False) -> bool:
     if not key:
         key = item.get("_id")
         if not key:
             return False
-    if get_config_value(key):
+    if db["config"].find_one({"_id": key}, ["_id"]):
         item["secret"] = is_secret
         db["config"].find_one_and_replace({"_id": key}, item)
+        bump_config_version()
         return True
     item["_id"] = key
     item["secret"] = is_secret
     db["config"].insert_one(item)
+    bump_config_version()
     return True
 
 
@@ -1,9 +1,12 @@
 
+import datetime
 import os
 
 import pymongo
 from pymongo import MongoClient
 
+from utils.db_monitoring import RoundTripCounter
+
 mongo_ip = os.environ['MONGO_IP'] if "MONGO_IP" in os.environ else "localhost"
 
 db_connect_string = "mongodb://{}:27017".format(mongo_ip)
@@ -19,8 +22,13 @@ if connect_auth:
     client = MongoClient(mongo_ip, username=username,
                          password=password,
                          authSource='admin',
-                         authMechanism='SCRAM-SHA-1')
+                         authMechanism='SCRAM-SHA-1',
+                         tz_aware=True,
+                         tzinfo=datetime.timezone.utc,
+                         event_listeners=[RoundTripCounter()])
 else:
-    client = pymongo.MongoClient(db_connect_string)
+    client = pymongo.MongoClient(
+        db_connect_string, tz_aware=True, tzinfo=datetime.timezone.utc, event_listeners=[RoundTripCounter()]
+    )
 
 db = client[db_name]
@@ -0,0 +1,22 @@
+from flask import g, has_request_context
+from pymongo import monitoring
+
+
+class RoundTripCounter(monitoring.CommandListener):
+    """Counts the commands sent to mongo while handling the current request."""
+
+    def started(self, event):
+        if has_request_context():
+            g.mongo_round_trips = g.get("mongo_round_trips", 0) + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def get_round_trips() -> int:
+    if not has_request_context():
+        return 0
+    return g.get("mongo_round_trips", 0)
@@ -7,3 +7,28 @@ class LoggerName(Enum):
     SYSTEM = "system"
 
 
+class HouseEntry(Enum):
+    """Outcome of HouseAccess.enter_house."""
+
+    ENTERED = "entered"
+    ALREADY_INSIDE = "already_inside"  # The player is in a house already, this one or another
+    OCCUPIED = "occupied"  # Someone else is in the house and their visit hasn't expired
+
+
+class RenderView(Enum):
+    """How house renders are sent to badges, negotiated with the `c` header or a direction suffix."""
+
+    EXPLICIT = "explicit"  # List of material dicts
+    COMPRESSED = "compressed"  # One character per tile
+    PACKED = "packed"  # 2 bits per tile, base64, see utils/packed_render.py
+    DELTA = "delta"  # Moves only send the newly revealed edge, full windows are compressed
+
+    @staticmethod
+    def from_header(value, default=None):
+        if value == "y":
+            return RenderView.COMPRESSED
+        if value == "b":
+            return RenderView.PACKED
+        if value == "d":
+            return RenderView.DELTA
+        return default or RenderView.EXPLICIT
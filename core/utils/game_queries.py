@@ -0,0 +1,125 @@
+"""
+Queries the API and the task engine both run against the game collections: the
+eviction sweep and the counts behind the game gauges.
+
+The task engine has a utils package of its own with the same configuration,
+db_config and timestamps interface, so this module is shared rather than copied:
+task_engine/utils links to it and to timestamps.py, and task_engine/Dockerfile
+copies both in. Only import from utils what both packages provide.
+"""
+import datetime
+from typing import List, Optional, Tuple
+
+from utils import timestamps
+from utils.configuration import get_config_value
+from utils.db_config import db
+
+
+def eviction_cutoffs(house_owner=False) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+    """
+    (inactive, overstayed): a visit is too long when its latest activity is before
+    the first or it was entered before the second. None when evictions are disabled.
+    """
+    disable_activity_timeout: bool = get_config_value(
+        "evictions.disable_timeout", default_value={"value": False}
+    ).get("value")
+    if disable_activity_timeout:
+        return None
+
+    activity_timeout_seconds: int = get_config_value(
+        "evictions.activity_timeout_seconds", default_value={"value": 45}
+    ).get("value")
+    house_owner_access_minutes: int = get_config_value(
+        "evictions.house_owner_access_minutes", default_value={"value": 8}
+    ).get("value")
+    robber_access_minutes: int = get_config_value(
+        "evictions.robber_access_minutes", default_value={"value": 10}
+    ).get("value")
+
+    now = timestamps.now()
+    entered_ago_minute_comparison = house_owner_access_minutes if house_owner else robber_access_minutes
+    return (
+        now - datetime.timedelta(seconds=activity_timeout_seconds),
+        now - datetime.timedelta(minutes=entered_ago_minute_comparison)
+    )
+
+
+def expired_filter(inactive_cutoff: datetime.datetime, overstayed_cutoff: datetime.datetime) -> List[dict]:
+    """$or clauses matching visits past either of the eviction_cutoffs."""
+    clauses: List[dict] = []
+    for field, cutoff in [("latest_activity", inactive_cutoff), ("access_time", overstayed_cutoff)]:
+        clauses.append({field: {"$lt": cutoff}})
+        # Visits the timestamp migration hasn't reached yet, naive UTC ISO strings sort by time
+        clauses.append({field: {"$type": "string", "$lt": cutoff.replace(tzinfo=None).isoformat()}})
+    return clauses
+
+
+def evict_expired() -> Tuple[dict, List[str]]:
+    """
+    Evict everyone whose visit is too long in one pass. Returns how many were evicted
+    per reason and the evicted player ids. Only expired visits are read, through the
+    access latest_activity and access_time indexes.
+
+    The delete repeats the expiry filter, so a player who moved after the visits were
+    read keeps theirs. Only players whose visit was deleted are flagged evicted.
+    """
+    evictions: dict = {"inactive": 0, "overstayed": 0}
+    cutoffs = eviction_cutoffs()
+    if not cutoffs:
+        return evictions, []
+    inactive_cutoff, overstayed_cutoff = cutoffs
+    expired_clauses: List[dict] = expired_filter(inactive_cutoff, overstayed_cutoff)
+    expired: List[dict] = list(db["access"].find({"$or": expired_clauses}, ["_id", "player_id", "latest_activity"]))
+    if not expired:
+        return evictions, []
+    access_ids: list = [item["_id"] for item in expired]
+    deleted: int = db["access"].delete_many({"_id": {"$in": access_ids}, "$or": expired_clauses}).deleted_count
+    if deleted < len(expired):
+        kept: set = set(db["access"].distinct("_id", {"_id": {"$in": access_ids}}))
+        expired = [item for item in expired if item["_id"] not in kept]
+    for item in expired:
+        reason = "inactive" if timestamps.as_datetime(item["latest_activity"]) < inactive_cutoff else "overstayed"
+        evictions[reason] += 1
+    player_ids: List[str] = [item["player_id"] for item in expired]
+    if player_ids:
+        db["players"].update_many({"_id": {"$in": player_ids}}, {"$set": {"evicted": True}})
+    return evictions, player_ids
+
+
+def _count_by(name: str, key) -> dict:
+    return {"$group": {"_id": {"count": name, "key": key}, "count": {"$sum": 1}}}
+
+
+def count_game() -> dict:
+    """
+    Everything the game gauges report, counted by mongo in one aggregation:
+
+    * players: active in the last 30 minutes (True) or not (False)
+    * houses: abandoned (True) or not (False)
+    * registration: tokens (None)
+    * occupied: players in their own house (True) or someone else's (False)
+
+    Counts that come to zero are left out.
+    """
+    # Threshold for player activity
+    thirty_minutes_ago = timestamps.now() - datetime.timedelta(minutes=30)
+    pipeline = [
+        # A missing last_activity sorts before any date, so those players count as inactive
+        _count_by("players", {"$gt": ["$last_activity", thirty_minutes_ago]}),
+        {"$unionWith": {"coll": "houses", "pipeline": [_count_by("houses", "$abandoned")]}},
+        {"$unionWith": {"coll": "registration", "pipeline": [_count_by("registration", None)]}},
+        {"$unionWith": {"coll": "access", "pipeline": [
+            {"$lookup": {
+                "from": "players",
+                "localField": "player_id",
+                "foreignField": "_id",
+                "pipeline": [{"$project": {"house_id": 1}}],
+                "as": "player"
+            }},
+            _count_by("occupied", {"$in": ["$house_id", "$player.house_id"]})
+        ]}}
+    ]
+    counts: dict = {"players": {}, "houses": {}, "registration": {}, "occupied": {}}
+    for item in db["players"].aggregate(pipeline):
+        counts[item["_id"]["count"]][item["_id"].get("key")] = item["count"]
+    return counts
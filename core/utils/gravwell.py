@@ -0,0 +1,168 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import deque
+from typing import List, Optional, Union
+
+from prometheus_client import Counter
+
+from utils import timestamps
+from utils.background import BackgroundWorker
+from utils.configuration import get_config_value
+from utils.enums import LoggerName
+
+BUFFER_SIZE = get_config_value(
+    "logs.gravwell.buffer_size", {"value": 10000}
+).get("value")
+FAILURE_THRESHOLD = get_config_value(
+    "logs.gravwell.failure_threshold", {"value": 3}
+).get("value")
+CONNECT_TIMEOUT_SECONDS = 2
+BACKOFF_SECONDS = 0.5  # Doubled after every failed attempt...
+MAX_BACKOFF_SECONDS = 60  # ...up to this
+BATCH_LINES = 500
+logger = logging.getLogger(LoggerName.SYSTEM.value)
+
+# Shared by both senders and told apart by port, utils/metrics.py adds them to the /metrics registry
+gravwell_events_counter = Counter(
+    "apiserver_gravwell_events_total",
+    "Events handed to the gravwell sender",
+    labelnames=[
+        "port",
+        "result"
+    ],
+    registry=None
+)
+gravwell_reconnects_counter = Counter(
+    "apiserver_gravwell_reconnects_total",
+    "Gravwell connections opened after the first one",
+    labelnames=[
+        "port"
+    ],
+    registry=None
+)
+
+
+class GravwellSender:
+    """
+    Newline delimited JSON to a gravwell ingester over one long lived connection.
+
+    Events are buffered (up to BUFFER_SIZE) and written by a background thread.
+    A failed write closes the connection and the next attempt waits an
+    exponentially growing backoff. After FAILURE_THRESHOLD failures in a row the
+    circuit opens and new events are dropped, not buffered, until a reconnect
+    succeeds. Nothing is sent when GRAVWELL_HOST isn't set.
+    """
+
+    def __init__(self, default_port: int, buffer_size: int = BUFFER_SIZE):
+        self.host: Optional[str] = os.environ.get("GRAVWELL_HOST")
+        try:
+            self.port: int = int(os.environ.get("GRAVWELL_PORT", default_port))
+        except ValueError:
+            logger.warning("Unable to parse GRAVWELL_PORT and so nothing is exported to gravwell")
+            self.host = None
+            self.port = default_port
+        self.buffer_size: int = buffer_size
+        self.buffer: deque = deque()
+        self.condition = threading.Condition()
+        self.connection: Optional[socket.socket] = None
+        self.connected_before: bool = False
+        self.failures: int = 0
+        self.retry_at: float = 0.0
+        self.worker = BackgroundWorker(f"gravwell-{self.port}", self._run, after_fork=self._forked)
+
+        self.sent = gravwell_events_counter.labels(port=str(self.port), result="sent")
+        self.dropped = gravwell_events_counter.labels(port=str(self.port), result="dropped")
+        self.reconnects = gravwell_reconnects_counter.labels(port=str(self.port))
+
+    @staticmethod
+    def _lines(data: Union[dict, str, list]) -> List[bytes]:
+        if isinstance(data, dict):
+            data = json.dumps(data, default=timestamps.json_default)
+        if isinstance(data, str):
+            data = [data]
+        return [line.encode() for line in data]
+
+    def circuit_open(self) -> bool:
+        return self.failures >= FAILURE_THRESHOLD and time.monotonic() < self.retry_at
+
+    def send(self, data: Union[dict, str, list]):
+        """Queue a dict, a JSON line or a list of JSON lines, never blocks on the network."""
+        if not self.host:
+            return
+        lines: List[bytes] = self._lines(data)
+        with self.condition:
+            if self.circuit_open():
+                self.dropped.inc(len(lines))
+                return
+            kept: List[bytes] = self._buffer(lines)
+            self.condition.notify()
+        self.dropped.inc(len(lines) - len(kept))
+        self.worker.ensure_started()
+
+    def _buffer(self, lines: List[bytes], front: bool = False) -> List[bytes]:
+        """Buffer as many of the lines as fit, call with the condition held."""
+        kept: List[bytes] = lines[:max(self.buffer_size - len(self.buffer), 0)]
+        if front:
+            self.buffer.extendleft(reversed(kept))
+        else:
+            self.buffer.extend(kept)
+        return kept
+
+    def _forked(self):
+        # The master's connection would interleave lines with every worker's, and
+        # its buffer would be sent once per worker
+        self.condition = threading.Condition()
+        self.connection = None
+        self.buffer = deque()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.buffer:
+                    self.condition.wait()
+                batch: List[bytes] = [self.buffer.popleft() for _ in range(min(len(self.buffer), BATCH_LINES))]
+            delay: float = self.retry_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            if self._write(batch):
+                self.sent.inc(len(batch))
+                continue
+            with self.condition:
+                kept: List[bytes] = self._buffer(batch, front=True)  # Retried after the backoff
+            self.dropped.inc(len(batch) - len(kept))
+
+    def _write(self, batch: List[bytes]) -> bool:
+        try:
+            if not self.connection:
+                self.connection = socket.create_connection((self.host, self.port), timeout=CONNECT_TIMEOUT_SECONDS)
+                if self.connected_before:
+                    self.reconnects.inc()
+                self.connected_before = True
+            self.connection.sendall(b"".join(line + b"\n" for line in batch))
+        except OSError as e:
+            self._close()
+            self.failures += 1
+            self.retry_at = time.monotonic() + min(BACKOFF_SECONDS * 2 ** (self.failures - 1), MAX_BACKOFF_SECONDS)
+            if self.failures == FAILURE_THRESHOLD:
+                logger.warning(f"Gravwell {self.host}:{self.port} unreachable, dropping events until it's back: {e}")
+            return False
+        if self.failures >= FAILURE_THRESHOLD:
+            logger.info(f"Gravwell {self.host}:{self.port} reachable again")
+        self.failures = 0
+        return True
+
+    def _close(self):
+        if self.connection:
+            try:
+                self.connection.close()
+            except OSError:
+                pass
+        self.connection = None
+
+
+insights_sender = GravwellSender(default_port=7778)  # Request logs
+metrics_sender = GravwellSender(default_port=7777)  # Metric entries
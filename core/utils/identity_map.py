@@ -0,0 +1,76 @@
+from typing import Optional
+
+from flask import g, has_request_context
+
+from api.house_base import House
+from api.player_base import Player
+from utils.db_config import db
+
+_MISSING = object()
+
+
+def _documents(kind: str) -> Optional[dict]:
+    """Documents of one kind loaded during the current request, None outside of a request."""
+    if not has_request_context():
+        return None
+    identity_map: dict = g.setdefault("identity_map", {})
+    return identity_map.setdefault(kind, {})
+
+
+def _get(kind: str, key: str, loader, refresh: bool = False):
+    documents: Optional[dict] = _documents(kind)
+    if documents is None:
+        return loader()
+    item = documents.get(key, _MISSING) if not refresh else _MISSING
+    if item is _MISSING:
+        item = loader()
+        documents[key] = item
+    return item
+
+
+def _set(kind: str, key: str, item):
+    documents: Optional[dict] = _documents(kind)
+    if documents is not None:
+        documents[key] = item
+
+
+def _forget(kind: str, key: str):
+    documents: Optional[dict] = _documents(kind)
+    if documents is not None:
+        documents.pop(key, None)
+
+
+def get_player(player_id: str, refresh: bool = False) -> Optional[Player]:
+    """
+    Player loaded at most once per request. Every caller gets the same object, so
+    changes made and saved through it are seen by the rest of the request.
+    """
+    return _get("players", player_id, lambda: Player(player_id).load(), refresh=refresh)
+
+
+def forget_player(player_id: str):
+    _forget("players", player_id)
+
+
+def get_house(house_id: str, refresh: bool = False) -> Optional[House]:
+    """
+    House loaded at most once per request. Pass refresh to throw away unsaved edits
+    (such as a rejected build) and read the house again.
+    """
+    if not house_id:
+        return None
+    return _get("houses", house_id, lambda: House(house_id=house_id).load(), refresh=refresh)
+
+
+def get_access(player_id: str, refresh: bool = False) -> Optional[dict]:
+    """Access document of the house a player is in, loaded at most once per request."""
+    return _get("access", player_id, lambda: db["access"].find_one({"player_id": player_id}), refresh=refresh)
+
+
+def set_access(player_id: str, access: Optional[dict]):
+    """Record an access document the request just wrote (or None if it was deleted)."""
+    _set("access", player_id, access)
+
+
+def forget_access(player_id: str):
+    _forget("access", player_id)
@@ -0,0 +1,307 @@
+import heapq
+import zlib
+from array import array
+from typing import List, Optional
+
+from utils import pathfinder
+
+GRID_SIZE = 31
+CELL_COUNT = GRID_SIZE * GRID_SIZE
+INFINITY = 0xFFFF  # Distances are stored as unsigned shorts
+DOOR_INDEX = 15 * GRID_SIZE + 0
+STATE_VERSION = 3  # 2: distances and solution packed into bytes, 3: solid cells instead of a checksum
+# Edits a stored state can be behind the house by, they're replayed when it's loaded
+MAX_REPLAYED_CELLS = 32
+SOLID_DIGITS: bytes = bytes.maketrans(b"01", b"\x00\x01")  # Inverse of pathfinder.BIT_DIGITS
+
+
+def _build_neighbors() -> List[tuple]:
+    neighbors: List[tuple] = []
+    for index in range(CELL_COUNT):
+        x, y = index % GRID_SIZE, index // GRID_SIZE
+        items = []
+        if y + 1 < GRID_SIZE:
+            items.append(index + GRID_SIZE)
+        if y > 0:
+            items.append(index - GRID_SIZE)
+        if x + 1 < GRID_SIZE:
+            items.append(index + 1)
+        if x > 0:
+            items.append(index - 1)
+        neighbors.append(tuple(items))
+    return neighbors
+
+
+NEIGHBORS: List[tuple] = _build_neighbors()
+
+
+def _pack_solid(solid: bytes) -> bytes:
+    """0 / 1 per cell packed into bits, 121 bytes."""
+    return int(solid.translate(pathfinder.BIT_DIGITS), 2).to_bytes((CELL_COUNT + 7) // 8, "big")
+
+
+def _unpack_solid(packed: Optional[bytes]) -> Optional[bytes]:
+    if not packed or len(packed) != (CELL_COUNT + 7) // 8:
+        return None
+    return format(int.from_bytes(packed, "big"), f"0{CELL_COUNT}b").encode().translate(SOLID_DIGITS)
+
+
+class IncrementalPathfinder:
+    """
+    Door to vault shortest path maintained with Lifelong Planning A* (LPA*).
+
+    http://idm-lab.org/bib/abstracts/papers/aij04.pdf
+
+    Distances from the door (g / rhs) survive between edits and are persisted with
+    the house, so placing or clearing one wall only re-expands the cells whose
+    distance changed. The lucky numbers path is read back from the distances, in the
+    order the A* in utils/pathfinder.py would have found it, so the returned solution
+    is always identical to a from-scratch solve.
+
+    The persisted state records which cells were solid when it was taken. A house
+    saved since then is compared with that on load and the differences replayed, so
+    the state only needs saving when the path changed or the house drifted far from it.
+    """
+
+    def __init__(self, grid: bytearray, solid_table: bytes, vault_location: List[int], state: Optional[dict] = None):
+        self.grid: bytearray = grid  # Shared with the house, read only here
+        self.solid_table: bytes = solid_table  # bytes.translate table, material code -> 1 if solid
+        self.goal: int = vault_location[1] * GRID_SIZE + vault_location[0]
+
+        self.g: array = array("H", [INFINITY]) * CELL_COUNT
+        self.rhs: array = array("H", [INFINITY]) * CELL_COUNT
+        self.open_set: list = []
+        self.open_keys: dict = {}
+
+        self.solution: Optional[List[List[int]]] = None
+        self.solution_cells: set = set()
+        self.solution_stale: bool = True
+        self.cleared_cells: List[int] = []
+
+        if not state or not self._load_state(state):
+            self.rhs[DOOR_INDEX] = 0
+            self._push(DOOR_INDEX)
+
+    def _load_state(self, state: dict) -> bool:
+        if state.get("version") != STATE_VERSION:
+            return False
+        stored_solid: Optional[bytes] = _unpack_solid(state.get("solid"))
+        if stored_solid is None:
+            return False
+        if state.get("vault") != [self.goal % GRID_SIZE, self.goal // GRID_SIZE]:
+            return False
+        distances = array("H")
+        distances.frombytes(zlib.decompress(state["distances"]))
+        if len(distances) != 2 * CELL_COUNT:
+            return False
+        g, rhs = distances[:CELL_COUNT], distances[CELL_COUNT:]
+        self.g, self.rhs = g, rhs
+        if g != rhs:
+            for index in range(CELL_COUNT):
+                if g[index] != rhs[index]:
+                    self._push(index)
+        if state.get("solved"):
+            solution: Optional[array] = None
+            if state.get("solution") is not None:
+                solution = array("H")
+                solution.frombytes(state["solution"])
+            self._set_solution([[index % GRID_SIZE, index // GRID_SIZE] for index in solution] if solution else None)
+        solid: bytes = self.grid.translate(self.solid_table)
+        if solid != stored_solid:
+            for index in range(CELL_COUNT):
+                if solid[index] != stored_solid[index]:
+                    self.cell_changed(index % GRID_SIZE, index // GRID_SIZE)
+        return True
+
+    def _packed_solution(self) -> Optional[bytes]:
+        if self.solution_stale or self.cleared_cells or not self.solution:
+            return None
+        return array("H", [y * GRID_SIZE + x for x, y in self.solution]).tobytes()
+
+    def as_dict(self) -> dict:
+        """Distances compress to a few hundred bytes, as neighbouring cells hold consecutive values."""
+        return {
+            "version": STATE_VERSION,
+            "solid": _pack_solid(self.grid.translate(self.solid_table)),
+            "vault": [self.goal % GRID_SIZE, self.goal // GRID_SIZE],
+            "distances": zlib.compress(self.g.tobytes() + self.rhs.tobytes()),
+            "solved": not self.solution_stale and not self.cleared_cells,
+            "solution": self._packed_solution()
+        }
+
+    def worth_saving(self, stored: Optional[dict]) -> bool:
+        """
+        Whether the state saved with the house should be replaced by as_dict: the vault
+        or the known path changed, or loading it would replay over MAX_REPLAYED_CELLS edits.
+        """
+        if not stored or stored.get("version") != STATE_VERSION:
+            return True
+        if stored.get("vault") != [self.goal % GRID_SIZE, self.goal // GRID_SIZE]:
+            return True
+        stored_solid: Optional[bytes] = _unpack_solid(stored.get("solid"))
+        if stored_solid is None:
+            return True
+        solid: bytes = self.grid.translate(self.solid_table)
+        if sum(1 for a, b in zip(solid, stored_solid) if a != b) > MAX_REPLAYED_CELLS:
+            return True
+        solved: bool = not self.solution_stale and not self.cleared_cells
+        return solved and (not stored.get("solved") or stored.get("solution") != self._packed_solution())
+
+    def _is_solid(self, index: int) -> bool:
+        return self.solid_table[self.grid[index]] == 1
+
+    def _heuristic(self, index: int) -> int:
+        return (
+            abs(index % GRID_SIZE - self.goal % GRID_SIZE) +
+            abs(index // GRID_SIZE - self.goal // GRID_SIZE)
+        )
+
+    def _key(self, index: int) -> tuple:
+        distance: int = min(self.g[index], self.rhs[index])
+        return distance + self._heuristic(index), distance
+
+    def _push(self, index: int):
+        key: tuple = self._key(index)
+        self.open_keys[index] = key
+        heapq.heappush(self.open_set, (key, index))
+
+    def _update_vertex(self, index: int):
+        if index != DOOR_INDEX:
+            rhs: int = INFINITY
+            if not self._is_solid(index):
+                for neighbor in NEIGHBORS[index]:
+                    if self.g[neighbor] < rhs and not self._is_solid(neighbor):
+                        rhs = self.g[neighbor]
+                rhs = min(rhs + 1, INFINITY)
+            self.rhs[index] = rhs
+        if self.g[index] != self.rhs[index]:
+            self._push(index)
+        else:
+            self.open_keys.pop(index, None)
+
+    def _compute_shortest_path(self):
+        g, rhs, goal = self.g, self.rhs, self.goal
+        while self.open_set:
+            key, index = self.open_set[0]
+            if self.open_keys.get(index) != key:
+                heapq.heappop(self.open_set)  # Outdated entry
+                continue
+            if key >= self._key(goal) and g[goal] == rhs[goal]:
+                break
+            heapq.heappop(self.open_set)
+            del self.open_keys[index]
+            if g[index] > rhs[index]:
+                g[index] = rhs[index]
+            else:
+                g[index] = INFINITY
+                self._update_vertex(index)
+            for neighbor in NEIGHBORS[index]:
+                self._update_vertex(neighbor)
+
+    def _set_solution(self, solution: Optional[List[List[int]]]):
+        self.solution = solution
+        self.solution_cells = {y * GRID_SIZE + x for x, y in solution} if solution else set()
+        self.solution_stale = False
+        self.cleared_cells = []
+
+    def cell_changed(self, x: int, y: int):
+        """Notify the pathfinder that the material at x, y was replaced in the grid."""
+        index: int = y * GRID_SIZE + x
+        if self._is_solid(index):
+            if index in self.solution_cells:
+                self.solution_stale = True
+        else:
+            self.cleared_cells.append(index)
+        self._update_vertex(index)
+        for neighbor in NEIGHBORS[index]:
+            self._update_vertex(neighbor)
+
+    def move_goal(self, x: int, y: int):
+        """The vault moved. Distances from the door stay valid, only the queue order changes."""
+        self.goal = y * GRID_SIZE + x
+        self.solution_stale = True
+        self.open_set = [(self._key(index), index) for index in self.open_keys]
+        self.open_keys = {index: key for key, index in self.open_set}
+        heapq.heapify(self.open_set)
+
+    def _path_may_change(self, distance: int) -> bool:
+        if self.solution_stale or not self.solution:
+            return True
+        shortest: int = len(self.solution) - 1
+        if distance != shortest:
+            return True
+        for index in self.cleared_cells:
+            # A cleared cell can only redirect the path if a route through it is
+            # no longer than the current one.
+            if min(self.g[index], self.rhs[index]) + self._heuristic(index) <= shortest:
+                return True
+        return False
+
+    def _trace_solution(self) -> List[List[int]]:
+        """
+        The path pathfinder.solve_maze finds, read from the distances. Only cells on some
+        shortest path are visited: they're collected walking back from the vault, then
+        expanded in the order A* pops them, so ties between equally short paths are broken
+        the same way. Cell indexes sort like A*'s (row, column) tuples.
+        """
+        g, goal = self.g, self.goal
+        solid: bytes = self.grid.translate(self.solid_table)
+        on_path: bytearray = bytearray(CELL_COUNT)
+        on_path[goal] = 1
+        frontier: List[int] = [goal]
+        while frontier:
+            index: int = frontier.pop()
+            previous: int = g[index] - 1
+            for neighbor in NEIGHBORS[index]:
+                if g[neighbor] == previous and not on_path[neighbor] and not solid[neighbor]:
+                    on_path[neighbor] = 1
+                    frontier.append(neighbor)
+
+        goal_x, goal_y = goal % GRID_SIZE, goal // GRID_SIZE
+        came_from: array = array("h", [-1]) * CELL_COUNT
+        open_set: list = [(0, DOOR_INDEX)]
+        while open_set:
+            index = heapq.heappop(open_set)[1]
+            if index == goal:
+                break
+            following: int = g[index] + 1
+            for neighbor in NEIGHBORS[index]:
+                if on_path[neighbor] and came_from[neighbor] < 0 and g[neighbor] == following:
+                    came_from[neighbor] = index
+                    heuristic: int = abs(neighbor % GRID_SIZE - goal_x) + abs(neighbor // GRID_SIZE - goal_y)
+                    heapq.heappush(open_set, (following + heuristic, neighbor))
+
+        path: List[List[int]] = [[goal_x, goal_y]]
+        index = goal
+        while came_from[index] >= 0:
+            index = came_from[index]
+            path.append([index % GRID_SIZE, index // GRID_SIZE])
+        return path[::-1]
+
+    def _cut_off(self) -> bool:
+        """Bitset check, much cheaper than updating every distance behind a wall that closed the only way in."""
+        row_masks: List[int] = pathfinder.row_masks_from_bytes(self.grid.translate(self.solid_table))
+        door: tuple = (DOOR_INDEX // GRID_SIZE, DOOR_INDEX % GRID_SIZE)
+        return not pathfinder.is_reachable(door, (self.goal // GRID_SIZE, self.goal % GRID_SIZE), row_masks)
+
+    def is_reachable(self) -> bool:
+        self._compute_shortest_path()
+        return self.g[self.goal] != INFINITY
+
+    def get_solution(self) -> Optional[List[List[int]]]:
+        """Door to vault path as [[x, y], ...], identical to pathfinder.get_maze_solution."""
+        if not self.solution_stale and not self.cleared_cells:
+            return self.solution
+        if self.solution_stale and not self.cleared_cells and self._cut_off():
+            # The distances are left queued, clearing the wall again mostly undoes them
+            self._set_solution(None)
+            return None
+        self._compute_shortest_path()
+        distance: int = self.g[self.goal]
+        if distance == INFINITY:
+            self._set_solution(None)
+        elif self._path_may_change(distance):
+            self._set_solution(self._trace_solution())
+        else:
+            self.cleared_cells = []
+        return self.solution
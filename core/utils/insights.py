@@ -1,14 +1,15 @@
-import datetime
 import json
-import os
-import socket
+import random
 import uuid
-from _socket import gaierror
-from typing import Union
+from typing import Optional
 
+from utils import request_context, timestamps
 from utils.configuration import get_config_value
+from utils.gravwell import insights_sender
 from utils.db_config import db
 
+ALWAYS_LOG_BLUEPRINTS = ["api_fun_tools"]  # Administration
+
 
 def log_request(request, response):
     try:
@@ -31,63 +32,52 @@ def sanitize_content(dict_item):
     return dict_item
 
 
-def _send_data(data: Union[list, str]):
-    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    host = os.environ.get("GRAVWELL_HOST")
-    try:
-        port = int(os.environ.get("GRAVWELL_PORT", 7778))
-    except Exception:
-        #logger.warning("Unable to parse GRAVWELL_PORT and so no metrics exported")
-        return
-    if not host:
-        return
-    if isinstance(data, dict):
-        data = json.dumps(data)
-    if isinstance(data, str):
-        data = [data]
-    try:
-        client_socket.connect((host, port))
-        for line in data:
-            client_socket.sendall(line.encode())
-            client_socket.sendall(b'\n')
+def should_log(request, response, success) -> bool:
+    """
+    Errors, failed calls and admin calls are always logged. Everything else is
+    sampled at logs.requests.sample_rates[<endpoint>], falling back to
+    logs.requests.sample_rate.
+    """
+    if response.status_code >= 400 or success == "False" or request.blueprint in ALWAYS_LOG_BLUEPRINTS:
+        return True
+    sample_rates: dict = get_config_value("logs.requests.sample_rates", {"value": {}}).get("value")
+    sample_rate: float = sample_rates.get(request.endpoint, get_config_value(
+        "logs.requests.sample_rate", {"value": 1.0}
+    ).get("value"))
+    return sample_rate >= 1 or random.random() < sample_rate
 
-        client_socket.close()
-    except gaierror:
-        pass
-        #logger.warning(f"Gravwell not accessible, offline? {host}:{port}")
-    except Exception as e:
-        pass
-        #logger.error("Error:", e)
+
+def truncate(item, max_bytes: int):
+    """Bodies bigger than max_bytes (as JSON) are replaced by a preview of their first max_bytes."""
+    if not item or max_bytes < 0:
+        return item
+    serialized: str = json.dumps(item, default=str)
+    if len(serialized) <= max_bytes:
+        return item
+    return {"truncated": True, "size": len(serialized), "preview": serialized[:max_bytes]}
 
 
 def _log_request(request, response):
     status_code = str(response.status_code)
-    response_body = None
-    if not request.endpoint.startswith("asset."):
-        response_body = response.get_data(as_text=True)
-    response_json: dict = {}
-    player_id = "N/A"
-    try:
-        response_json = json.loads(response_body) if response_body else None
-        if response_json and "player_id" in response_json:
-            player_id = response_json["player_id"]
-    except Exception:
-        pass
-    try:
-        success = str(response_json.get("success", "N/A")) if response_json else False
-    except Exception:
-        success = "N/A"
-    response_json = sanitize_content(response_json)
+    success = request_context.get_success()
+    if not should_log(request, response, success):
+        return
+    max_body_bytes: int = get_config_value("logs.requests.max_body_bytes", {"value": 2048}).get("value")
+    response_json: Optional[dict] = request_context.get_response_body()
+    if response_json:
+        # Copy, the view's dict isn't ours to redact
+        response_json = truncate(sanitize_content(dict(response_json)), max_body_bytes)
+    player_id: str = request_context.get_player_id()
     request_method = request.method
     requester_ip = request.remote_addr
     http_path = request.url_rule.rule if request.url_rule else None
-    now = datetime.datetime.now().isoformat()
+    now = timestamps.now()
 
     request_body = {}
     headers = {}
 
     try:
-        request_body = sanitize_content(request.get_json())
+        request_body = truncate(sanitize_content(request.get_json()), max_body_bytes)
     except Exception:
         pass
     try:
@@ -114,4 +104,4 @@ def _log_request(request, response):
         }
     }
     db["requests"].insert_one(db_entry)
-    _send_data(db_entry)
+    insights_sender.send(db_entry)
@@ -0,0 +1,77 @@
+import logging
+import queue
+from typing import Callable, List
+
+from prometheus_client import Counter
+
+from utils.background import BackgroundWorker
+from utils.configuration import get_config_value
+from utils.enums import LoggerName
+
+QUEUE_SIZE = get_config_value(
+    "metrics.sink.queue_size", {"value": 10000}
+).get("value")
+BATCH_SIZE = get_config_value(
+    "metrics.sink.batch_size", {"value": 500}
+).get("value")
+FLUSH_SECONDS = get_config_value(
+    "metrics.sink.flush_seconds", {"value": 1}
+).get("value")
+logger = logging.getLogger(LoggerName.METRICS.value)
+
+
+class MetricSink:
+    """
+    Bounded queue of metric entries written in batches by a background thread.
+
+    Request threads only pay for an enqueue. When the writer falls behind and the
+    queue is full, new entries are dropped and counted instead of blocking.
+    """
+
+    def __init__(
+            self, write_batch: Callable[[List[dict]], None], dropped: Counter,
+            queue_size: int = QUEUE_SIZE, batch_size: int = BATCH_SIZE, flush_seconds: float = FLUSH_SECONDS
+    ):
+        self.write_batch: Callable[[List[dict]], None] = write_batch
+        self.dropped: Counter = dropped
+        self.batch_size: int = batch_size
+        self.flush_seconds: float = flush_seconds
+        self.entries: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.worker = BackgroundWorker("metric-sink", self._run)
+
+    def submit(self, entry: dict):
+        try:
+            self.entries.put_nowait(entry)
+        except queue.Full:
+            self.dropped.inc()
+            return
+        self.worker.ensure_started()
+
+    def flush(self):
+        """Write everything queued so far from the calling thread."""
+        while self._write(self._take(block=False)):
+            pass
+
+    def _take(self, block: bool) -> List[dict]:
+        batch: List[dict] = []
+        try:
+            if block:
+                batch.append(self.entries.get(timeout=self.flush_seconds))
+            while len(batch) < self.batch_size:
+                batch.append(self.entries.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _write(self, batch: List[dict]) -> bool:
+        if not batch:
+            return False
+        try:
+            self.write_batch(batch)
+        except Exception as e:
+            logger.error(f"Unable to write {len(batch)} metric entries: {e}")
+        return True
+
+    def _run(self):
+        while True:
+            self._write(self._take(block=True))
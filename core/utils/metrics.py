@@ -1,21 +1,23 @@
-import datetime
+import atexit
 import json
 import logging
 import os
-import socket
 import sys
 import threading
 import uuid
-from _socket import gaierror
 from logging import handlers
-from typing import Union
+from typing import List, Optional, Union
 
-from prometheus_client import push_to_gateway, Counter, Gauge, CollectorRegistry
+from prometheus_client import (
+    push_to_gateway, generate_latest, multiprocess, Counter, Gauge, Histogram, CollectorRegistry
+)
 
-from utils import metric_utils
-from utils.configuration import get_log_location, get_config_value
+from utils import metric_utils, timestamps
+from utils.configuration import get_log_location, get_config_value, config_cache_counter
 from utils.db_config import db
 from utils.enums import LoggerName
+from utils.gravwell import gravwell_events_counter, gravwell_reconnects_counter, metrics_sender
+from utils.metric_sink import MetricSink
 
 MAX_BYTES = get_config_value(
     "logs.rotation.max_bytes", {"value": (10 * (1000 * 1000))}
@@ -31,6 +33,9 @@ if log_location:
     handler = handlers.RotatingFileHandler(log_location, maxBytes=MAX_BYTES, backupCount=10)
     logger.addHandler(handler)
 
+# Set for gunicorn in gunicorn.conf.py, every worker then writes its metrics to files there
+MULTIPROCESS: bool = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
 
 class MetricTracker:
 
@@ -55,6 +60,25 @@ class MetricTracker:
             registry=self.registry
         )
 
+        self.http_request_duration = Histogram(
+            "apiserver_http_request_duration_seconds",
+            "Time spent handling HTTP requests",
+            labelnames=[
+                "method",
+                "py_endpoint"
+            ],
+            registry=self.registry
+        )
+
+        self.mongo_round_trips_counter = Counter(
+            "apiserver_mongo_round_trips_total",
+            "Commands sent to mongo while handling HTTP requests",
+            labelnames=[
+                "py_endpoint"
+            ],
+            registry=self.registry
+        )
+
         self.robberies_counter = Counter(
             "apiserver_robberies_total",
             "Count of robberies",
@@ -70,6 +94,7 @@ class MetricTracker:
             labelnames=[
                 "successful"
             ],
+            multiprocess_mode="sum",
             registry=self.registry
         )
 
@@ -79,6 +104,7 @@ class MetricTracker:
             labelnames=[
                 "active"
             ],
+            multiprocess_mode="mostrecent",  # Set by whichever worker runs refresh_metrics
             registry=self.registry
         )
 
@@ -88,12 +114,14 @@ class MetricTracker:
             labelnames=[
                 "abandoned"
             ],
+            multiprocess_mode="mostrecent",
             registry=self.registry
         )
 
         self.registration = Gauge(
             "apiserver_registration_tokens",
             "Number of registration tokens",
+            multiprocess_mode="mostrecent",
             registry=self.registry
         )
 
@@ -103,47 +131,36 @@ class MetricTracker:
             labelnames=[
                 "houseowner"
             ],
+            multiprocess_mode="mostrecent",
             registry=self.registry
         )
 
-    def _send_data(self, data: Union[list, str]):
-        client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        host = os.environ.get("GRAVWELL_HOST")
-        try:
-            port = int(os.environ.get("GRAVWELL_PORT", 7777))
-        except Exception:
-            logger.warning("Unable to parse GRAVWELL_PORT and so no metrics exported")
-            return
-        if not host:
-            return
-        if isinstance(data, dict):
-            data = json.dumps(data)
-        if isinstance(data, str):
-            data = [data]
-        try:
-            client_socket.connect((host, port))
-            for line in data:
-                client_socket.sendall(line.encode())
-                client_socket.sendall(b'\n')
-
-            client_socket.close()
-        except gaierror:
-            logger.warning(f"Gravwell not accessible, offline? {host}:{port}")
-        except ConnectionRefusedError:
-            logger.warning("Gravwell ingester offline")
-        except Exception as e:
-            logger.error("Gravwell inaccessable.")
+        self.registry.register(config_cache_counter)
+        self.registry.register(gravwell_events_counter)
+        self.registry.register(gravwell_reconnects_counter)
+
+        self.dropped_entries_counter = Counter(
+            "apiserver_metric_entries_dropped_total",
+            "Metric entries dropped because the sink queue was full",
+            registry=self.registry
+        )
+        self.sink = MetricSink(self._write_entries, self.dropped_entries_counter)
 
     def write_entry(self, entry):
-        """Allow writing metric entry to multiple locations such as DB & file."""
-        db["metrics"].insert_one(entry)
-        logger.info(entry)
-        self._send_data(entry)
+        """Allow writing metric entry to multiple locations such as DB & file, written in the background."""
+        self.sink.submit(entry)
+
+    def _write_entries(self, entries: List[dict]):
+        """Batch from the sink thread: one insert_many and one gravwell connection."""
+        db["metrics"].insert_many(entries, ordered=False)
+        for entry in entries:
+            logger.info(entry)
+        metrics_sender.send([json.dumps(entry, default=timestamps.json_default) for entry in entries])
 
     def increment_robbery_attempt(self, successful: Union[bool, str]):
         self.robberies_gauge.labels(successful=str(successful)).inc(1)
         self.robberies_counter.labels(successful=str(successful)).inc(1)
-        now = datetime.datetime.now().isoformat()
+        now = timestamps.now()
         db_entry = {
             "_id": str(uuid.uuid4()),
             "timestamp": now,
@@ -167,7 +184,7 @@ class MetricTracker:
         self.players.labels(
             active=str(active)
         ).set(number)
-        now = datetime.datetime.now().isoformat()
+        now = timestamps.now()
         db_entry = {
             "_id": str(uuid.uuid4()),
             "timestamp": now,
@@ -187,7 +204,7 @@ class MetricTracker:
         self.houses_occupied.labels(
             houseowner=str(houseowner)
         ).set(number)
-        now = datetime.datetime.now().isoformat()
+        now = timestamps.now()
         db_entry = {
             "_id": str(uuid.uuid4()),
             "timestamp": now,
@@ -205,7 +222,7 @@ class MetricTracker:
 
     def set_registration_tokens(self, number):
         self.registration.set(number)
-        now = datetime.datetime.now().isoformat()
+        now = timestamps.now()
         db_entry = {
             "_id": str(uuid.uuid4()),
             "timestamp": now,
@@ -223,7 +240,7 @@ class MetricTracker:
         self.houses.labels(
             abandoned=str(abandoned)
         ).set(number)
-        now = datetime.datetime.now().isoformat()
+        now = timestamps.now()
         db_entry = {
             "_id": str(uuid.uuid4()),
             "timestamp": now,
@@ -251,7 +268,7 @@ class MetricTracker:
             status=status,
             success=success
         ).inc(1)
-        now = datetime.datetime.now().isoformat()
+        now = timestamps.now()
         db_entry = {
             "_id": str(uuid.uuid4()),
             "timestamp": now,
@@ -272,10 +289,48 @@ class MetricTracker:
         self.write_entry(db_entry)
         return self
 
+    def observe_http_request_duration(self, method, py_endpoint, seconds: float):
+        self.http_request_duration.labels(method=method, py_endpoint=py_endpoint).observe(seconds)
+        return self
+
+    def apply_snapshot(self):
+        """
+        Set the game gauges from the counts the task engine last saved (see
+        task_engine/tasks/db_tasks.py), so scrapes don't wait on counting.
+        """
+        snapshot: Optional[dict] = db["metric_snapshots"].find_one({"_id": "game_counts"})
+        if not snapshot:
+            return self
+        gauges: dict = {
+            "apiserver_players_number": self.players,
+            "apiserver_houses_number": self.houses,
+            "apiserver_registration_tokens": self.registration,
+            "apiserver_houses_occupied_players": self.houses_occupied
+        }
+        for item in snapshot.get("gauges", []):
+            gauge: Optional[Gauge] = gauges.get(item["metric"])
+            if gauge is None:
+                continue
+            (gauge.labels(**item["labels"]) if item["labels"] else gauge).set(item["value"])
+        return self
+
+    def exposition(self) -> bytes:
+        """Prometheus text format of every worker's metrics (or just this process' outside gunicorn)."""
+        if not MULTIPROCESS:
+            return generate_latest(self.registry)
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+
+    def increment_mongo_round_trips(self, py_endpoint, round_trips: int):
+        """Divide by apiserver_http_requests_total for round trips per request."""
+        self.mongo_round_trips_counter.labels(py_endpoint=py_endpoint).inc(round_trips)
+        return self
+
     def push(self):
         """
         Not necessary for /metrics, but necessary if you have a prometheus
-        push gateway.
+        push gateway. Not called per request, /metrics is scraped instead.
 
         Warning: not all metrics will get published to the push registry unless
         /metrics is called on this server.
@@ -290,26 +345,25 @@ class MetricTracker:
 
 
 metric_tracker = MetricTracker()
+atexit.register(metric_tracker.sink.flush)
 
 
 def refresh_metrics(metric_tracker):
+    counts: dict = metric_utils.get_game_counts()
 
     # Count active and inactive players
-    active_player_count, inactive_player_count = metric_utils.get_player_counts()
-    metric_tracker.set_players(active_player_count, True).push()
-    metric_tracker.set_players(inactive_player_count, False).push()
+    metric_tracker.set_players(counts["players"].get(True, 0), True)
+    metric_tracker.set_players(counts["players"].get(False, 0), False)
 
     # Count houses and abandoned houses
-    active_houses, abandoned_houses = metric_utils.get_house_counts()
-    metric_tracker.set_houses(active_houses, False).push()
-    metric_tracker.set_houses(abandoned_houses, True).push()
+    metric_tracker.set_houses(counts["houses"].get(False, 0), False)
+    metric_tracker.set_houses(counts["houses"].get(True, 0), True)
 
     # Count registration tokens
-    metric_tracker.set_registration_tokens(metric_utils.get_registration_counts()).push()
+    metric_tracker.set_registration_tokens(counts["registration"].get(None, 0))
 
     # Count players in houses (active robberies)
-    in_own_house, in_other_house = metric_utils.get_players_in_houses()
-    metric_tracker.set_house_occupied(in_own_house, True).push()
-    metric_tracker.set_house_occupied(in_other_house, False).push()
-
+    metric_tracker.set_house_occupied(counts["occupied"].get(True, 0), True)
+    metric_tracker.set_house_occupied(counts["occupied"].get(False, 0), False)
 
+    metric_tracker.push()  # Once for all of the gauges above
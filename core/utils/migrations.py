@@ -0,0 +1,314 @@
+"""
+Versioned schema migrations for the mongo collections.
+
+Migrations run in order and the last one applied is recorded in config as
+"schema.version", so each runs once per database. They run before the API
+starts, once, from the gunicorn master (on_starting in gunicorn.conf.py), never
+from the workers importing main.py. A migration should still be safe to run
+twice, in case two deploys overlap.
+
+Data backfills that rewrite whole collections aren't migrations, they'd hold up
+every start. They're run by hand as a deploy step, can be stopped at any point and
+pick up where they left off.
+
+From the core directory:
+    python -m utils.migrations              Apply pending migrations, exits 1 if one fails and 2 if
+                                            they couldn't run at all
+    python -m utils.migrations explain      Report queries that would scan a whole collection
+    python -m utils.migrations timestamps   Backfill: convert string timestamps to dates
+"""
+import logging
+import sys
+from typing import Callable, List, Optional, Tuple
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from utils import timestamps
+from utils.configuration import bump_config_version, get_config_value
+from utils.db_config import db
+from utils.enums import LoggerName
+
+SCHEMA_VERSION_KEY = "schema.version"
+logger = logging.getLogger(LoggerName.SYSTEM.value)
+
+
+class MigrationError(Exception):
+    pass
+
+
+# (collection, field, unique, partial filter). Each migration's set is fixed once
+# released, new indexes go in a new migration.
+IndexSpec = Tuple[str, str, bool, Optional[dict]]
+
+# Migration 1. Unique where the game logic assumes it: a token identifies one player,
+# a player is in one house at a time and a house has one visitor at a time (entering
+# a house relies on the access ones). Fields that may be null are only unique when set.
+INDEXES_V1: List[IndexSpec] = [
+    ("players", "token", True, None),
+    ("players", "player_id", True, None),
+    ("players", "house_id", True, {"house_id": {"$type": "string"}}),
+    ("players", "registered_by", False, None),
+    ("players", "last_activity", False, None),
+    ("access", "player_id", True, None),
+    ("access", "house_id", True, None),
+    ("houses", "abandoned", False, None),
+    ("registration", "mac", True, {"mac": {"$type": "string"}}),
+]
+# Migration 3, for HouseAccess.evict_expired
+INDEXES_V3: List[IndexSpec] = [
+    ("access", "latest_activity", False, None),
+    ("access", "access_time", False, None),
+]
+INDEXES: List[IndexSpec] = INDEXES_V1 + INDEXES_V3
+# Checked when the API starts, HouseAccess.enter_house relies on them
+ENTRY_INDEXES: List[IndexSpec] = [index for index in INDEXES_V1 if index[0] == "access" and index[2]]
+
+# Filters the API runs on every request or on hot paths, checked by explain_report
+HOT_QUERIES: List[Tuple[str, dict]] = [
+    ("players", {"token": "explain"}),
+    ("players", {"player_id": "explain"}),
+    ("players", {"house_id": "explain"}),
+    ("players", {"registered_by": "explain"}),
+    ("players", {"last_activity": {"$gt": "explain"}}),
+    ("access", {"player_id": "explain"}),
+    ("access", {"house_id": "explain"}),
+    ("access", {"latest_activity": {"$lt": "explain"}}),
+    ("access", {"access_time": {"$lt": "explain"}}),
+    ("houses", {"abandoned": False}),
+    ("registration", {"mac": "explain"}),
+]
+
+
+def index_name(field: str) -> str:
+    return f"{field}_1"
+
+
+def create_indexes(indexes: List[IndexSpec]) -> bool:
+    """
+    Raises MigrationError if any of them can't be built, usually duplicates that have
+    to be cleaned up before an index can be unique. Code relying on a unique index
+    mustn't run against a database without it.
+    """
+    failures: List[str] = []
+    for collection, field, unique, partial_filter in indexes:
+        options: dict = {"name": index_name(field), "unique": unique}
+        if partial_filter:
+            options["partialFilterExpression"] = partial_filter
+        try:
+            db[collection].create_index([(field, ASCENDING)], **options)
+        except OperationFailure as e:
+            failures.append(f"{collection}.{field}: {e}")
+    failures.extend(verify_indexes(indexes))
+    if failures:
+        raise MigrationError("Unable to create indexes, " + "; ".join(failures))
+    return True
+
+
+def create_hot_query_indexes() -> bool:
+    return create_indexes(INDEXES_V1)
+
+
+def create_eviction_indexes() -> bool:
+    return create_indexes(INDEXES_V3)
+
+
+def verify_indexes(indexes: List[IndexSpec] = INDEXES) -> List[str]:
+    """Indexes that are missing or don't have the expected uniqueness."""
+    problems: List[str] = []
+    for collection, field, unique, _ in indexes:
+        index: Optional[dict] = db[collection].index_information().get(index_name(field))
+        if not index:
+            problems.append(f"{collection}.{field} is missing")
+        elif bool(index.get("unique")) != unique:
+            problems.append(f"{collection}.{field} should {'' if unique else 'not '}be unique")
+    for problem in problems:
+        logger.error(f"Index check failed: {problem}")
+    return problems
+
+
+def cap_request_log() -> bool:
+    """
+    Give the requests audit log a fixed size, once full mongo overwrites the oldest
+    entries. An existing log is converted in place (which takes a lock on it).
+    """
+    capped_bytes: int = get_config_value(
+        "logs.requests.capped_bytes", {"value": 256 * 1024 * 1024}
+    ).get("value")
+    try:
+        if "requests" not in db.list_collection_names():
+            db.create_collection("requests", capped=True, size=capped_bytes)
+        elif not db["requests"].options().get("capped"):
+            db.command("convertToCapped", "requests", size=capped_bytes)
+    except OperationFailure as e:
+        if db["requests"].options().get("capped"):
+            return True  # Another worker got there first
+        logger.error(f"Unable to cap the requests collection: {e}")
+        return False
+    return True
+
+
+# Fields convert_timestamps rewrites from naive ISO strings to dates. The requests audit log
+# isn't converted: it's capped, mongo refuses updates that change the size of a capped
+# document, and its old entries are overwritten soon enough.
+TIMESTAMP_FIELDS: List[Tuple[str, List[str]]] = [
+    ("players", ["created_on", "last_activity", "last_robbery_attempt"]),
+    ("access", ["access_time", "latest_activity"]),
+    ("metrics", ["timestamp"]),
+]
+TIMESTAMP_BATCH_SIZE = 1000
+
+
+def _timestamp_progress(collection: str) -> Optional[dict]:
+    # Kept out of get_config_value, every batch would bump the config version
+    return db["config"].find_one({"_id": f"schema.timestamps.{collection}"})
+
+
+def _save_timestamp_progress(collection: str, progress: dict):
+    # Secret keeps it out of the config dump, an ObjectId _id can't be returned as JSON
+    db["config"].update_one(
+        {"_id": f"schema.timestamps.{collection}"}, {"$set": {**progress, "secret": True}}, upsert=True
+    )
+
+
+def convert_timestamps() -> bool:
+    """
+    Backfill for the timestamps written as strings before they were stored as dates.
+    The API reads both (timestamps.as_datetime, HouseAccess.expired_filter), so it can
+    run while the game is up and doesn't have to finish before a deploy.
+
+    Batches in _id order, the last _id converted is recorded after every batch so an
+    interrupted run picks up where it stopped. Each update only applies while the
+    field is still the string that was read, so it doesn't overwrite newer writes.
+    Returns False if any update failed. Those fields are left as strings and the
+    next run goes over that collection again from the start.
+    """
+    all_converted: bool = True
+    for collection, fields in TIMESTAMP_FIELDS:
+        progress: Optional[dict] = _timestamp_progress(collection)
+        if progress and progress.get("done"):
+            continue
+        last_id = progress.get("value") if progress else None
+        converted: int = 0
+        failed: int = 0
+        while True:
+            query: dict = {"_id": {"$gt": last_id}} if last_id is not None else {}
+            batch: List[dict] = list(
+                db[collection].find(query, fields).sort("_id", ASCENDING).limit(TIMESTAMP_BATCH_SIZE)
+            )
+            if not batch:
+                break
+            operations: List[UpdateOne] = []
+            for item in batch:
+                for field in fields:
+                    value = item.get(field)
+                    if not isinstance(value, str):
+                        continue
+                    try:
+                        date = timestamps.as_datetime(value)
+                    except ValueError:
+                        logger.warning(f"Leaving {collection} {item['_id']} {field} as {value!r}")
+                        continue
+                    operations.append(UpdateOne({"_id": item["_id"], field: value}, {"$set": {field: date}}))
+            if operations:
+                try:
+                    converted += db[collection].bulk_write(operations, ordered=False).modified_count
+                except BulkWriteError as e:
+                    errors: List[dict] = e.details.get("writeErrors", [])
+                    converted += e.details.get("nModified", 0)
+                    failed += len(errors)
+                    logger.error(f"{len(errors)} {collection} timestamps not converted, first: {errors[:1]}")
+            last_id = batch[-1]["_id"]
+            _save_timestamp_progress(collection, {"value": last_id})
+        logger.info(f"Converted {converted} {collection} timestamps to dates, {failed} failed")
+        if failed:
+            all_converted = False
+            _save_timestamp_progress(collection, {"value": None})
+        else:
+            _save_timestamp_progress(collection, {"done": True})
+    return all_converted
+
+
+# (version, description, migration). Append only, a migration returning False (or
+# raising) is retried on the next deploy and stops the ones after it from running.
+MIGRATIONS: List[Tuple[int, str, Callable[[], bool]]] = [
+    (1, "Indexes for hot queries", create_hot_query_indexes),
+    (2, "Capped requests audit log", cap_request_log),
+    (3, "Indexes for eviction sweeps", create_eviction_indexes),
+]
+
+
+LATEST_VERSION: int = MIGRATIONS[-1][0]
+
+
+def get_schema_version() -> int:
+    return get_config_value(SCHEMA_VERSION_KEY, default_value={"value": 0}).get("value")
+
+
+def _record_schema_version(version: int):
+    # One upsert, and $max so an overlapping run that's further along isn't moved back
+    db["config"].update_one(
+        {"_id": SCHEMA_VERSION_KEY}, {"$max": {"value": version}, "$setOnInsert": {"secret": False}}, upsert=True
+    )
+    bump_config_version()
+
+
+def migrate() -> int:
+    """Apply pending migrations in order, returns the schema version the database is at."""
+    version: int = get_schema_version()
+    for migration_version, description, migration in MIGRATIONS:
+        if migration_version <= version:
+            continue
+        logger.info(f"Applying schema migration {migration_version}: {description}")
+        try:
+            applied: bool = migration()
+        except MigrationError as e:
+            logger.error(str(e))
+            applied = False
+        if not applied:
+            logger.error(f"Schema migration {migration_version} failed, staying at version {version}")
+            break
+        version = migration_version
+        _record_schema_version(version)
+    return version
+
+
+def _collection_scan(plan: dict) -> bool:
+    if plan.get("stage") == "COLLSCAN":
+        return True
+    children: List[dict] = plan.get("inputStages", [])
+    if "inputStage" in plan:
+        children = children + [plan["inputStage"]]
+    return any(_collection_scan(child) for child in children)
+
+
+def explain_report() -> List[str]:
+    """HOT_QUERIES the query planner would answer with a collection scan."""
+    scans: List[str] = []
+    for collection, query in HOT_QUERIES:
+        try:
+            plan: dict = db[collection].find(query).explain().get("queryPlanner", {}).get("winningPlan", {})
+        except Exception as e:
+            logger.warning(f"Unable to explain {collection} {query}: {e}")
+            continue
+        if _collection_scan(plan):
+            scans.append(f"{collection} {query}")
+    for scan in scans:
+        logger.warning(f"Collection scan: {scan}")
+    return scans
+
+
+if __name__ == "__main__":
+    logger.addHandler(logging.StreamHandler(sys.stdout))
+    logger.setLevel(logging.INFO)
+    if sys.argv[1:] == ["explain"]:
+        sys.exit(1 if explain_report() else 0)
+    if sys.argv[1:] == ["timestamps"]:
+        sys.exit(0 if convert_timestamps() else 1)
+    try:
+        schema_version: int = migrate()
+    except Exception as e:
+        logger.exception(f"Schema migrations couldn't run: {e}")
+        sys.exit(2)
+    print(f"Schema version {schema_version}")
+    sys.exit(0 if schema_version >= LATEST_VERSION else 1)
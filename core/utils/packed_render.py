@@ -0,0 +1,36 @@
+import base64
+from typing import Optional
+
+# 2 bits per tile, 4 tiles per byte with the first tile in the lowest bits.
+# The player isn't encoded: it is always at WINDOW_PLAYER_INDEX of a window
+# and the tile under the player is always air.
+TILE_BITS = 2
+TILE_CHARACTERS = "01vd"  # Air, solid, vault, door
+TILE_CODES: dict = {character: code for code, character in enumerate(TILE_CHARACTERS)}
+WINDOW_PLAYER_INDEX = 3 * 8 + 3  # Local [3, 3] of the 8x8 window
+
+
+def pack_tiles(tiles: str) -> bytes:
+    packed = bytearray((len(tiles) * TILE_BITS + 7) // 8)
+    for index, tile in enumerate(tiles):
+        packed[index >> 2] |= TILE_CODES.get(tile, 0) << ((index & 3) * TILE_BITS)
+    return bytes(packed)
+
+
+def unpack_tiles(packed: bytes, count: int, player_index: Optional[int] = None) -> str:
+    tiles = [
+        TILE_CHARACTERS[(packed[index >> 2] >> ((index & 3) * TILE_BITS)) & 3] for index in range(count)
+    ]
+    if player_index is not None:
+        tiles[player_index] = "p"
+    return "".join(tiles)
+
+
+def encode_tiles(tiles: str) -> str:
+    """Compressed render string ("01vdp") to the packed base64 form sent to badges."""
+    return base64.b64encode(pack_tiles(tiles)).decode("ascii")
+
+
+def decode_tiles(data: str, count: int, player_index: Optional[int] = None) -> str:
+    """Packed base64 form back to the compressed render string."""
+    return unpack_tiles(base64.b64decode(data), count, player_index=player_index)
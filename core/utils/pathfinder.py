@@ -1,12 +1,23 @@
 import heapq
-from typing import List, Optional
+from typing import List, Optional, Union
 
 from api.material_base import MaterialType
 
+BACKEND_A_STAR = "a_star"
+BACKEND_BITSET = "bitset"
+BACKEND_INCREMENTAL = "incremental"  # Per house LPA*, see utils/incremental_pathfinder.py
+BACKENDS: List[str] = [BACKEND_INCREMENTAL, BACKEND_BITSET, BACKEND_A_STAR]
+
+# Rows are packed into one integer with a stride of 32 bits. Bit 31 of every row is
+# never free, which stops the left/right shifts from wrapping into the next row.
+ROW_STRIDE = 32
+ROW_MASK = (1 << 31) - 1
+BIT_DIGITS: bytes = bytes.maketrans(b"\x00\x01", b"01")
+
 
 def extract_vault_location(construction: List[dict]) -> Optional[List[int]]:
     for item in construction:
-        material_type: Optional[str, MaterialType] = item["material_type"]
+        material_type: Union[str, MaterialType] = item["material_type"]
         if isinstance(material_type, MaterialType):
             material_type: str = item["material_type"].value
         if material_type == "Vault":
@@ -17,7 +28,7 @@ def extract_vault_location(construction: List[dict]) -> Optional[List[int]]:
 def is_solid(x: int, y: int, construction: List[dict]) -> int:
     for item in construction:
         location = item["location"]
-        material_type: Optional[str, MaterialType] = item["material_type"]
+        material_type: Union[str, MaterialType] = item["material_type"]
         if isinstance(material_type, MaterialType):
             material_type: str = item["material_type"].value
         if location[0] == x and location[1] == y:
@@ -25,14 +36,26 @@ def is_solid(x: int, y: int, construction: List[dict]) -> int:
     return 0
 
 
+def solid_matrix(construction: List[dict]) -> List[List[int]]:
+    """31x31 rows of is_solid values, built in a single pass over the construction."""
+    rows: List[List[int]] = [[0] * 31 for _ in range(0, 31)]
+    seen: set = set()
+    for item in construction:
+        x, y = item["location"]
+        if (x, y) in seen or not (0 <= x < 31 and 0 <= y < 31):
+            continue  # is_solid only ever looks at the first item for a location
+        seen.add((x, y))
+        material_type: Union[str, MaterialType] = item["material_type"]
+        if isinstance(material_type, MaterialType):
+            material_type: str = item["material_type"].value
+        rows[y][x] = 0 if material_type == "Vault" else 1
+    return rows
+
+
 def deconstruct_house(construction: List[dict]):
     vault_location: List[int] = extract_vault_location(construction)
     door_location: List[int] = [0, 15]
-    rows: List[List[int]] = []
-    for y in range(0, 31):
-        rows.append([
-            is_solid(x, y, construction) for x in range(0, 31)
-        ])
+    rows: List[List[int]] = solid_matrix(construction)
     return (
         (door_location[1], door_location[0]),
         (vault_location[1], vault_location[0]),
@@ -70,6 +93,11 @@ def get_a_star_maze_solution(construction: List[dict]):
     https://en.wikipedia.org/wiki/A*_search_algorithm
     """
     start, end, maze = deconstruct_house(construction)
+    return solve_maze(start, end, maze)
+
+
+def solve_maze(start, end, maze):
+    """A* over a matrix of rows where 0 is passable, with (row, col) start and end."""
     rows, cols = len(maze), len(maze[0])
     open_set = []
     heapq.heappush(open_set, (0, start))
@@ -96,8 +124,66 @@ def get_a_star_maze_solution(construction: List[dict]):
     return None  # No path found
 
 
-def get_maze_solution(construction: List[dict]):
-    solution = get_a_star_maze_solution(construction)
+def row_masks_from_matrix(maze: List[List[int]]) -> List[int]:
+    """Pack each row of a solid matrix into an integer, bit x set when x is solid."""
+    return [
+        int("".join("1" if cell else "0" for cell in reversed(row)), 2) for row in maze
+    ]
+
+
+def row_masks_from_bytes(solid: bytes, width: int = 31) -> List[int]:
+    """Same as row_masks_from_matrix for a row major buffer of 0/1 bytes."""
+    digits: bytes = solid.translate(BIT_DIGITS)
+    return [
+        int(digits[offset:offset + width][::-1], 2) for offset in range(0, len(digits), width)
+    ]
+
+
+def is_reachable(start, end, row_masks: List[int]) -> bool:
+    """
+    Word parallel BFS over packed rows, with (row, col) start and end.
+
+    Every row of the frontier expands at once with shift / and / or, so each
+    step costs a handful of big integer operations instead of a heap push per cell.
+    """
+    free: int = 0
+    for y, mask in enumerate(row_masks):
+        free |= (~mask & ROW_MASK) << (y * ROW_STRIDE)
+    start_bit: int = 1 << (start[0] * ROW_STRIDE + start[1])
+    end_bit: int = 1 << (end[0] * ROW_STRIDE + end[1])
+    if not free & start_bit or not free & end_bit:
+        return False
+    reached: int = start_bit
+    while not reached & end_bit:
+        grown: int = (
+            reached | reached << 1 | reached >> 1 |
+            reached << ROW_STRIDE | reached >> ROW_STRIDE
+        ) & free
+        if grown == reached:
+            return False
+        reached = grown
+    return True
+
+
+def is_vault_reachable(construction: List[dict], backend: str = BACKEND_BITSET) -> bool:
+    """Answer door to vault reachability without building the full path when possible."""
+    if not extract_vault_location(construction):
+        return False
+    if backend == BACKEND_BITSET:
+        start, end, maze = deconstruct_house(construction)
+        return is_reachable(start, end, row_masks_from_matrix(maze))
+    return get_maze_solution(construction, backend=BACKEND_A_STAR) is not None
+
+
+def get_maze_solution(construction: List[dict], backend: str = BACKEND_A_STAR):
+    if backend == BACKEND_BITSET:
+        # Cheap rejection first, the path is only worth building if there is one.
+        start, end, maze = deconstruct_house(construction)
+        if not is_reachable(start, end, row_masks_from_matrix(maze)):
+            return None
+        solution = solve_maze(start, end, maze)
+    else:
+        solution = get_a_star_maze_solution(construction)
     if not solution:
         return None
     return [[c, r] for r, c in solution]
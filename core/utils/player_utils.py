@@ -11,10 +11,10 @@ def delete_player(player: Union[dict, str]):
     if not player:
         return False, "Player does not exist"
     if house_id := player.get("house_id"):
-        if house := db["houses"].find_one({"_id": house_id, "abandoned": False}):
-            house["abandoned"] = True
-            house["abandoned_by"] = player_id
-            db["houses"].find_one_and_replace({"_id": house_id}, house)
+        db["houses"].update_one(
+            {"_id": house_id, "abandoned": False},
+            {"$set": {"abandoned": True, "abandoned_by": player_id}, "$inc": {"version": 1}}
+        )
 
     # new UUID so there's no overlaps. old ID can still be accessed via player_id
     player["_id"] = str(uuid.uuid4())
@@ -0,0 +1,69 @@
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from utils.configuration import get_config_value
+
+MAX_ENTRIES = get_config_value(
+    "game.render_cache.max_entries", {"value": 4096}
+).get("value")
+
+
+class RenderCache:
+    """
+    Bounded LRU of rendered house views.
+
+    Keys are (house_id, house version, player location, view type). A house's
+    version is bumped by every House.save, so a saved house never serves an old
+    render, and its stale entries are dropped right away rather than waiting to
+    age out of the LRU.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries: int = max_entries
+        self.entries: OrderedDict = OrderedDict()
+        self.keys_by_house: dict = {}
+        self.lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def make_key(house_id: str, version: int, location, view: str) -> Tuple:
+        return house_id, version, location[0], location[1], view
+
+    def get(self, key: Tuple) -> Optional[dict]:
+        with self.lock:
+            render: Optional[dict] = self.entries.get(key)
+            if render is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return render
+
+    def put(self, key: Tuple, render: dict):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = render
+            self.entries.move_to_end(key)
+            self.keys_by_house.setdefault(key[0], set()).add(key)
+            while len(self.entries) > self.max_entries:
+                old_key, _ = self.entries.popitem(last=False)
+                self._forget(old_key)
+
+    def invalidate(self, house_id: str):
+        with self.lock:
+            for key in self.keys_by_house.pop(house_id, set()):
+                self.entries.pop(key, None)
+
+    def _forget(self, key: Tuple):
+        keys: Optional[set] = self.keys_by_house.get(key[0])
+        if keys is None:
+            return
+        keys.discard(key)
+        if not keys:
+            del self.keys_by_house[key[0]]
+
+
+render_cache = RenderCache()
@@ -0,0 +1,35 @@
+from typing import Optional, Union
+
+from flask import g, has_request_context
+
+
+def set_player_id(player_id: str):
+    """Player the request was made as, recorded by the decorators once the token checks out."""
+    if has_request_context():
+        g.player_id = player_id
+
+
+def record_response(rv):
+    """Keep the dict a view returned so logging and metrics don't parse the response body."""
+    body = rv[0] if isinstance(rv, tuple) and rv else rv
+    if has_request_context() and isinstance(body, dict):
+        g.response_body = body
+
+
+def get_response_body() -> Optional[dict]:
+    return g.get("response_body")
+
+
+def get_player_id() -> str:
+    player_id: Optional[str] = g.get("player_id")
+    if player_id:
+        return player_id
+    body: Optional[dict] = get_response_body()
+    if body and "player_id" in body:
+        return body["player_id"]
+    return "N/A"
+
+
+def get_success() -> Union[str, bool]:
+    body: Optional[dict] = get_response_body()
+    return str(body.get("success", "N/A")) if body else False
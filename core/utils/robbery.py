@@ -1,21 +1,38 @@
-import random
 from typing import Optional, List
 
+from utils.configuration import get_config_value
 from utils.db_config import db
 
 
+def _unoccupied(exclusions: List[str]) -> List[dict]:
+    return [
+        {"$match": {"abandoned": False, "_id": {"$nin": exclusions}}},
+        {"$lookup": {"from": "access", "localField": "_id", "foreignField": "house_id", "as": "occupants"}},
+        {"$match": {"occupants": {"$size": 0}}},
+    ]
+
+
 def find_unoccupied_house(exclusions: Optional[List[str]] = None) -> str:
+    """
+    A random house that isn't abandoned, excluded or being visited.
+
+    robbery.sample_size houses are drawn at random from the whole collection first,
+    which mongo does without reading the rest of a large collection. Only the sampled
+    ones are filtered and looked up in access (on the unique access.house_id index).
+    The sample is oversized to leave an open house among it when most are abandoned
+    or occupied. Only when none of it is open are all the candidates read, which
+    finds an open house if there is one.
+    """
     if not exclusions:
         exclusions = []
-    houses = db["houses"].find({
-        "abandoned": False
-    }, ["house_id"])
-    accesses: List[str] = [item["house_id"] for item in db["access"].find({}, ["house_id"])]
-    open_houses: List[str] = []
-    for house in houses:
-        house_id: str = house["house_id"]
-        if house_id in open_houses:
-            continue
-        if house_id not in accesses and house_id not in exclusions:
-            open_houses.append(house_id)
-    return random.choice(open_houses) if len(open_houses) > 0 else None
+    sample_size: int = get_config_value(
+        "robbery.sample_size", {"value": 50}
+    ).get("value")
+    sampled: List[dict] = [{"$sample": {"size": sample_size}}] + _unoccupied(exclusions) + [
+        {"$limit": 1}, {"$project": {"_id": 1}}
+    ]
+    for house in db["houses"].aggregate(sampled):
+        return house["_id"]
+    for house in db["houses"].aggregate(_unoccupied(exclusions) + [{"$sample": {"size": 1}}, {"$project": {"_id": 1}}]):
+        return house["_id"]
+    return None
@@ -5,8 +5,8 @@ from logging import handlers
 
 from api.house_tracking import HouseAccess
 from utils.configuration import get_config_value, get_log_location
-from utils.db_config import db
 from utils.enums import LoggerName
+from utils.migrations import ENTRY_INDEXES, LATEST_VERSION, get_schema_version, verify_indexes
 
 MAX_BYTES = get_config_value(
     "logs.rotation.max_bytes", {"value": (10 * (1000 * 1000))}
@@ -26,13 +26,24 @@ if log_location:
     logger.addHandler(handler)
 
 
+def schema_check():
+    """
+    Migrations are applied before the workers start (see utils/migrations.py), this reports
+    the schema version and checks the indexes HouseAccess.enter_house relies on.
+    """
+    schema_version: int = get_schema_version()
+    if schema_version < LATEST_VERSION:
+        logger.error(f"Database schema is at version {schema_version}, run python -m utils.migrations")
+    else:
+        logger.info(f"Database schema is at version {schema_version}")
+    HouseAccess.unique_access_indexes = not verify_indexes(ENTRY_INDEXES)
+    if not HouseAccess.unique_access_indexes:
+        logger.error("Entering houses checks for the player and an occupant first until the access indexes are built")
+
+
 def house_evictions():
-    evictions: int = 0
-    for item in db["access"].find({}):
-        if HouseAccess.visit_too_long(item):
-            HouseAccess.evict(item["player_id"])
-            evictions += 1
-    logger.info(f"Evicted {evictions} people from houses!")
+    reasons: dict = HouseAccess.evict_expired()
+    logger.info(f"Evicted {sum(reasons.values())} people from houses! {reasons}")
 
 
 def warnings():
@@ -0,0 +1,26 @@
+import datetime
+from typing import Optional, Union
+
+
+def now() -> datetime.datetime:
+    """Timezone aware UTC, stored by mongo as a date and read back as UTC (see db_config)."""
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def as_datetime(value: Optional[Union[datetime.datetime, str]]) -> Optional[datetime.datetime]:
+    """
+    Dates from mongo, or the naive ISO strings stored before timestamps were dates.
+    Those were written with datetime.now() in UTC containers, so they're read as UTC.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    return value if value.tzinfo else value.replace(tzinfo=datetime.timezone.utc)
+
+
+def json_default(value):
+    """default= for json.dumps of documents holding dates."""
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
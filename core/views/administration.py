@@ -1,10 +1,11 @@
 import datetime
+import json
 
 from flask import Blueprint
 
 from api.house_base import House
 from api.house_tracking import HouseAccess
-from utils import validation, configuration, player_utils
+from utils import validation, configuration, player_utils, packed_render
 from utils.api_decorators import json_data, admin_required
 from utils.db_config import db
 from utils.validation import dict_types_valid
@@ -177,12 +178,8 @@ def disable_registration():
 @mod.route("/api/trigger-evictions", methods=["POST"])
 @admin_required
 def trigger_evictions():
-    evictions: int = 0
-    for item in db["access"].find({}):
-        if HouseAccess.visit_too_long(item):
-            HouseAccess.evict(item["player_id"])
-            evictions += 1
-    return {"success": True, "evictions": evictions}
+    reasons: dict = HouseAccess.evict_expired()
+    return {"success": True, "evictions": sum(reasons.values()), "reasons": reasons}
 
 
 @mod.route("/api/trigger-evictions/all", methods=["POST"])
@@ -278,6 +275,29 @@ def get_some_bytes():
     return response_data
 
 
+@mod.route("/api/test/packed/<house_id>")
+def compare_render_sizes(house_id):
+    """Size of the compressed string form against the packed form for a whole house and a window."""
+    house: House = House(house_id=house_id).load()
+    if not house:
+        return {"success": False, "reason": "House doesn't exist"}
+
+    access: HouseAccess = HouseAccess(player_id="", house_id=house_id)
+    access.house = house
+    window: str = access.get_compressed_render(-3, 12, [3, 3])["construction"]  # Standing in the door
+    full: str = house.get_compressed_construction()
+    sizes: dict = {}
+    for name, tiles, player_index in [("window", window, packed_render.WINDOW_PLAYER_INDEX), ("house", full, None)]:
+        packed: str = packed_render.encode_tiles(tiles)
+        sizes[name] = {
+            "tiles": len(tiles),
+            "compressed_bytes": len(json.dumps({"construction": tiles})),
+            "packed_bytes": len(json.dumps({"construction": packed})),
+            "round_trip": packed_render.decode_tiles(packed, len(tiles), player_index=player_index) == tiles
+        }
+    return {"success": True, "sizes": sizes}
+
+
 @mod.route("/api/test/compare/<house_id1>/<house_id2>")
 def compare_houses(house_id1, house_id2):
     house1: House = House(house_id=house_id1).load()
@@ -1,12 +1,12 @@
-import datetime
 from typing import Optional
 
 from flask import Blueprint, request
 
 from api.house_tracking import HouseAccess
-from utils import robbery
+from utils import robbery, timestamps
 from utils.api_decorators import has_house
 from utils.configuration import get_config_value
+from utils.enums import HouseEntry, RenderView
 from utils.validation import evaluate_eviction
 
 mod = Blueprint('api_game', __name__)
@@ -26,21 +26,52 @@ def move_player(player_id, direction, player):
         player_id=player_id,
         house_id=house_id
     ).load()
-    compressed_view = False
+    view: RenderView = RenderView.EXPLICIT
     if direction.endswith("-c"):
-        compressed_view = True
+        view = RenderView.COMPRESSED
         direction = direction.replace("-c", "")
+    elif direction.endswith("-b"):
+        view = RenderView.PACKED
+        direction = direction.replace("-b", "")
+    elif direction.endswith("-d"):
+        view = RenderView.DELTA
+        direction = direction.replace("-d", "")
     if not access:
         return {"success": False, "reason": "House does not exist!"}, 404
     if direction.lower() not in ["left", "right", "up", "down"]:
         return {"success": False, "reason": "Illegal direction"}, 400
-    item = access.move(direction, compressed_view=compressed_view)
+    item = access.move(direction, view=view)
     if not item:
         return {"success": False, "reason": "Unable to move in that direction"}
     item["success"] = True
     return item
 
 
+@mod.route("/api/game/<player_id>/render", methods=["POST"])
+@has_house
+def resync_render(player_id, player):
+    """Full window and render sequence for a badge that missed a delta move."""
+    house_id: Optional[str] = HouseAccess.find_occupying_house(player_id)
+    if not house_id:
+        return {
+            "success": False,
+            "reason": "You are not in a house.",
+            "e": evaluate_eviction(player)
+        }, 400
+    access: HouseAccess = HouseAccess(
+        player_id=player_id,
+        house_id=house_id
+    ).load()
+    if not access:
+        return {"success": False, "reason": "House does not exist!"}, 404
+    view: RenderView = RenderView.from_header(request.headers.get("c"), default=RenderView.DELTA)
+    item = access.resync(view=view)
+    if not item:
+        return {"success": False, "reason": "You are not in a house."}, 400
+    item["success"] = True
+    return item
+
+
 @mod.route("/api/game/<player_id>/enter_house", methods=["POST"])
 @has_house
 def enter_house(player_id, player):
@@ -48,16 +79,15 @@ def enter_house(player_id, player):
     access: HouseAccess = HouseAccess(
         player_id=player_id,
         house_id=player.house_id
-    ).load()
+    ).load(locate=False)
     if not access:
         return {"success": False, "reason": "House does not exist!"}, 404
-    if access.is_in_house():
+    view: RenderView = RenderView.from_header(request.headers.get("c"))
+    entry, response = access.enter_house(view=view)
+    if entry == HouseEntry.ALREADY_INSIDE:
         return {"success": False, "reason": "You are already in the house!"}, 400
-    if not access.can_enter_house():
+    if entry == HouseEntry.OCCUPIED:
         return {"success": False, "reason": "Can't enter house at this time. Is someone there?"}, 401
-    compress_header = request.headers.get("c")
-    compressed_view = compress_header and compress_header == "y"
-    response = access.enter_house(compressed_view=compressed_view)
     if not response:
         return {"success": False, "reason": "Unknown error occurred."}, 500
     response["success"] = True
@@ -107,19 +137,18 @@ def rob_house(player_id, player):
     access: HouseAccess = HouseAccess(
         player_id=player_id,
         house_id=house_to_rob
-    ).load()
+    ).load(locate=False)
     if not access:
         return {"success": False, "reason": "House does not exist!"}, 404
-    if access.is_in_house():
+    view: RenderView = RenderView.from_header(request.headers.get("c"))
+    entry, response = access.enter_house(view=view)
+    if entry == HouseEntry.ALREADY_INSIDE:
         return {"success": False, "reason": "You are already in the house!"}, 400
-    if not access.can_enter_house():
+    if entry == HouseEntry.OCCUPIED:
         return {"success": False, "reason": "Can't enter house at this time. Is someone there?"}, 401
-    compress_header = request.headers.get("c")
-    compressed_view = compress_header and compress_header == "y"
-    response = access.enter_house(compressed_view=compressed_view)
     if not response:
         return {"success": False, "reason": "Unknown error occurred."}, 500
     response["success"] = True
-    player.last_robbery_attempt = datetime.datetime.now()
+    player.last_robbery_attempt = timestamps.now()
     player.save()
     return response
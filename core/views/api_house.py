@@ -7,10 +7,11 @@ from api.house_tracking import HouseAccess
 from api.material_base import Material, MaterialType
 from api.materials import Air
 from api.player_base import Player
-from utils import pathfinder
+from utils import identity_map, pathfinder, packed_render
 from utils.api_decorators import has_house, player_valid, json_data
 from utils.configuration import get_config_value
 from utils.conversions import solution_to_lucky_numbers
+from utils.enums import RenderView
 from utils.validation import dict_types_valid, evaluate_eviction
 
 mod = Blueprint('api_house', __name__)
@@ -19,16 +20,20 @@ mod = Blueprint('api_house', __name__)
 @mod.route('/api/house/<player_id>', methods=["GET"])
 @has_house
 def get_house(player_id, player):
-    house: House = House(house_id=player.house_id).load()
+    house: House = identity_map.get_house(player.house_id)
     house_dict = house.as_dict()
     del house_dict["_id"]
+    house_dict.pop("path_state", None)  # Internal pathfinder state, binary and not useful to badges
+    if RenderView.from_header(request.headers.get("c")) == RenderView.PACKED:
+        # Columns of tiles (x outer, y inner) like the compressed window, 2 bits per tile
+        house_dict["construction"] = packed_render.encode_tiles(house.get_compressed_construction())
     return {"success": True, "house": house_dict}
 
 
 @mod.route('/api/house/<player_id>/vault', methods=["GET"])
 @has_house
 def get_vault(player_id, player):
-    house: House = House(house_id=player.house_id).load()
+    house: House = identity_map.get_house(player.house_id)
     vault: dict = house.vault_contents.as_dict()
     condensed: dict = {
         "dollars": vault["dollars"],
@@ -52,14 +57,14 @@ def create_house(player_id, player):
 @mod.route("/api/house/<player_id>/abandon", methods=["DELETE"])
 @has_house
 def abandon_house(player_id, player):
-    house = House(house_id=player.house_id).load()
+    house = identity_map.get_house(player.house_id)
     house.abandoned = True
     house.abandoned_by = player.player_id
 
+    if not house.save():
+        return {"success": False, "reason": "House changed since it was loaded, try again"}, 409
     player.house_id = None
-
     player.save()
-    house.save()
 
     return {
         "success": True,
@@ -72,12 +77,12 @@ def abandon_house(player_id, player):
 @has_house
 def move_vault(player_id, player):
     api_token: str = request.headers.get("X-API-Token")
-    player: Player = Player(player_id).load()
+    player: Player = identity_map.get_player(player_id)
     if player.token != api_token:
         return {"success": False, "reason": "Unauthorized"}, 401
     if not player:
         return {"success": False, "reason": "Player doesn't exist"}
-    house: House = House(house_id=player.house_id).load()
+    house: House = identity_map.get_house(player.house_id)
     if not house:
         return {"success": False, "reason": "House not found."}, 404
     try:
@@ -112,8 +117,9 @@ def move_vault(player_id, player):
         return {"success": False, "reason": "You can't be in someone else's house while editing."}, 400
 
     success: bool = house.move_vault(data["x"], data["y"])  # Solution check is included
-    solution = pathfinder.get_maze_solution(house.get_construction_as_dict())
-    house.save()
+    solution = house.get_maze_solution()  # Already solved by move_vault
+    if not house.save():
+        return {"success": False, "reason": "House changed since it was loaded, try again"}, 409
 
     response = {
         "success": success,
@@ -121,10 +127,11 @@ def move_vault(player_id, player):
         "house_id": house.house_id,
         "player_location": access.player_location
     }
-    access.load()  # Refresh house data
     if evaluate_eviction(player):
         return {"success": False, "reason": "You were kicked out of the house", "e": True}
-    surroundings = access.render_surroundings(compressed_view=True)
+    surroundings = access.render_surroundings(
+        view=RenderView.from_header(request.headers.get("c"), default=RenderView.COMPRESSED)
+    )
     return {**response, **surroundings}, 200 if success else 400
 
 
@@ -168,7 +175,7 @@ def build_square(player_id, player, data):
         return {"success": False, "reason": "You can't be in someone else's house while editing."}
     if evaluate_eviction(player):
         return {"success": False, "reason": "You were kicked out of the house", "e": True}
-    house: House = House(house_id=player.house_id).load()
+    house: House = identity_map.get_house(player.house_id)
 
     if not House.in_bounds(x, y):
         return {"success": False, "reason": "Can't edit out of bounds"}
@@ -186,8 +193,11 @@ def build_square(player_id, player, data):
     }
 
     edit, code = house_editor(house, data)
-    access.load()  # Refresh house data
-    surroundings = access.render_surroundings(compressed_view=True)
+    if not edit["success"]:
+        access.load(refresh=True)  # Nothing was saved, render what is stored rather than the rejected edit
+    surroundings = access.render_surroundings(
+        view=RenderView.from_header(request.headers.get("c"), default=RenderView.COMPRESSED)
+    )
     return {**surroundings, **response_data, **edit}, code
 
 
@@ -227,7 +237,7 @@ def clear_square(player_id, player, data):
     if access.house_id != player.house_id:
         return {"success": False, "reason": "You can't be in someone else's house while editing."}
 
-    house: House = House(house_id=player.house_id).load()
+    house: House = identity_map.get_house(player.house_id)
 
     response_data = {
         "house_id": house.house_id,
@@ -235,14 +245,132 @@ def clear_square(player_id, player, data):
     }
 
     edit, code = house_editor(house, data)
-    access.load()  # Refresh house data
+    if not edit["success"]:
+        access.load(refresh=True)  # Nothing was saved, render what is stored rather than the rejected edit
     if evaluate_eviction(player):
         return {"success": False, "reason": "You were kicked out of the house", "e": True}
-    surroundings = access.render_surroundings(compressed_view=True)
+    surroundings = access.render_surroundings(
+        view=RenderView.from_header(request.headers.get("c"), default=RenderView.COMPRESSED)
+    )
     return {**surroundings, **response_data, ** edit}, code
 
 
-def house_editor(house: House, data: dict) -> Tuple[dict, int]:
+@mod.route("/api/edit-house/<player_id>/batch", methods=["POST"])
+@json_data
+@has_house
+def batch_edit(player_id, player, data):
+    """
+    Apply an ordered list of build / clear operations with a single load, path check and save.
+    :param data:
+    {
+      "operations": [
+        {"action": "build", "x": 1, "y": 2, "material_type": "Wooden_Wall"},
+        {"action": "clear", "x": 1, "y": 2}
+      ],
+      "validate_each": false  # Check the door to vault path after every build instead of once at the end
+    }
+    :return: One render and one set of lucky numbers for the whole batch.
+    """
+    if not dict_types_valid(data, {
+        "operations": {
+            "type": list,
+            "required": True
+        },
+        "validate_each": {
+            "type": bool
+        }
+    }):
+        return {"success": False, "reason": "Malformed Data"}, 400
+
+    operations: list = data["operations"]
+    max_operations: int = get_config_value(
+        "game.max_batch_operations", default_value={"value": 100}
+    ).get("value")
+    if len(operations) < 1 or len(operations) > max_operations:
+        return {"success": False, "reason": f"Must include between 1 and {max_operations} operations"}, 400
+    for operation in operations:
+        if not isinstance(operation, dict) or not batch_operation_valid(operation):
+            return {"success": False, "reason": "Malformed Data", "operation": operation}, 400
+
+    access: HouseAccess = HouseAccess(
+        player_id=player_id,
+        house_id=player.house_id
+    ).load()
+    if not access:
+        return {"success": False, "reason": "House does not exist!"}, 404
+    if not access.is_in_house():
+        return {"success": False, "reason": "You must be in your own house"}, 400
+    if evaluate_eviction(player):
+        return {"success": False, "reason": "You were kicked out of the house", "e": True}
+    house: House = access.house
+
+    response_data = {
+        "house_id": house.house_id,
+        "player_location": access.player_location,
+    }
+
+    validate_each: bool = data.get("validate_each", False)
+    path_required: bool = False
+    edit, code = {"success": True}, 200
+    for index, operation in enumerate(operations):
+        if operation["action"] == "build":
+            path_required = True
+            if not House.in_bounds(operation["x"], operation["y"]):
+                edit, code = {"success": False, "reason": "Can't edit out of bounds"}, 200
+            elif house.get_material_type(operation["x"], operation["y"]) == MaterialType.VAULT:
+                edit, code = {
+                    "success": False, "reason": "Cannot build over the vault. Please move the vault first."
+                }, 200
+            else:
+                edit, code = apply_house_edit(house, operation)
+            if edit["success"] and validate_each and not house.is_vault_reachable(backend=get_pathfinder_backend()):
+                edit, code = {"success": False, "reason": "No path from door to vault"}, 200
+        else:
+            edit, code = apply_house_edit(house, operation)
+        if not edit["success"]:
+            edit["operation"] = index
+            break
+    else:
+        edit, code = finish_house_edit(house, path_required=path_required)
+        if edit["success"]:
+            edit["applied"] = len(operations)
+    if not edit["success"]:
+        access.load(refresh=True)  # Nothing was saved, render what is stored rather than the rejected edits
+    surroundings = access.render_surroundings(
+        view=RenderView.from_header(request.headers.get("c"), default=RenderView.COMPRESSED)
+    )
+    return {**surroundings, **response_data, **edit}, code
+
+
+def batch_operation_valid(operation: dict) -> bool:
+    action: str = operation.get("action")
+    if action not in ["build", "clear"]:
+        return False
+    return dict_types_valid(operation, {
+        "x": {
+            "type": int,
+            "required": True
+        },
+        "y": {
+            "type": int,
+            "required": True
+        },
+        "material_type": {
+            "type": str,
+            "required": action == "build",
+            "excluded": action == "clear"
+        }
+    })
+
+
+def get_pathfinder_backend() -> str:
+    return get_config_value(
+        "game.pathfinder_backend", default_value={"value": pathfinder.BACKEND_INCREMENTAL}
+    ).get("value")
+
+
+def apply_house_edit(house: House, data: dict) -> Tuple[dict, int]:
+    """Apply a single build / clear to the house in memory, without checking the path or saving."""
     vault_contents: VaultContents = house.vault_contents
 
     material_type: MaterialType = MaterialType.from_string(
@@ -262,14 +390,34 @@ def house_editor(house: House, data: dict) -> Tuple[dict, int]:
         vault_contents.increment_material_count(removed["material_type"])
     if not success:
         return {"success": False}, 200
-    solution = pathfinder.get_maze_solution(house.get_construction_as_dict())
-    if material_type != MaterialType.AIR and not solution:
-        return {"success": False, "reason": "No path from door to vault"}, 200
-    house.save()
+    return {"success": True}, 200
+
+
+def finish_house_edit(house: House, path_required: bool) -> Tuple[dict, int]:
+    """Validate the door to vault path once, then save the house."""
     # Lucky numbers are a list of coordinates with a solution to solve the maze from
     # the door to the vault
     display_lucky_numbers: bool = get_config_value(
-        "game.display_lucky_numbers", default_value=True
+        "game.display_lucky_numbers", default_value={"value": True}
     ).get("value")
+    backend: str = get_pathfinder_backend()
+    if display_lucky_numbers:
+        solution = house.get_maze_solution(backend=backend)
+        reachable: bool = solution is not None
+    else:
+        solution = None  # Only reachability matters, skip building the path
+        reachable: bool = house.is_vault_reachable(backend=backend)
+    if path_required and not reachable:
+        return {"success": False, "reason": "No path from door to vault"}, 200
+    if not house.save():
+        return {"success": False, "reason": "House changed since it was loaded, try again"}, 409
     lucky_numbers = solution_to_lucky_numbers(solution)
-    return {"success": success, "lucky_numbers": lucky_numbers if display_lucky_numbers else "0"}, 200
+    return {"success": True, "lucky_numbers": lucky_numbers if display_lucky_numbers else "0"}, 200
+
+
+def house_editor(house: House, data: dict) -> Tuple[dict, int]:
+    edit, code = apply_house_edit(house, data)
+    if not edit["success"]:
+        return edit, code
+    material_type: MaterialType = MaterialType.from_string(data.get("material_type")) or MaterialType.AIR
+    return finish_house_edit(house, path_required=material_type != MaterialType.AIR)
@@ -3,7 +3,7 @@ from flask import Blueprint
 from api.house_base import House, VaultContents
 from api.material_base import MaterialType, Material
 from api.materials import material_from_type
-from utils import metrics
+from utils import identity_map, metrics
 from utils.api_decorators import has_house, json_data
 from utils.validation import dict_types_valid
 
@@ -44,7 +44,7 @@ def purchase_item(player_id, player, data):
 
     required_funds: int = material.buy_price * requested_quantity
 
-    house: House = House(house_id=player.house_id).load()
+    house: House = identity_map.get_house(player.house_id)
     vault_contents: VaultContents = house.vault_contents
 
     if required_funds > vault_contents.dollars:
@@ -60,7 +60,8 @@ def purchase_item(player_id, player, data):
     vault_contents.dollars = vault_contents.dollars - required_funds
     vault_contents.increment_material_count(material.material_type, requested_quantity)
 
-    house.save()
+    if not house.save():
+        return {"success": False, "reason": "House changed since it was loaded, try again"}, 409
 
     return {"success": True, "vault": vault_contents.as_dict()}
 
@@ -97,7 +98,7 @@ def sell_item(player_id, player, data):
     if not material.sellable:
         return {"success": False, "reason": "you aren't allowed to sell this item!"}
 
-    house: House = House(house_id=player.house_id).load()
+    house: House = identity_map.get_house(player.house_id)
     vault_contents: VaultContents = house.vault_contents
 
     current_quantity = vault_contents.materials.get(data["material"], 0)
@@ -114,6 +115,7 @@ def sell_item(player_id, player, data):
     vault_contents.decrement_material_count(material.material_type, requested_quantity)
     vault_contents.dollars = vault_contents.dollars + profits
 
-    house.save()
+    if not house.save():
+        return {"success": False, "reason": "House changed since it was loaded, try again"}, 409
 
     return {"success": True, "vault": vault_contents.as_dict()}
@@ -0,0 +1,121 @@
+"""
+Leader election between task engine replicas through a lease document in mongo.
+
+The leader renews the lease every lease_seconds / 3. Once it stops (crashed, paused,
+lost mongo) a standby takes the lease over after lease_seconds. Every takeover
+increments the lease's fencing token, so writes can be guarded against a paused
+leader that wakes up after losing the lease (see RefreshMetricsTask).
+
+Expiry is compared with each replica's own clock, so replicas need clocks within a
+small fraction of lease_seconds of each other (the same host, or NTP). There's
+deliberately no TTL index: deleting an expired lease would restart the token at 1.
+
+Run a few of these against one mongod to watch the lease move between them:
+    MONGO_IP=localhost python leader.py
+or run replicas of the whole task engine:
+    docker compose -f docker-compose-tasks.yml up -d --scale tasks_2024=2
+"""
+import datetime
+import logging
+import os
+import socket
+import sys
+import time
+import uuid
+from typing import Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from utils.configuration import get_config_value
+from utils.db_config import db
+
+LEASE_SECONDS = get_config_value(
+    "leader.lease_seconds", {"value": 15}
+).get("value")
+TRUST_FRACTION = 0.8
+logger = logging.getLogger()
+
+
+class LeaderLease:
+
+    def __init__(self, name: str = "task_engine", lease_seconds: float = LEASE_SECONDS):
+        self.name: str = name
+        self.lease_seconds: float = lease_seconds
+        self.holder: str = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.token: Optional[int] = None  # Fencing token while this replica holds the lease
+        self.valid_until: float = 0.0  # time.monotonic() this replica stops trusting its lease
+        self.next_heartbeat: float = 0.0
+
+    def is_leader(self) -> bool:
+        return self.token is not None and time.monotonic() < self.valid_until
+
+    def heartbeat(self) -> bool:
+        """Renew or try to take the lease when due, returns whether this replica leads."""
+        if time.monotonic() < self.next_heartbeat:
+            return self.is_leader()
+        self.next_heartbeat = time.monotonic() + self.lease_seconds / 3
+        was_leader: bool = self.is_leader()
+        try:
+            self._acquire()
+        except PyMongoError as e:
+            logger.error(f"Unable to reach the {self.name} lease: {e}")
+        leader: bool = self.is_leader()
+        if leader and not was_leader:
+            logger.info(f"{self.holder} leads {self.name} with fencing token {self.token}")
+        elif was_leader and not leader:
+            logger.warning(f"{self.holder} lost the {self.name} lease")
+        return leader
+
+    def _acquire(self):
+        # Measured before the request, the lease may be older than it looks by the time it's stored
+        started: float = time.monotonic()
+        now = datetime.datetime.now(datetime.timezone.utc)
+        expires_at = now + datetime.timedelta(seconds=self.lease_seconds)
+        lease: Optional[dict] = None
+        if self.token is not None:
+            lease = db["leases"].find_one_and_update(
+                {"_id": self.name, "holder": self.holder, "token": self.token},
+                {"$set": {"expires_at": expires_at}},
+                return_document=ReturnDocument.AFTER
+            )
+        if not lease:
+            lease = db["leases"].find_one_and_update(
+                {"_id": self.name, "expires_at": {"$lt": now}},
+                {"$set": {"holder": self.holder, "expires_at": expires_at}, "$inc": {"token": 1}},
+                return_document=ReturnDocument.AFTER
+            )
+        if not lease:
+            try:
+                lease = {"_id": self.name, "holder": self.holder, "expires_at": expires_at, "token": 1}
+                db["leases"].insert_one(lease)
+            except DuplicateKeyError:
+                lease = None  # Held by another replica
+        if not lease:
+            self.token = None
+            return
+        self.token = lease["token"]
+        # Stop trusting the lease a little before a standby could take it, in case our clocks differ
+        self.valid_until = started + self.lease_seconds * TRUST_FRACTION
+
+    def release(self):
+        """Hand the lease over straight away, on shutdown."""
+        if self.token is None:
+            return
+        db["leases"].update_one(
+            {"_id": self.name, "holder": self.holder, "token": self.token},
+            {"$set": {"expires_at": datetime.datetime.fromtimestamp(0, datetime.timezone.utc)}}
+        )
+        self.token = None
+
+
+if __name__ == "__main__":
+    logger.addHandler(logging.StreamHandler(sys.stdout))
+    logger.setLevel(logging.INFO)
+    lease = LeaderLease()
+    try:
+        while True:
+            lease.heartbeat()
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        lease.release()
@@ -1,8 +1,12 @@
 import logging
+import os
+import signal
 import sys
-import time
 
-from utils import request_util
+from leader import LeaderLease
+from scheduler import TaskScheduler
+from tasks.api_tasks import RefreshMetricTask, TriggerEvictionsTask
+from tasks.db_tasks import EvictionTask, RefreshMetricsTask
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -13,16 +17,16 @@ logger.addHandler(ch)
 
 if __name__ == '__main__':
     logger.info("Launching...")
-    # TODO Custom exceptions
-    while True:
-        print("Running refresh_metrics()")
-        try:
-            request_util.refresh_metrics()
-        except Exception:
-            logger.error("Failed to refresh metrics")
-        print("Triggering evictions")
-        try:
-            request_util.trigger_evictions()
-        except Exception:
-            logger.error("Failed to trigger evictions")
-        time.sleep(5)
+    lease = LeaderLease()
+    scheduler = TaskScheduler(lease=lease)
+    if os.environ.get("TASK_ENGINE_MODE", "db").lower() == "api":
+        # Through the API's HTTP endpoints, as the task engine used to
+        scheduler.add(RefreshMetricTask()).add(TriggerEvictionsTask())
+    else:
+        scheduler.add(RefreshMetricsTask()).add(EvictionTask())
+    # docker stop sends SIGTERM, exiting through SystemExit runs the finally below
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        scheduler.run_forever()
+    finally:
+        lease.release()  # Lets a standby take over without waiting out the lease
@@ -1,5 +1,138 @@
+import datetime
+import logging
+import random
+import threading
+import time
+import uuid
+from typing import List, Optional
+
+import pymongo
+import requests
+from pymongo.errors import PyMongoError
+
+from leader import LeaderLease
+from tasks.base import Task
+from utils.db_config import db
+
+logger = logging.getLogger()
+
+
+class ScheduledTask:
+
+    def __init__(self, task: Task):
+        self.task: Task = task
+        self.next_run: float = time.monotonic()
+        self.started: float = 0.0
+        self.timed_out: bool = False
+        self.thread: Optional[threading.Thread] = None
+
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
 
 class TaskScheduler:
+    """
+    Starts every task each interval_seconds (plus up to jitter_seconds, so tasks
+    don't line up) in a thread of its own. A task still running when it's due
+    again is skipped rather than run twice at once.
+
+    A run is given timeout_seconds. Its mongo operations share that deadline
+    (pymongo.timeout) and API tasks use it as their request timeout, so a run
+    that overruns fails with outcome "timeout". Threads can't be stopped, so a
+    run stuck anywhere else is reported and only started again once it returns.
+
+    With a lease, singleton tasks only run on the replica that holds it.
+
+    Every run is recorded in db.metrics as taskengine_task_duration_seconds.
+    """
+
+    def __init__(self, tick_seconds: float = 0.5, lease: Optional[LeaderLease] = None):
+        self.tick_seconds: float = tick_seconds
+        self.lease: Optional[LeaderLease] = lease
+        self.tasks: List[ScheduledTask] = []
+
+    def add(self, task: Task):
+        self.tasks.append(ScheduledTask(task))
+        return self
+
+    def run_forever(self):
+        logger.info(f"Scheduling {', '.join(scheduled.task.name for scheduled in self.tasks)}")
+        while True:
+            self.tick()
+            time.sleep(self.tick_seconds)
+
+    def tick(self):
+        leader: bool = self.lease.heartbeat() if self.lease else True
+        now: float = time.monotonic()
+        for scheduled in self.tasks:
+            if scheduled.running():
+                self._check_timeout(scheduled, now)
+            elif now >= scheduled.next_run and (leader or not scheduled.task.singleton):
+                self._start(scheduled, now)
+
+    def _start(self, scheduled: ScheduledTask, now: float):
+        task: Task = scheduled.task
+        scheduled.next_run = now + task.interval_seconds + random.uniform(0, task.jitter_seconds)
+        scheduled.started = now
+        scheduled.timed_out = False
+        task.fencing_token = self.lease.token if self.lease else None
+        scheduled.thread = threading.Thread(
+            target=self._run, args=(scheduled,), name=f"task-{task.name}", daemon=True
+        )
+        scheduled.thread.start()
+
+    @staticmethod
+    def _check_timeout(scheduled: ScheduledTask, now: float):
+        timeout: Optional[float] = scheduled.task.timeout_seconds
+        if timeout and not scheduled.timed_out and now - scheduled.started > timeout:
+            scheduled.timed_out = True
+            logger.error(f"{scheduled.task.name} has run for over {timeout}s, it won't start again until it's done")
+
+    def _run(self, scheduled: ScheduledTask):
+        task: Task = scheduled.task
+        outcome: str = "success"
+        try:
+            task.begin()
+            with pymongo.timeout(task.timeout_seconds):
+                task.run()
+        except Exception as e:
+            if self._is_timeout(e):
+                outcome = "timeout"
+                logger.error(f"{task.name} didn't finish within {task.timeout_seconds}s: {e}")
+            else:
+                outcome = "failure"
+                logger.exception(f"{task.name} failed")
+        finally:
+            try:
+                task.end()
+            except Exception:
+                logger.exception(f"{task.name} failed to end")
+        if scheduled.timed_out:
+            outcome = "timeout"
+        self._record_duration(task, outcome, time.monotonic() - scheduled.started)
+
+    @staticmethod
+    def _is_timeout(e: Exception) -> bool:
+        if isinstance(e, PyMongoError):
+            return e.timeout
+        return isinstance(e, requests.Timeout)
 
-    def __init__(self):
-        pass
+    @staticmethod
+    def _record_duration(task: Task, outcome: str, seconds: float):
+        logger.info(f"{task.name} finished in {seconds:.3f}s ({outcome})")
+        try:
+            db["metrics"].insert_one({
+                "_id": str(uuid.uuid4()),
+                "timestamp": datetime.datetime.now(datetime.timezone.utc),
+                "metric": "taskengine_task_duration_seconds",
+                "metric_type": "histogram",
+                "labels": {
+                    "task": task.name,
+                    "outcome": outcome
+                },
+                "value": {
+                    "observe": seconds
+                }
+            })
+        except Exception as e:
+            logger.error(f"Unable to record the duration of {task.name}: {e}")
@@ -1,10 +1,22 @@
-from task_engine.tasks.base import Task
+from tasks.base import Task
+from utils import request_util
 
 
 class RefreshMetricTask(Task):
+    """Asks the API to refresh its metrics, for when TASK_ENGINE_MODE=api."""
 
     def __init__(self):
-        super().__init__(name="RefreshMetricTask")
+        super().__init__(name="RefreshMetricTask", interval_seconds=5, timeout_seconds=30, singleton=True)
 
     def run(self) -> None:
-        print("Test!")
+        request_util.refresh_metrics(timeout=self.timeout_seconds)
+
+
+class TriggerEvictionsTask(Task):
+    """Asks the API to evict expired visits, for when TASK_ENGINE_MODE=api."""
+
+    def __init__(self):
+        super().__init__(name="TriggerEvictionsTask", interval_seconds=5, timeout_seconds=30, singleton=True)
+
+    def run(self) -> None:
+        request_util.trigger_evictions(timeout=self.timeout_seconds)
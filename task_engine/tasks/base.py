@@ -1,8 +1,18 @@
+from typing import Optional
+
 
 class Task:
 
-    def __init__(self, name):
+    def __init__(
+            self, name, interval_seconds: float = 5, jitter_seconds: float = 0, timeout_seconds: Optional[float] = None,
+            singleton: bool = False
+    ):
         self.name = name
+        self.interval_seconds: float = interval_seconds  # Between starts
+        self.jitter_seconds: float = jitter_seconds  # Random extra delay, up to this
+        self.timeout_seconds: Optional[float] = timeout_seconds
+        self.singleton: bool = singleton  # Only run by the replica holding the leader lease
+        self.fencing_token: Optional[int] = None  # The lease's token when a singleton run started
 
     def begin(self) -> None:
         pass
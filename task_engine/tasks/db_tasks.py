@@ -0,0 +1,105 @@
+import logging
+import uuid
+from typing import List
+
+from pymongo.errors import DuplicateKeyError
+
+from tasks.base import Task
+from utils import game_queries, timestamps
+from utils.configuration import get_config_value
+from utils.db_config import db
+
+logger = logging.getLogger()
+
+
+def _schedule(name: str, interval_seconds: float, jitter_seconds: float, timeout_seconds: float) -> dict:
+    """Interval, jitter and timeout of a task, each overridable with tasks.<name>.<setting> in config."""
+    defaults: dict = {
+        "interval_seconds": interval_seconds,
+        "jitter_seconds": jitter_seconds,
+        "timeout_seconds": timeout_seconds
+    }
+    return {
+        setting: get_config_value(f"tasks.{name}.{setting}", {"value": default}).get("value")
+        for setting, default in defaults.items()
+    }
+
+
+class EvictionTask(Task):
+    """The API's HouseAccess.evict_expired sweep, through the shared utils/game_queries.py."""
+
+    def __init__(self):
+        # Two leaders (one paused past its lease) would evict the same visits, which is harmless
+        super().__init__(name="EvictionTask", singleton=True, **_schedule("evictions", 5, 1, 30))
+
+    def run(self) -> None:
+        # Nothing to clear in the API, its identity map only lasts a request
+        evictions, player_ids = game_queries.evict_expired()
+        if player_ids:
+            logger.info(f"Evicted {len(player_ids)} people from houses, {evictions['inactive']} inactive")
+
+
+class RefreshMetricsTask(Task):
+    """
+    Counts behind the API's game gauges. They're saved as one snapshot document the
+    API applies whenever /metrics is scraped, and as gauge entries in db.metrics like
+    the API's /refresh-metrics writes.
+    """
+
+    def __init__(self):
+        super().__init__(name="RefreshMetricsTask", singleton=True, **_schedule("refresh_metrics", 5, 1, 30))
+
+    def _save_snapshot(self, snapshot: dict) -> bool:
+        """Replace the snapshot unless it was saved under a newer fencing token."""
+        if self.fencing_token is None:
+            db["metric_snapshots"].replace_one({"_id": snapshot["_id"]}, snapshot, upsert=True)
+            return True
+        try:
+            db["metric_snapshots"].replace_one(
+                {"_id": snapshot["_id"], "$or": [
+                    {"fencing_token": {"$lte": self.fencing_token}},
+                    {"fencing_token": {"$exists": False}}
+                ]},
+                {**snapshot, "fencing_token": self.fencing_token},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False  # Didn't match, so the upsert tried to insert a second game_counts
+        return True
+
+    def run(self) -> None:
+        # Players' last activity is written by the API workers at most a few seconds late
+        counts: dict = game_queries.count_game()
+        gauges: List[dict] = [
+            {"metric": "apiserver_players_number", "labels": {"active": str(active)},
+             "value": counts["players"].get(active, 0)}
+            for active in [True, False]
+        ] + [
+            {"metric": "apiserver_houses_number", "labels": {"abandoned": str(abandoned)},
+             "value": counts["houses"].get(abandoned, 0)}
+            for abandoned in [False, True]
+        ] + [
+            {"metric": "apiserver_registration_tokens", "labels": {},
+             "value": counts["registration"].get(None, 0)}
+        ] + [
+            {"metric": "apiserver_houses_occupied_players", "labels": {"houseowner": str(houseowner)},
+             "value": counts["occupied"].get(houseowner, 0)}
+            for houseowner in [True, False]
+        ]
+        now = timestamps.now()
+        if not self._save_snapshot({"_id": "game_counts", "timestamp": now, "gauges": gauges}):
+            logger.warning(f"Not saving counts, a leader with a newer token than {self.fencing_token} has")
+            return
+        db["metrics"].insert_many([
+            {
+                "_id": str(uuid.uuid4()),
+                "timestamp": now,
+                "metric": gauge["metric"],
+                "metric_type": "Gauge",
+                "labels": gauge["labels"],
+                "value": {
+                    "set": gauge["value"]
+                }
+            }
+            for gauge in gauges
+        ])
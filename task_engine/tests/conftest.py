@@ -0,0 +1,25 @@
+"""
+Tests run from the task_engine directory with: python -m pytest tests
+
+Modules read config from mongo when they're imported, so mongomock stands in
+for the server before anything from the task engine is imported. Every test
+gets empty collections.
+"""
+import os
+import sys
+
+import mongomock
+import pymongo
+import pytest
+
+pymongo.MongoClient = mongomock.MongoClient
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils.db_config import db  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def empty_db():
+    for name in db.list_collection_names():
+        db.drop_collection(name)
+    yield db
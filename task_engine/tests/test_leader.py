@@ -0,0 +1,79 @@
+import datetime
+
+from leader import LeaderLease
+from tasks import db_tasks
+from tasks.db_tasks import RefreshMetricsTask
+from utils.db_config import db
+
+COUNTS: dict = {"players": {True: 2}, "houses": {False: 3}, "registration": {None: 1}, "occupied": {}}
+
+
+def beat(lease: LeaderLease) -> bool:
+    """Heartbeat now rather than when the next one is due."""
+    lease.next_heartbeat = 0.0
+    return lease.heartbeat()
+
+
+def expire(name: str = "task_engine"):
+    """The leader stopped renewing (crashed or paused) longer than the lease."""
+    db["leases"].update_one(
+        {"_id": name}, {"$set": {"expires_at": datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(1)}}
+    )
+
+
+def test_one_leader():
+    first, second = LeaderLease(), LeaderLease()
+    assert beat(first) and first.token == 1
+    assert not beat(second) and second.token is None
+    assert beat(first) and first.token == 1  # Renewed, same token
+
+
+def test_expired_lease_taken_over():
+    first, second = LeaderLease(), LeaderLease()
+    beat(first)
+    expire()
+    assert beat(second)
+    assert second.token == 2
+    assert db["leases"].find_one({"_id": "task_engine"})["holder"] == second.holder
+
+
+def test_no_renewal_after_a_takeover():
+    first, second = LeaderLease(), LeaderLease()
+    beat(first)
+    expire()
+    beat(second)
+    # The old leader wakes up
+    assert not beat(first)
+    assert first.token is None and not first.is_leader()
+    assert db["leases"].find_one({"_id": "task_engine"})["token"] == 2
+
+
+def test_release_hands_over_at_once():
+    first, second = LeaderLease(), LeaderLease()
+    beat(first)
+    first.release()
+    assert first.token is None
+    assert beat(second) and second.token == 2
+
+
+def refresh(fencing_token, monkeypatch) -> RefreshMetricsTask:
+    monkeypatch.setattr(db_tasks.game_queries, "count_game", lambda: COUNTS)
+    task = RefreshMetricsTask()
+    task.fencing_token = fencing_token
+    task.run()
+    return task
+
+
+def test_stale_leader_doesnt_overwrite_counts(monkeypatch):
+    refresh(2, monkeypatch)
+    saved: dict = db["metric_snapshots"].find_one({"_id": "game_counts"})
+    assert saved["fencing_token"] == 2
+    gauges: int = db["metrics"].count_documents({})
+
+    # A leader paused past its lease finishes a run it started with the old token
+    refresh(1, monkeypatch)
+    assert db["metric_snapshots"].find_one({"_id": "game_counts"}) == saved
+    assert db["metrics"].count_documents({}) == gauges
+
+    refresh(3, monkeypatch)
+    assert db["metric_snapshots"].find_one({"_id": "game_counts"})["fencing_token"] == 3
@@ -0,0 +1,95 @@
+import threading
+import time
+from typing import List, Optional
+
+import requests
+from pymongo.errors import ExecutionTimeout
+
+from scheduler import ScheduledTask, TaskScheduler
+from tasks.base import Task
+from utils.db_config import db
+
+
+class BlockingTask(Task):
+    """Runs until released, counting its runs."""
+
+    def __init__(self, timeout_seconds: Optional[float] = None):
+        super().__init__(name="BlockingTask", interval_seconds=0, timeout_seconds=timeout_seconds)
+        self.release = threading.Event()
+        self.runs: int = 0
+
+    def run(self) -> None:
+        self.runs += 1
+        self.release.wait(5)
+
+
+class RaisingTask(Task):
+
+    def __init__(self, error: Exception):
+        super().__init__(name="RaisingTask", interval_seconds=0, timeout_seconds=1)
+        self.error: Exception = error
+
+    def run(self) -> None:
+        raise self.error
+
+
+def scheduler_with(task: Task) -> TaskScheduler:
+    return TaskScheduler().add(task)
+
+
+def finish(scheduled: ScheduledTask):
+    scheduled.thread.join(5)
+    assert not scheduled.running()
+
+
+def durations() -> List[dict]:
+    return list(db["metrics"].find({"metric": "taskengine_task_duration_seconds"}))
+
+
+def test_running_task_not_started_again():
+    task = BlockingTask()
+    scheduler = scheduler_with(task)
+    scheduler.tick()
+    scheduler.tick()
+    scheduler.tick()
+    time.sleep(0.05)
+    assert task.runs == 1
+
+    task.release.set()
+    finish(scheduler.tasks[0])
+    scheduler.tick()
+    finish(scheduler.tasks[0])
+    assert task.runs == 2
+    assert [entry["labels"]["outcome"] for entry in durations()] == ["success", "success"]
+
+
+def test_overrunning_task_recorded_as_timeout():
+    task = BlockingTask(timeout_seconds=0.01)
+    scheduler = scheduler_with(task)
+    scheduler.tick()
+    time.sleep(0.05)
+    scheduler.tick()
+    assert scheduler.tasks[0].timed_out
+    task.release.set()
+    finish(scheduler.tasks[0])
+
+    [entry] = durations()
+    assert entry["labels"] == {"task": "BlockingTask", "outcome": "timeout"}
+    assert entry["value"]["observe"] >= 0.05
+
+
+def test_mongo_and_request_timeouts_recorded_as_timeout():
+    for error in [ExecutionTimeout("operation exceeded time limit"), requests.Timeout("read timed out")]:
+        scheduler = scheduler_with(RaisingTask(error))
+        scheduler.tick()
+        finish(scheduler.tasks[0])
+    assert [entry["labels"]["outcome"] for entry in durations()] == ["timeout", "timeout"]
+
+
+def test_raising_task_keeps_the_scheduler_going():
+    scheduler = scheduler_with(RaisingTask(ValueError("broken")))
+    scheduler.tick()
+    finish(scheduler.tasks[0])
+    scheduler.tick()
+    finish(scheduler.tasks[0])
+    assert [entry["labels"]["outcome"] for entry in durations()] == ["failure", "failure"]
@@ -0,0 +1,9 @@
+from utils.db_config import db
+
+
+def get_config_value(key: str, default_value=None):
+    """Config the API reads (see core/utils/configuration.py), without its cache."""
+    item = db["config"].find_one({"_id": key})
+    if not item:
+        return default_value
+    return item
@@ -1,4 +1,5 @@
 
+import datetime
 import os
 
 import pymongo
@@ -19,8 +20,10 @@ if connect_auth:
     client = MongoClient(mongo_ip, username=username,
                          password=password,
                          authSource='admin',
-                         authMechanism='SCRAM-SHA-1')
+                         authMechanism='SCRAM-SHA-1',
+                         tz_aware=True,
+                         tzinfo=datetime.timezone.utc)
 else:
-    client = pymongo.MongoClient(db_connect_string)
+    client = pymongo.MongoClient(db_connect_string, tz_aware=True, tzinfo=datetime.timezone.utc)
 
 db = client[db_name]
@@ -0,0 +1 @@
+../../core/utils/game_queries.py
\ No newline at end of file
@@ -1,6 +1,7 @@
 import logging
 import os
 import sys
+from typing import Optional
 
 import requests
 
@@ -16,20 +17,20 @@ def _get_base_path():
     return f"http://{host_name}:8080" if host_name else None
 
 
-def refresh_metrics():
+def refresh_metrics(timeout: Optional[float] = None):
     if base_path := _get_base_path():
-        response = requests.get(f"{base_path}/refresh-metrics")
+        response = requests.get(f"{base_path}/refresh-metrics", timeout=timeout)
         logger.info(response.text)
     else:
         logger.error("No logging base path")
 
 
-def trigger_evictions():
+def trigger_evictions(timeout: Optional[float] = None):
     headers = {
         "X-API-Token": os.environ.get("API_KEY", "")
     }
     if base_path := _get_base_path():
-        response = requests.post(f"{base_path}/api/trigger-evictions", headers=headers)
+        response = requests.post(f"{base_path}/api/trigger-evictions", headers=headers, timeout=timeout)
         logger.info(response.text)
     else:
         logger.error("No logging base path")
@@ -0,0 +1 @@
+../../core/utils/timestamps.py
\ No newline at end of file